@@ -0,0 +1,181 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import logger
+
+import argparse
+import json
+import re
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List
+
+from langgraph.types import Command
+
+import config
+from blog_graph import blog_agent_graph
+from blog_state import new_blog_state
+from functions import load_python_code, render_blog_markdown
+from metrics import metrics
+
+
+# Headless batch mode: generates blogs for every repository in a JSONL manifest, one graph
+# thread per entry, answering the human-in-the-loop interrupts with a feedback policy.
+#
+# Manifest lines:
+#   {"id": "my-repo", "path": "/path/to/repo",
+#    "outline_feedback": ["Merge sections 3 and 4"],            (optional, "scripted" policy)
+#    "section_feedback": {"2": ["Add a code walkthrough"]}}      (optional, "scripted" policy)
+
+
+# Answers interrupts: "auto_approve" approves everything, "scripted" replays the manifest's
+# feedback for each interrupt in order and approves once the script is exhausted
+class FeedbackPolicy:
+    def __init__(self, policy: str, entry: Dict[str, Any]):
+        if policy not in ("auto_approve", "scripted"):
+            raise ValueError(f"Unknown feedback policy {policy!r}")
+        scripted = policy == "scripted"
+        self.outline_feedback = list(entry.get("outline_feedback", [])) if scripted else []
+        self.section_feedback = {
+            str(no): list(feedback) for no, feedback in entry.get("section_feedback", {}).items()
+        } if scripted else {}
+
+    def respond(self, interrupt_value: Dict[str, Any]) -> str:
+        if interrupt_value.get("current_node") == "human_blog_feedback":
+            script = self.outline_feedback
+        else:
+            script = self.section_feedback.get(str(interrupt_value.get("section_no")), [])
+        return script.pop(0) if script else "approved"
+
+
+# Blog ids name the output files, so they are reduced to a plain file name
+def safe_blog_id(blog_id: Any) -> str:
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", str(blog_id)).strip("_")
+
+
+# Manifest entries, each with a unique, file-name-safe "id"
+def read_manifest(path: str) -> List[Dict[str, Any]]:
+    entries = []
+    seen = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if "path" not in entry:
+                raise ValueError(f"Manifest line {line_no} has no 'path'")
+            blog_id = safe_blog_id(entry.get("id") or entry.get("request_id") or f"blog{line_no}")
+            if not blog_id:
+                raise ValueError(f"Manifest line {line_no} has an id with no usable characters")
+            if blog_id in seen:
+                raise ValueError(f"Manifest line {line_no} repeats the id {blog_id!r} of line {seen[blog_id]}")
+            seen[blog_id] = line_no
+            entry["id"] = blog_id
+            entries.append(entry)
+    return entries
+
+
+def run_entry(entry: Dict[str, Any], policy: str, output_dir: str, max_interrupts: int) -> Dict[str, Any]:
+    blog_id = entry["id"]
+    thread_config = {
+        "configurable": {
+            "thread_id": f"batch-{blog_id}-{uuid.uuid4()}",
+            "recursion_limit": 100
+        },
+        "max_concurrency": config.SECTION_DRAFTING_MAX_CONCURRENCY
+    }
+    feedback_policy = FeedbackPolicy(policy, entry)
+    result = {"id": blog_id, "path": entry["path"], "thread_id": thread_config["configurable"]["thread_id"]}
+    node_seconds: Dict[str, float] = {}
+    interrupts = 0
+    start = time.perf_counter()
+
+    try:
+        load_start = time.perf_counter()
+        current_input = new_blog_state(load_python_code(entry["path"]))
+        result["load_seconds"] = round(time.perf_counter() - load_start, 3)
+
+        while current_input is not None:
+            next_input = None
+            last_event = time.perf_counter()
+            for event in blog_agent_graph.stream(current_input, config=thread_config):
+                now = time.perf_counter()
+                if "__interrupt__" in event:
+                    interrupts += 1
+                    if interrupts > max_interrupts:
+                        raise RuntimeError(f"Gave up after {max_interrupts} interrupts")
+                    interrupt_value = event["__interrupt__"][0].value
+                    answer = feedback_policy.respond(interrupt_value)
+                    logger.info(f"[{blog_id}] {interrupt_value.get('current_node')} {interrupt_value.get('section_no', '')}: {answer}")
+                    next_input = Command(resume=answer)
+                    break
+                # Time since the previous event is attributed to the nodes that just finished
+                for node in event:
+                    node_seconds[node] = node_seconds.get(node, 0.0) + (now - last_event) / len(event)
+                last_event = now
+            current_input = next_input
+
+        state = blog_agent_graph.get_state(thread_config).values
+        markdown = render_blog_markdown(state.get("sections", []), state.get("section_drafts", {}))
+        blog_path = os.path.join(output_dir, f"{blog_id}.md")
+        with open(blog_path, "w", encoding="utf-8") as f:
+            f.write(markdown)
+        result.update({"status": "completed", "blog_path": blog_path, "sections": len(state.get("sections", []))})
+        result["metrics_path"] = metrics.finish_run(thread_config["configurable"]["thread_id"])
+    except Exception as e:
+        logger.exception(f"[{blog_id}] failed")
+        result.update({"status": "failed", "error": f"{type(e).__name__}: {e}"})
+        metrics.discard_run(thread_config["configurable"]["thread_id"])
+
+    result.update({
+        "interrupts": interrupts,
+        "total_seconds": round(time.perf_counter() - start, 3),
+        "node_seconds": {node: round(seconds, 3) for node, seconds in node_seconds.items()}
+    })
+    with open(os.path.join(output_dir, f"{blog_id}.timing.json"), "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    return result
+
+
+def run_batch(manifest_path: str, output_dir: str, workers: int, policy: str, max_interrupts: int) -> List[Dict[str, Any]]:
+    entries = read_manifest(manifest_path)
+    os.makedirs(output_dir, exist_ok=True)
+    logger.info(f"running {len(entries)} blogs with {workers} workers ({policy} policy)")
+
+    start = time.perf_counter()
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_entry, entry, policy, output_dir, max_interrupts) for entry in entries]
+        for future in as_completed(futures):
+            result = future.result()
+            logger.info(f"[{result['id']}] {result['status']} in {result['total_seconds']}s")
+            results.append(result)
+
+    summary = {
+        "manifest": manifest_path,
+        "policy": policy,
+        "workers": workers,
+        "total_seconds": round(time.perf_counter() - start, 3),
+        "completed": sum(result["status"] == "completed" for result in results),
+        "failed": sum(result["status"] == "failed" for result in results),
+        "runs": sorted(results, key=lambda result: result["id"])
+    }
+    with open(os.path.join(output_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate blogs for many repositories without a human in the loop.")
+    parser.add_argument("manifest", help="JSONL file with one {\"id\", \"path\", ...} object per line")
+    parser.add_argument("--output-dir", default="blogs", help="Directory for the finished blogs and timing files")
+    parser.add_argument("--workers", type=int, default=4, help="Number of blogs generated concurrently")
+    parser.add_argument("--policy", choices=["auto_approve", "scripted"], default="auto_approve",
+                        help="How to answer feedback interrupts")
+    parser.add_argument("--max-interrupts", type=int, default=50,
+                        help="Fail a blog that needs more than this many feedback rounds")
+    args = parser.parse_args()
+
+    results = run_batch(args.manifest, args.output_dir, args.workers, args.policy, args.max_interrupts)
+    sys.exit(0 if all(result["status"] == "completed" for result in results) else 1)
@@ -0,0 +1,254 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import logger
+
+import argparse
+import json
+import logging
+import platform
+import tempfile
+import time
+import tracemalloc
+import uuid
+from typing import Any, Dict, List
+
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.types import Command
+
+import config
+# The benchmark never calls a provider: `nodes` builds its model registry at import, so point it
+# at the fake model first (run_benchmark then installs a FakeChatModel with the requested settings)
+config.LLM_MODELS = "fake:benchmark"
+config.LLM_MODELS_SUMMARY = config.LLM_MODELS_OUTLINE = config.LLM_MODELS_DRAFT = ""
+import nodes
+from batch import FeedbackPolicy
+from blog_graph import builder
+from blog_state import new_blog_state
+from checkpointer import create_checkpointer, CheckpointMeter
+from fake_llm import FakeChatModel
+from functions import load_python_code
+from models import ModelRegistry
+
+
+# Benchmark suite: runs the whole blog graph on synthetic repositories of increasing size with
+# a deterministic fake chat model, answering interrupts from a script, and records per-node
+# wall time, load time, update and checkpoint bytes, log volume and peak memory.
+#
+#   python benchmark.py --files 10,100,1000,10000 --latency 0.05
+#   python benchmark.py --baseline benchmark_results/benchmark-20250101-120000.json
+
+
+# Scripted reviewer: one outline revision and one revision of the first section
+FEEDBACK_SCRIPT = {
+    "outline_feedback": ["Add a section about error handling"],
+    "section_feedback": {"1": ["Add a short code walkthrough"]}
+}
+
+
+def synthetic_module(package: int, module: int, functions: int) -> str:
+    lines = [
+        f'"""Synthetic module {module} of package {package}."""',
+        "import os",
+        "from typing import List",
+        f"from pkg{package} import mod{max(module - 1, 0)}",
+        "",
+        "",
+        f"class Handler{module}:",
+        f'    """Handles requests for module {module}."""',
+        "",
+        "    def __init__(self, name: str):",
+        "        self.name = name",
+        "",
+    ]
+    for i in range(functions):
+        lines += [
+            f"    def process_{i}(self, items: List[int]) -> int:",
+            f'        """Process the items with step {i}."""',
+            "        total = 0",
+            "        for item in items:",
+            f"            total += item * {i + 1}",
+            "        return total + len(os.sep)",
+            "",
+        ]
+    lines += [
+        "",
+        f"def run_{module}(values: List[int]) -> int:",
+        f"    return Handler{module}('run').process_0(values) + mod{max(module - 1, 0)}.__name__.count('.')",
+        "",
+    ]
+    return "\n".join(lines)
+
+
+# Write `files` modules into packages of 50 modules each
+def generate_repo(root: str, files: int, functions: int):
+    for n in range(files):
+        package, module = divmod(n, 50)
+        package_dir = os.path.join(root, f"pkg{package}")
+        os.makedirs(package_dir, exist_ok=True)
+        if module == 0:
+            with open(os.path.join(package_dir, "__init__.py"), "w", encoding="utf-8") as f:
+                f.write(f'"""Synthetic package {package}."""\n')
+        with open(os.path.join(package_dir, f"mod{module}.py"), "w", encoding="utf-8") as f:
+            f.write(synthetic_module(package, module, functions))
+
+
+# Formats every log record with the app's formatter (so formatting cost is measured), counts
+# the records and bytes, and keeps the per-node timing spans; nothing is written out
+class BenchmarkLogHandler(logging.Handler):
+    def __init__(self, formatter: logging.Formatter):
+        super().__init__(level=logging.NOTSET)
+        self.setFormatter(formatter)
+        self.records = 0
+        self.bytes = 0
+        self.spans: List[Dict[str, Any]] = []
+
+    def emit(self, record):
+        self.records += 1
+        self.bytes += len(self.format(record).encode("utf-8")) + 1
+        span = getattr(record, "span", None)
+        if span:
+            self.spans.append(span)
+
+
+def run_scenario(files: int, args) -> Dict[str, Any]:
+    serde = JsonPlusSerializer()
+    result: Dict[str, Any] = {"files": files}
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = os.path.join(tmp, "repo")
+        generate_repo(repo, files, args.functions)
+
+        formatter = logger.handlers[0].formatter if logger.handlers else logging.Formatter()
+        log_handler = BenchmarkLogHandler(formatter)
+        app_handlers = logger.handlers[:]
+        logger.handlers = [log_handler]
+        if args.trace_memory:
+            tracemalloc.start()
+        try:
+            start = time.perf_counter()
+            code = load_python_code(repo)
+            result["load_seconds"] = round(time.perf_counter() - start, 4)
+            result["code_chars"] = len(code)
+
+            config.CHECKPOINT_DB_PATH = os.path.join(tmp, "checkpoints.sqlite3")
+            checkpointer = create_checkpointer()
+            checkpoint_meter = CheckpointMeter()
+            checkpoint_meter.attach(checkpointer)
+            graph = builder.compile(checkpointer=checkpointer)
+            thread_config = {
+                "configurable": {"thread_id": f"benchmark-{uuid.uuid4()}"},
+                "recursion_limit": 200,
+                "max_concurrency": config.SECTION_DRAFTING_MAX_CONCURRENCY
+            }
+
+            policy = FeedbackPolicy("scripted", FEEDBACK_SCRIPT)
+            current_input, interrupts, update_bytes = new_blog_state(code), 0, 0
+            graph_start = time.perf_counter()
+            while current_input is not None:
+                next_input = None
+                for event in graph.stream(current_input, config=thread_config):
+                    if "__interrupt__" in event:
+                        interrupts += 1
+                        next_input = Command(resume=policy.respond(event["__interrupt__"][0].value))
+                        break
+                    update_bytes += len(serde.dumps_typed(event)[1])
+                current_input = next_input
+            result["graph_seconds"] = round(time.perf_counter() - graph_start, 4)
+
+            state = graph.get_state(thread_config).values
+            result["state_bytes"] = len(serde.dumps_typed(state)[1])
+            if args.trace_memory:
+                _, result["peak_memory_bytes"] = tracemalloc.get_traced_memory()
+            if hasattr(checkpointer, "conn"):
+                checkpointer.conn.close()
+        finally:
+            tracemalloc.stop()
+            logger.handlers = app_handlers
+
+    node_seconds: Dict[str, float] = {}
+    for span in log_handler.spans:
+        node_seconds[span["node"]] = node_seconds.get(span["node"], 0.0) + span["duration_ms"] / 1000
+    result.update({
+        "interrupts": interrupts,
+        "sections": len(state.get("sections", [])),
+        "node_seconds": {node: round(seconds, 4) for node, seconds in sorted(node_seconds.items())},
+        "update_bytes": update_bytes,
+        "checkpoint": checkpoint_meter.summary(),
+        "log_records": log_handler.records,
+        "log_bytes": log_handler.bytes
+    })
+    return result
+
+
+# Relative change of the headline numbers against a previous results file
+def compare(results: List[Dict[str, Any]], baseline_path: str) -> List[str]:
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {run["files"]: run for run in json.load(f)["runs"]}
+    lines = []
+    for run in results:
+        previous = baseline.get(run["files"])
+        if previous is None:
+            continue
+        changes = []
+        for key in ("load_seconds", "graph_seconds", "state_bytes", "peak_memory_bytes", "log_bytes"):
+            if key not in run:
+                continue
+            if previous.get(key):
+                changes.append(f"{key} {100 * (run[key] - previous[key]) / previous[key]:+.1f}%")
+        old_bytes, new_bytes = previous["checkpoint"]["total_bytes"], run["checkpoint"]["total_bytes"]
+        if old_bytes:
+            changes.append(f"checkpoint_bytes {100 * (new_bytes - old_bytes) / old_bytes:+.1f}%")
+        lines.append(f"{run['files']} files: {', '.join(changes)}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the blog graph with a fake LLM on synthetic repositories.")
+    parser.add_argument("--files", default="10,100,1000,10000", help="Comma-separated repository sizes in files")
+    parser.add_argument("--functions", type=int, default=5, help="Methods per synthetic module")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds the fake LLM spends per call")
+    parser.add_argument("--output-words", type=int, default=200, help="Words per fake LLM text answer")
+    parser.add_argument("--sections", type=int, default=5, help="Sections in the fake outline")
+    parser.add_argument("--checkpointer", choices=["sqlite", "memory", "memory-bounded"], default="sqlite")
+    parser.add_argument("--parallel", action="store_true", help="Draft sections in parallel after outline approval")
+    # tracemalloc slows down allocation-heavy code, so timings are more accurate without it
+    parser.add_argument("--no-trace-memory", dest="trace_memory", action="store_false", help="Skip peak memory measurement")
+    parser.add_argument("--output-dir", default="benchmark_results")
+    parser.add_argument("--baseline", help="Previous results file to compare against")
+    args = parser.parse_args()
+
+    # Everything that would reach Groq or a persistent cache is swapped out
+    nodes.models = ModelRegistry.using(FakeChatModel(latency=args.latency, output_words=args.output_words, sections=args.sections))
+    nodes.summary_cache = None
+    config.CHECKPOINTER = args.checkpointer
+    config.PARALLEL_SECTION_DRAFTING = int(args.parallel)
+
+    runs = []
+    for files in (int(size) for size in args.files.split(",")):
+        run = run_scenario(files, args)
+        runs.append(run)
+        memory = f", peak memory {run['peak_memory_bytes'] / 2**20:.1f} MiB" if "peak_memory_bytes" in run else ""
+        print(f"{files:>6} files: load {run['load_seconds']:.3f}s, graph {run['graph_seconds']:.3f}s, "
+              f"checkpoints {run['checkpoint']['total_bytes']} B, logs {run['log_bytes']} B{memory}")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    output_path = os.path.join(args.output_dir, f"benchmark-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "args": vars(args),
+            "settings": {key: getattr(config, key) for key in (
+                "LOG_LEVEL", "LOG_FORMAT", "CODE_SUMMARY_MODE", "CODE_SUMMARY_INPUT", "CHECKPOINT_BLOB_MIN_SIZE",
+                "RETRIEVAL_ENABLED", "LOADER_WORKERS")},
+            "runs": runs
+        }, f, indent=2)
+    print(f"results saved to {output_path}")
+
+    if args.baseline:
+        for line in compare(runs, args.baseline):
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
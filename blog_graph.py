@@ -4,30 +4,51 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from logger_config import logger
 
 
-from langgraph.checkpoint.memory import MemorySaver
-from langgraph.graph import StateGraph, END 
+from langchain_core.runnables import RunnableLambda
+from langgraph.graph import StateGraph, START, END 
 
-from nodes import code_understanding_node, blog_structuring_node, blog_structuring_feedback_node, set_next_section, section_drafting_node, section_drafting_feedback_node
+from nodes import code_understanding_node, blog_structuring_node, blog_structuring_feedback_node, set_next_section, section_drafting_node, section_drafting_feedback_node, parallel_section_drafting_node
+from nodes import ablog_structuring_node, asection_drafting_node, aparallel_section_drafting_node, code_update_node
+import config
 
-from blog_state import BlogState
+from blog_state import BlogState, new_blog_state, update_blog_state
+from streaming import stream_blog_graph
+from checkpointer import create_checkpointer, CheckpointMeter
+from tracing import traced_node
+from metrics import metrics
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
+# Node with an async twin: `stream` runs the sync function, `astream` awaits the async one
+def dual_node(func, afunc, name: str) -> RunnableLambda:
+    return RunnableLambda(traced_node(func, name), afunc=traced_node(afunc, name), name=name)
+
+
 # Build the graph
 builder = StateGraph(BlogState)
-# Register all nodes
-builder.add_node("code_understanding", code_understanding_node)
-builder.add_node("blog_structuring", blog_structuring_node)
-builder.add_node("human_blog_feedback", blog_structuring_feedback_node)
-builder.add_node("set_next_section", set_next_section)
-builder.add_node("section_drafting", section_drafting_node)
-builder.add_node("section_drafting_feedback", section_drafting_feedback_node)
-
-# Set entry point
-builder.set_entry_point("code_understanding")
+# Register all nodes (each run is timed by traced_node)
+builder.add_node("code_understanding", traced_node(code_understanding_node, "code_understanding"))
+builder.add_node("blog_structuring", dual_node(blog_structuring_node, ablog_structuring_node, "blog_structuring"))
+builder.add_node("human_blog_feedback", traced_node(blog_structuring_feedback_node, "human_blog_feedback"))
+builder.add_node("set_next_section", traced_node(set_next_section, "set_next_section"))
+builder.add_node("section_drafting", dual_node(section_drafting_node, asection_drafting_node, "section_drafting"))
+builder.add_node("section_drafting_feedback", traced_node(section_drafting_feedback_node, "section_drafting_feedback"))
+builder.add_node("parallel_section_drafting", dual_node(parallel_section_drafting_node, aparallel_section_drafting_node, "parallel_section_drafting"))
+builder.add_node("code_update", traced_node(code_update_node, "code_update"))
+
+# Entry point: a new blog starts with code understanding; a thread that already has an
+# outline was given changed code (update_blog_state) and only redrafts what the change affects
+# code_update uses Command to go to "set_next_section" (or END when nothing changed)
+def route_start(state: BlogState):
+    return "update" if state.get("sections") else "new"
+
+builder.add_conditional_edges(START, route_start, {
+    "new": "code_understanding",
+    "update": "code_update"
+})
 
 # Linear steps
 builder.add_edge("code_understanding", "blog_structuring")
@@ -35,67 +56,120 @@ builder.add_edge("blog_structuring", "human_blog_feedback")
 
 # Human feedback on blog structure determines next step via Command
 # Command will go to "blog_structuring" (loop) or "set_next_section" (approved)
+# With PARALLEL_SECTION_DRAFTING, approval fans out to "parallel_section_drafting" via Send instead
+builder.add_edge("parallel_section_drafting", "set_next_section")
 
 # Section drafting loop
 builder.add_edge("section_drafting", "section_drafting_feedback")
 # Feedback node uses Command to go either to section_drafting (for revision) or set_next_section (if approved)
 
 # Conditional routing from set_next_section
+# Sections that already have a draft (from parallel drafting) go straight to review,
+# unless a code update made the draft stale
 def should_continue(state: BlogState):
-    return "continue" if state.get("target_section_no") else "end"
+    target_no = state.get("target_section_no")
+    if not target_no:
+        return "end"
+    if target_no in (state.get("stale_sections") or []):
+        return "draft"
+    return "review" if f"section{target_no}" in state.get("section_drafts", {}) else "draft"
 
 builder.add_conditional_edges("set_next_section", should_continue, {
-    "continue": "section_drafting",
+    "draft": "section_drafting",
+    "review": "section_drafting_feedback",
     "end": END
 })
 
 
 # Compile graph with interrupt/checkpoint support
-checkpointer = MemorySaver()
+checkpointer = create_checkpointer()
+checkpoint_meter = CheckpointMeter()
+if config.CHECKPOINT_METRICS:
+    checkpoint_meter.attach(checkpointer)
 blog_agent_graph = builder.compile(checkpointer=checkpointer)
+if config.METRICS_ENABLED:
+    metrics.attach()
+
+
+# Interrupt value a saved session is waiting on, if any
+def pending_interrupt(thread_config):
+    snapshot = blog_agent_graph.get_state(thread_config)
+    for task in snapshot.tasks:
+        if task.interrupts:
+            return task.interrupts[0].value
+    return None
 
 if __name__ == "__main__":
     from functions import load_python_code
     import uuid 
     from langgraph.types import Command
 
-    directory = input("Enter directory path to '.py' files: ")
-    code = load_python_code(directory)
-    initial_state = {
-        "code": code,
-        "code_summary": "",             
-        "section_drafts": {},
-        "completed_sections": [],
-        "skipped_sections": [],
-        "sections": [],
-        "current_section": "",
-        "feedback": {},
-        "target_section_no": ""
-    }
+    thread_id = input("Enter a thread id to resume a saved session (leave empty to start a new blog): ").strip()
     thread_config = {
         "configurable": {
-            "thread_id": str(uuid.uuid4()),
+            "thread_id": thread_id or str(uuid.uuid4()),
             "recursion_limit": 100
-        }
+        },
+        "max_concurrency": config.SECTION_DRAFTING_MAX_CONCURRENCY
     }
+    print(f"Thread id: {thread_config['configurable']['thread_id']}")
+
+    if thread_id:
+        interrupt_value = pending_interrupt(thread_config)
+        if interrupt_value is not None:
+            print(interrupt_value["message"])
+            current_state = Command(resume=input("Your feedback: "))
+        elif blog_agent_graph.get_state(thread_config).values.get("sections"):
+            # A finished blog can be brought up to date with changed code
+            directory = input("This blog is finished. Enter the directory path to update it from (leave empty to exit): ").strip()
+            if not directory:
+                sys.exit(0)
+            current_state = update_blog_state(load_python_code(directory))
+        else:
+            print("Nothing to resume for this thread.")
+            sys.exit(0)
+    else:
+        current_state = None
 
-    current_state = initial_state
+    if current_state is None:
+        directory = input("Enter directory path to '.py' files: ")
+        current_state = new_blog_state(load_python_code(directory))
 
     while True:
-        stream = blog_agent_graph.stream(current_state, config=thread_config)
-        
+        stream = stream_blog_graph(blog_agent_graph, current_state, thread_config)
+        printed_sections = 0
+
         for event in stream:
-            if isinstance(event, dict) and "__interrupt__" in event:
-                interrupt_value = event["__interrupt__"][0].value
+            if event[0] == "interrupt":
+                interrupt_value = event[1]
                 print(interrupt_value["message"])
                 user_input = input("Your feedback: ")
 
                 current_state = Command(resume=user_input)
                 break  # go to outer loop to restart stream
+            elif event[0] == "token":
+                _, node, section_no, text = event
+                # Parallel drafts would interleave on the terminal, so only sequential drafts are echoed
+                if node == "section_drafting":
+                    print(text, end="", flush=True)
+            elif event[0] == "reset":
+                if event[1] == "section_drafting":
+                    print("\n[retrying the draft]", flush=True)
+            elif event[0] == "outline":
+                # A section is complete once the next one has started
+                sections = event[1]
+                for section in sections[printed_sections:-1]:
+                    print(f"{section['no']}. {section['title']}: {section['description']}")
+                printed_sections = max(printed_sections, len(sections) - 1)
             else:
                 # normal node output
-                print(event)
-                current_state = event[1] if isinstance(event, tuple) else current_state
+                update = event[1]
+                for section in (update.get("blog_structuring") or {}).get("sections", [])[printed_sections:]:
+                    print(f"{section['no']}. {section['title']}: {section['description']}")
+                # Outline edited locally from the feedback commands
+                for section in (update.get("human_blog_feedback") or {}).get("sections", []):
+                    print(f"{section['no']}. {section['title']}: {section['description']}")
+                print(f"\n[{', '.join(update.keys())}] done")
         else:
+            metrics.finish_run(thread_config["configurable"]["thread_id"])
             break  # stream finished cleanly
-
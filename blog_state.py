@@ -1,13 +1,57 @@
-from typing import TypedDict, List, Dict, Any
+from typing import TypedDict, List, Dict, Any, Annotated
+
+
+# Reducers: nodes return only the keys they change, and these merge the deltas into the state
+
+# Dict channels: later writes add or replace keys instead of replacing the whole dict
+def merge_dicts(left: Dict[str, Any], right: Dict[str, Any]) -> Dict[str, Any]:
+    return {**(left or {}), **(right or {})}
+
+
+# List channels: later writes append the items that are not present yet
+def append_unique(left: List[str], right: List[str]) -> List[str]:
+    left = list(left or [])
+    return left + [item for item in (right or []) if item not in left]
+
 
 class BlogState(TypedDict):
     code: str                                 
-    section_drafts: Dict[str, str]            
-    completed_sections: List[str]             
-    skipped_sections: List[str]
+    section_drafts: Annotated[Dict[str, str], merge_dicts]
+    completed_sections: Annotated[List[str], append_unique]
+    skipped_sections: Annotated[List[str], append_unique]
 
     code_summary: str            
     sections: List[Dict[str, str]]  
     current_section: str            
-    feedback: Dict[str, Any]
-    target_section_no: str
\ No newline at end of file
+    feedback: Annotated[Dict[str, Any], merge_dicts]
+    target_section_no: str
+
+    # Incremental regeneration: content hash per file of the code the blog was written from,
+    # the files and symbols each section was drafted from, and the sections reopened by a code update
+    file_hashes: Dict[str, str]
+    section_sources: Annotated[Dict[str, Dict[str, Dict[str, str]]], merge_dicts]
+    stale_sections: List[str]
+
+
+# Initial state for a new blog
+def new_blog_state(code: str) -> BlogState:
+    return {
+        "code": code,
+        "code_summary": "",
+        "section_drafts": {},
+        "completed_sections": [],
+        "skipped_sections": [],
+        "sections": [],
+        "current_section": "",
+        "feedback": {},
+        "target_section_no": "",
+        "file_hashes": {},
+        "section_sources": {},
+        "stale_sections": []
+    }
+
+
+# Input that runs a finished blog again on changed code: only the sections drafted from
+# changed files or symbols are redrafted and reviewed (see code_update_node)
+def update_blog_state(code: str) -> Dict[str, Any]:
+    return {"code": code}
@@ -0,0 +1,504 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import logger
+
+import argparse
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langgraph.types import Send
+
+import config
+
+
+BLOB_REF_KEY = "__blob_ref__"
+BLOB_JSON_REF_KEY = "__blob_json_ref__"
+SCALAR_TYPES = (str, int, float, bool, type(None))
+BLOB_HASH_PATTERN = re.compile(rb"[0-9a-f]{64}")
+
+
+# Content-addressed store for large values: each distinct value is written once, keyed by its SHA-256
+class BlobStore:
+    def __init__(self, path: str, cache_size: int = 64):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS blobs (hash TEXT PRIMARY KEY, data BLOB NOT NULL)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._cache_size = cache_size
+
+    def put(self, value: str) -> str:
+        blob_hash = hashlib.sha256(value.encode("utf-8")).hexdigest()
+        with self._lock:
+            # Most values (the code, its summary) are unchanged between checkpoints, so check
+            # before writing: only a new blob costs an insert and a commit
+            if blob_hash not in self._cache and \
+                    self._conn.execute("SELECT 1 FROM blobs WHERE hash = ?", (blob_hash,)).fetchone() is None:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO blobs (hash, data) VALUES (?, ?)", (blob_hash, value.encode("utf-8"))
+                )
+                self._conn.commit()
+            self._remember(blob_hash, value)
+        return blob_hash
+
+    def get(self, blob_hash: str) -> str:
+        with self._lock:
+            if blob_hash in self._cache:
+                self._cache.move_to_end(blob_hash)
+                return self._cache[blob_hash]
+            row = self._conn.execute("SELECT data FROM blobs WHERE hash = ?", (blob_hash,)).fetchone()
+            if row is None:
+                raise KeyError(f"Blob {blob_hash} not found in checkpoint blob store")
+            value = row[0].decode("utf-8")
+            self._remember(blob_hash, value)
+            return value
+
+    # Delete the blobs no checkpoint or pending write refers to, returning how many were deleted.
+    # References are found by scanning every stored row for blob hashes (a stray match only keeps
+    # a blob longer). A new blob is stored just before the checkpoint that refers to it, so this
+    # is an offline step: run `python checkpointer.py --prune` while no blog is being generated.
+    def prune(self) -> int:
+        with self._lock:
+            referenced = set(self._cache)
+            tables = {name for (name,) in self._conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            for table, columns in (("checkpoints", "checkpoint, metadata"), ("writes", "value")):
+                if table not in tables:
+                    continue
+                for row in self._conn.execute(f"SELECT {columns} FROM {table}"):
+                    for data in row:
+                        if data:
+                            data = data if isinstance(data, bytes) else str(data).encode("utf-8")
+                            referenced.update(match.decode("ascii") for match in BLOB_HASH_PATTERN.findall(data))
+            unreferenced = [blob_hash for (blob_hash,) in self._conn.execute("SELECT hash FROM blobs")
+                            if blob_hash not in referenced]
+            self._conn.executemany("DELETE FROM blobs WHERE hash = ?", [(blob_hash,) for blob_hash in unreferenced])
+            self._conn.commit()
+        logger.info(f"pruned {len(unreferenced)} unreferenced checkpoint blobs")
+        return len(unreferenced)
+
+    def _remember(self, blob_hash: str, value: str):
+        self._cache[blob_hash] = value
+        self._cache.move_to_end(blob_hash)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+
+# Serializer that moves large strings out of checkpoints into the blob store and
+# stores a {"__blob_ref__": hash} reference in their place. Large flat containers of plain
+# values (e.g. a content hash per file) are stored the same way, as one JSON blob referenced
+# by {"__blob_json_ref__": hash}
+class BlobRefSerializer(SerializerProtocol):
+    def __init__(self, blob_store: BlobStore, min_blob_size: int, serde: Optional[SerializerProtocol] = None):
+        self.blob_store = blob_store
+        self.min_blob_size = min_blob_size
+        self.serde = serde or JsonPlusSerializer()
+
+    def dumps(self, obj: Any) -> bytes:
+        return self.serde.dumps(self.externalize(obj))
+
+    def loads(self, data: bytes) -> Any:
+        return self.resolve(self.serde.loads(data))
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        return self.serde.dumps_typed(self.externalize(obj))
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        return self.resolve(self.serde.loads_typed(data))
+
+    def externalize(self, obj: Any) -> Any:
+        if isinstance(obj, str):
+            if len(obj) >= self.min_blob_size:
+                return {BLOB_REF_KEY: self.blob_store.put(obj)}
+            return obj
+        flat_json = self.flat_json(obj)
+        if flat_json is not None:
+            return {BLOB_JSON_REF_KEY: self.blob_store.put(flat_json)}
+        if isinstance(obj, dict):
+            return {key: self.externalize(value) for key, value in obj.items()}
+        if isinstance(obj, list):
+            return [self.externalize(value) for value in obj]
+        if isinstance(obj, tuple):
+            return tuple(self.externalize(value) for value in obj)
+        if isinstance(obj, Send):
+            return Send(obj.node, self.externalize(obj.arg))
+        return obj
+
+    # JSON of a dict (with string keys) or list of scalars that reaches the blob size, else None
+    def flat_json(self, obj: Any) -> Optional[str]:
+        if isinstance(obj, dict):
+            if not all(isinstance(key, str) for key in obj):
+                return None
+            values = obj.values()
+        elif isinstance(obj, list):
+            values = obj
+        else:
+            return None
+        if not all(isinstance(value, SCALAR_TYPES) for value in values):
+            return None
+        # Cheap lower bound first: most containers in the state are small
+        size = sum(len(str(value)) for value in values) + (sum(map(len, obj)) if isinstance(obj, dict) else 0)
+        if size < self.min_blob_size:
+            return None
+        return json.dumps(obj, separators=(",", ":"))
+
+    def resolve(self, obj: Any) -> Any:
+        if isinstance(obj, dict):
+            if len(obj) == 1 and BLOB_REF_KEY in obj:
+                return self.blob_store.get(obj[BLOB_REF_KEY])
+            if len(obj) == 1 and BLOB_JSON_REF_KEY in obj:
+                return json.loads(self.blob_store.get(obj[BLOB_JSON_REF_KEY]))
+            return {key: self.resolve(value) for key, value in obj.items()}
+        if isinstance(obj, list):
+            return [self.resolve(value) for value in obj]
+        if isinstance(obj, tuple):
+            return tuple(self.resolve(value) for value in obj)
+        if isinstance(obj, Send):
+            return Send(obj.node, self.resolve(obj.arg))
+        return obj
+
+
+# SqliteSaver whose checkpoint metadata also goes through the blob store: the metadata
+# carries each step's node outputs ("writes") and is serialized separately from the checkpoint
+class BlobRefSqliteSaver(SqliteSaver):
+    serde: BlobRefSerializer
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        return super().put(config, checkpoint, self.serde.externalize(metadata), new_versions)
+
+    def get_tuple(self, config):
+        checkpoint_tuple = super().get_tuple(config)
+        if checkpoint_tuple is None:
+            return None
+        return checkpoint_tuple._replace(metadata=self.serde.resolve(checkpoint_tuple.metadata))
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        for checkpoint_tuple in super().list(config, filter=filter, before=before, limit=limit):
+            yield checkpoint_tuple._replace(metadata=self.serde.resolve(checkpoint_tuple.metadata))
+
+    # Delete a thread's checkpoints and writes. Blobs may be shared with other threads, so they
+    # are left to `python checkpointer.py --prune`
+    def delete_thread(self, thread_id: str):
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM checkpoints WHERE thread_id = ?", (str(thread_id),))
+            cur.execute("DELETE FROM writes WHERE thread_id = ?", (str(thread_id),))
+
+
+# Async counterpart of BlobRefSqliteSaver for graphs run with `astream`. Checkpoint reads and
+# writes go through aiosqlite. Large values are moved to the (synchronous) blob store on a worker
+# thread before serialization, so blob writes never block the event loop; blob reads stay on
+# the loop (small indexed lookups, cached)
+class BlobRefAsyncSqliteSaver(AsyncSqliteSaver):
+    serde: BlobRefSerializer
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        # Set up first: the connection holds a write lock until its setup has run
+        await self.setup()
+        checkpoint, metadata = await asyncio.to_thread(
+            lambda: (self.serde.externalize(checkpoint), self.serde.externalize(metadata))
+        )
+        return await super().aput(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        await self.setup()
+        writes = await asyncio.to_thread(lambda: [(channel, self.serde.externalize(value)) for channel, value in writes])
+        return await super().aput_writes(config, writes, task_id, task_path)
+
+    async def aget_tuple(self, config):
+        checkpoint_tuple = await super().aget_tuple(config)
+        if checkpoint_tuple is None:
+            return None
+        return checkpoint_tuple._replace(metadata=self.serde.resolve(checkpoint_tuple.metadata))
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        async for checkpoint_tuple in super().alist(config, filter=filter, before=before, limit=limit):
+            yield checkpoint_tuple._replace(metadata=self.serde.resolve(checkpoint_tuple.metadata))
+
+    async def adelete_thread(self, thread_id: str):
+        await self.setup()
+        async with self.lock:
+            await self.conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (str(thread_id),))
+            await self.conn.execute("DELETE FROM writes WHERE thread_id = ?", (str(thread_id),))
+            await self.conn.commit()
+
+
+# In-memory checkpointer for long-running processes (e.g. one Streamlit server shared by many
+# sessions). Each thread keeps only its latest checkpoint with that checkpoint's pending writes,
+# which is all LangGraph needs to resume an interrupt; older checkpoints (and the channel values
+# only they used) are dropped as soon as a newer one is saved, so state history is not kept.
+# Threads idle for longer than `ttl_seconds` are evicted, and when the stored bytes exceed
+# `max_bytes` the least recently used threads other than the one being written are evicted.
+class BoundedMemorySaver(MemorySaver):
+    def __init__(self, ttl_seconds: float = 0, max_bytes: int = 0, **kwargs):
+        super().__init__(**kwargs)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        # thread id -> (last access time, stored bytes), least recently used first
+        self._threads: "OrderedDict[str, tuple]" = OrderedDict()
+        # (thread id, namespace) -> (id, channel versions) of the latest checkpoint
+        self._latest: Dict[tuple, tuple] = {}
+        self._total_bytes = 0
+        self._counters = {"compacted_checkpoints": 0, "evicted_ttl": 0, "evicted_memory": 0}
+        self._lock = threading.RLock()
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            # Unknown threads are not looked up, so the storage dicts do not grow an entry for them
+            if thread_id not in self.storage:
+                return None
+            self._touch(thread_id)
+            return super().get_tuple(config)
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        with self._lock:
+            if config and config["configurable"]["thread_id"] not in self.storage:
+                return iter(())
+            return iter(list(super().list(config, filter=filter, before=before, limit=limit)))
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        with self._lock:
+            result = super().put(config, checkpoint, metadata, new_versions)
+            self._compact(thread_id, checkpoint_ns, checkpoint["id"], dict(checkpoint["channel_versions"]))
+            self._measure(thread_id)
+            self._enforce_limits(thread_id)
+        return result
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        key = (thread_id, config["configurable"].get("checkpoint_ns", ""))
+        with self._lock:
+            # Writes are flushed concurrently with checkpoints; those of a compacted checkpoint are stale
+            latest = self._latest.get(key)
+            if latest and config["configurable"]["checkpoint_id"] < latest[0]:
+                return
+            super().put_writes(config, writes, task_id, task_path)
+            self._measure(thread_id)
+            self._enforce_limits(thread_id)
+
+    def delete_thread(self, thread_id: str):
+        with self._lock:
+            super().delete_thread(thread_id)
+            for key in [key for key in self._latest if key[0] == thread_id]:
+                del self._latest[key]
+            _, size = self._threads.pop(thread_id, (0, 0))
+            self._total_bytes -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "threads": len(self._threads),
+                "checkpoints": sum(len(checkpoints) for namespaces in self.storage.values() for checkpoints in namespaces.values()),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                **self._counters
+            }
+
+    # Keep only the latest checkpoint of the namespace, its writes and the channel values it uses
+    def _compact(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str, versions: dict):
+        key = (thread_id, checkpoint_ns)
+        latest = self._latest.get(key)
+        if latest and latest[0] > checkpoint_id:
+            return
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        for old_id in [old_id for old_id in checkpoints if old_id != checkpoint_id]:
+            del checkpoints[old_id]
+            self.writes.pop((thread_id, checkpoint_ns, old_id), None)
+            self._counters["compacted_checkpoints"] += 1
+        if latest:
+            for channel, version in latest[1].items():
+                if versions.get(channel) != version:
+                    self.blobs.pop((thread_id, checkpoint_ns, channel, version), None)
+        self._latest[key] = (checkpoint_id, versions)
+
+    def _touch(self, thread_id: str):
+        _, size = self._threads.get(thread_id, (0, 0))
+        self._threads[thread_id] = (time.monotonic(), size)
+        self._threads.move_to_end(thread_id)
+
+    def _measure(self, thread_id: str):
+        size = 0
+        for checkpoint_ns, checkpoints in self.storage.get(thread_id, {}).items():
+            for checkpoint_id, (checkpoint, metadata, _) in checkpoints.items():
+                size += len(checkpoint[1]) + len(metadata[1])
+                for _, _, value, _ in self.writes.get((thread_id, checkpoint_ns, checkpoint_id), {}).values():
+                    size += len(value[1])
+            latest = self._latest.get((thread_id, checkpoint_ns))
+            for channel, version in (latest[1] if latest else {}).items():
+                blob = self.blobs.get((thread_id, checkpoint_ns, channel, version))
+                if blob is not None:
+                    size += len(blob[1])
+        _, previous = self._threads.get(thread_id, (0, 0))
+        self._total_bytes += size - previous
+        self._threads[thread_id] = (time.monotonic(), size)
+        self._threads.move_to_end(thread_id)
+
+    def _enforce_limits(self, current_thread_id: str):
+        now = time.monotonic()
+        while self.ttl_seconds and self._threads:
+            thread_id, (accessed, _) = next(iter(self._threads.items()))
+            if now - accessed < self.ttl_seconds or thread_id == current_thread_id:
+                break
+            self._evict(thread_id, "evicted_ttl")
+        while self.max_bytes and self._total_bytes > self.max_bytes:
+            thread_id = next((key for key in self._threads if key != current_thread_id), None)
+            if thread_id is None:
+                break
+            self._evict(thread_id, "evicted_memory")
+
+    def _evict(self, thread_id: str, reason: str):
+        self.delete_thread(thread_id)
+        self._counters[reason] += 1
+        logger.warning(f"checkpoint of thread {thread_id} {reason.replace('_', ' by ')}; "
+                       f"{len(self._threads)} threads, {self._total_bytes} bytes kept")
+
+
+def create_bounded_memory_saver() -> BoundedMemorySaver:
+    logger.info(f"using bounded in-memory checkpointer (ttl {config.CHECKPOINT_MEMORY_TTL_MINUTES} min, "
+                f"max {config.CHECKPOINT_MEMORY_MAX_MB} MB)")
+    return BoundedMemorySaver(ttl_seconds=config.CHECKPOINT_MEMORY_TTL_MINUTES * 60,
+                              max_bytes=config.CHECKPOINT_MEMORY_MAX_MB * 1024 * 1024)
+
+
+def checkpoint_serde(path: str) -> BlobRefSerializer:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return BlobRefSerializer(BlobStore(path), min_blob_size=config.CHECKPOINT_BLOB_MIN_SIZE)
+
+
+# Build the checkpointer selected by CHECKPOINTER ("sqlite", "memory" or "memory-bounded")
+def create_checkpointer():
+    if config.CHECKPOINTER == "memory-bounded":
+        return create_bounded_memory_saver()
+    if config.CHECKPOINTER == "memory":
+        logger.info("using in-memory checkpointer")
+        return MemorySaver()
+
+    path = config.CHECKPOINT_DB_PATH
+    logger.info(f"using SQLite checkpointer at {path}")
+    serde = checkpoint_serde(path)
+    return BlobRefSqliteSaver(sqlite3.connect(path, check_same_thread=False), serde=serde)
+
+
+# Async variant of create_checkpointer. The SQLite database is opened in WAL mode so the
+# sync tools (CLI, batch) can read sessions while the service writes; close `saver.conn` on shutdown
+async def create_async_checkpointer():
+    if config.CHECKPOINTER == "memory-bounded":
+        return create_bounded_memory_saver()
+    if config.CHECKPOINTER == "memory":
+        logger.info("using in-memory checkpointer")
+        return MemorySaver()
+
+    import aiosqlite
+
+    path = config.CHECKPOINT_DB_PATH
+    logger.info(f"using async SQLite checkpointer at {path}")
+    serde = checkpoint_serde(path)
+    conn = await aiosqlite.connect(path)
+    await conn.execute("PRAGMA journal_mode=WAL")
+    return BlobRefAsyncSqliteSaver(conn, serde=serde)
+
+
+# Serializer wrapper that reports how many bytes it produces to a CheckpointMeter
+class MeteredSerializer(SerializerProtocol):
+    def __init__(self, serde: SerializerProtocol, meter: "CheckpointMeter"):
+        self.serde = serde
+        self.meter = meter
+
+    def dumps(self, obj: Any) -> bytes:
+        data = self.serde.dumps(obj)
+        self.meter.add_bytes(len(data))
+        return data
+
+    def loads(self, data: bytes) -> Any:
+        return self.serde.loads(data)
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        type_, data = self.serde.dumps_typed(obj)
+        self.meter.add_bytes(len(data))
+        return type_, data
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        return self.serde.loads_typed(data)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.serde, name)
+
+
+# Measurement hook: records the serialized bytes written per graph step (the checkpoint,
+# its metadata and the pending writes of the step's tasks). Byte counts are per process,
+# so run one session at a time when measuring.
+class CheckpointMeter:
+    def __init__(self):
+        self.steps = []
+        self._pending_bytes = 0
+        self._lock = threading.Lock()
+
+    def add_bytes(self, size: int):
+        with self._lock:
+            self._pending_bytes += size
+
+    def attach(self, saver):
+        saver.serde = MeteredSerializer(saver.serde, self)
+        if hasattr(saver, "jsonplus_serde"):
+            saver.jsonplus_serde = MeteredSerializer(saver.jsonplus_serde, self)
+
+        put = saver.put
+
+        # Pending writes are flushed before the checkpoint that closes their step
+        def metered_put(config, checkpoint, metadata, new_versions):
+            result = put(config, checkpoint, metadata, new_versions)
+            self.record_step(config, metadata)
+            return result
+
+        saver.put = metered_put
+        return saver
+
+    def record_step(self, config, metadata):
+        with self._lock:
+            size, self._pending_bytes = self._pending_bytes, 0
+        step = {
+            "thread_id": config.get("configurable", {}).get("thread_id"),
+            "step": metadata.get("step"),
+            "source": metadata.get("source"),
+            "bytes": size
+        }
+        self.steps.append(step)
+        logger.info(f"checkpoint step {step['step']} ({step['source']}): {size} bytes")
+
+    def summary(self) -> dict:
+        sizes = [step["bytes"] for step in self.steps]
+        return {
+            "steps": len(sizes),
+            "total_bytes": sum(sizes),
+            "max_step_bytes": max(sizes, default=0),
+            "mean_step_bytes": sum(sizes) / len(sizes) if sizes else 0
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintenance of the SQLite checkpoint database.")
+    parser.add_argument("--db", default=config.CHECKPOINT_DB_PATH, help="Checkpoint database (default: CHECKPOINT_DB_PATH)")
+    parser.add_argument("--prune", action="store_true",
+                        help="Delete stored blobs that no checkpoint refers to (run while no blog is being generated)")
+    args = parser.parse_args()
+
+    if not args.prune:
+        parser.error("nothing to do, pass --prune")
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} does not exist")
+    print(f"pruned {BlobStore(args.db).prune()} unreferenced blobs from {args.db}")
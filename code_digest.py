@@ -0,0 +1,209 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import logger
+
+import ast
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import config
+
+
+GRAPH_HEADER = "<module dependency graph>"
+
+
+def first_paragraph(docstring: Optional[str], max_chars: int = 300) -> str:
+    if not docstring:
+        return ""
+    paragraph = docstring.strip().split("\n\n")[0]
+    paragraph = " ".join(line.strip() for line in paragraph.splitlines())
+    return paragraph if len(paragraph) <= max_chars else paragraph[:max_chars] + "..."
+
+
+def call_name(node: ast.Call) -> Optional[str]:
+    func = node.func
+    parts = []
+    while isinstance(func, ast.Attribute):
+        parts.append(func.attr)
+        func = func.value
+    if isinstance(func, ast.Name):
+        parts.append(func.id)
+        return ".".join(reversed(parts))
+    return None
+
+
+def describe_function(node, indent: str = "") -> Dict[str, Any]:
+    prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+    returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+    calls = sorted({name for child in ast.walk(node) if isinstance(child, ast.Call) and (name := call_name(child))})
+    return {
+        "decorators": [f"{indent}@{ast.unparse(decorator)}" for decorator in node.decorator_list],
+        "signature": f"{indent}{prefix} {node.name}({ast.unparse(node.args)}){returns}",
+        "doc": first_paragraph(ast.get_docstring(node), 160),
+        "calls": calls
+    }
+
+
+# Parse one file and extract its structure. Runs in worker processes, so it only returns plain data.
+def digest_file(file_path: str, source: str) -> Dict[str, Any]:
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError) as e:
+        return {"path": file_path, "error": f"{type(e).__name__}: {e}"}
+
+    imports, classes, functions = [], [], []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imports.extend((alias.name, None, 0, alias.asname) for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            imports.extend((node.module or "", alias.name, node.level, alias.asname) for alias in node.names)
+
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            functions.append(describe_function(node))
+        elif isinstance(node, ast.ClassDef):
+            bases = ", ".join(ast.unparse(base) for base in node.bases)
+            classes.append({
+                "decorators": [f"@{ast.unparse(decorator)}" for decorator in node.decorator_list],
+                "signature": f"class {node.name}({bases})" if bases else f"class {node.name}",
+                "doc": first_paragraph(ast.get_docstring(node), 160),
+                "methods": [
+                    describe_function(child, indent="    ") for child in node.body
+                    if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef))
+                ]
+            })
+
+    return {
+        "path": file_path,
+        "docstring": first_paragraph(ast.get_docstring(tree)),
+        "imports": imports,
+        "classes": classes,
+        "functions": functions,
+        "error": None
+    }
+
+
+def _digest_file_args(args: Tuple[str, str]) -> Dict[str, Any]:
+    return digest_file(*args)
+
+
+# Dotted module names for the given files. Names are relative to the common directory of the
+# files or, when that directory is itself a package (has an __init__.py among the files), to the
+# directory containing the top-level package, so `repo/pkg/a.py` is `pkg.a` as it is imported
+def module_names(file_paths: List[str]) -> Dict[str, str]:
+    if not file_paths:
+        return {}
+    abs_paths = {path: os.path.abspath(path) for path in file_paths}
+    root = os.path.commonpath([os.path.dirname(abs_path) for abs_path in abs_paths.values()])
+    loaded = set(abs_paths.values())
+    while os.path.join(root, "__init__.py") in loaded and os.path.dirname(root) != root:
+        root = os.path.dirname(root)
+    names = {}
+    for path, abs_path in abs_paths.items():
+        parts = os.path.splitext(os.path.relpath(abs_path, root))[0].split(os.sep)
+        if parts[-1] == "__init__" and len(parts) > 1:
+            parts = parts[:-1]
+        names[path] = ".".join(parts)
+    return names
+
+
+# Map the names a module imports to the repo modules (or module members) they refer to
+def resolve_imports(module: str, is_package: bool, imports, repo_modules) -> Tuple[List[str], Dict[str, str]]:
+    dependencies, bound_names = set(), {}
+    package_parts = module.split(".") if is_package else module.split(".")[:-1]
+    for imported, name, level, alias in imports:
+        if level:
+            base = package_parts[:len(package_parts) - (level - 1)] if level > 1 else package_parts
+            imported = ".".join(base + ([imported] if imported else []))
+        if name is None:
+            if imported in repo_modules:
+                dependencies.add(imported)
+                bound_names[alias or imported] = imported
+            continue
+        candidate = f"{imported}.{name}" if imported else name
+        if candidate in repo_modules:
+            dependencies.add(candidate)
+            bound_names[alias or name] = candidate
+        elif imported in repo_modules:
+            dependencies.add(imported)
+            bound_names[alias or name] = candidate
+    dependencies.discard(module)
+    return sorted(dependencies), bound_names
+
+
+def repo_calls(calls: List[str], bound_names: Dict[str, str]) -> List[str]:
+    resolved = []
+    for call in calls:
+        head, _, rest = call.partition(".")
+        if head in bound_names:
+            resolved.append(f"{bound_names[head]}.{rest}" if rest else bound_names[head])
+    return resolved
+
+
+def render_functions(functions: List[Dict[str, Any]], bound_names: Dict[str, str]) -> List[str]:
+    lines = []
+    for function in functions:
+        lines.extend(function["decorators"])
+        line = function["signature"]
+        if function["doc"]:
+            line += f"  # {function['doc']}"
+        lines.append(line)
+        calls = repo_calls(function["calls"], bound_names)
+        if calls:
+            indent = function["signature"][:len(function["signature"]) - len(function["signature"].lstrip())]
+            lines.append(f"{indent}    # calls: {', '.join(calls)}")
+    return lines
+
+
+# Build compact digests of the given (file path, source) pairs: module docstrings, imports,
+# class/function signatures with decorators, intra-repo calls, plus a module dependency graph.
+# Files that fail to parse are kept as full source. Large inputs are parsed in a process pool.
+def build_code_digest(files: List[Tuple[str, str]], workers: int = None) -> List[Tuple[str, str]]:
+    workers = workers or config.DIGEST_WORKERS
+    if len(files) >= config.DIGEST_POOL_MIN_FILES and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            digests = list(executor.map(_digest_file_args, files, chunksize=16))
+    else:
+        digests = [digest_file(file_path, source) for file_path, source in files]
+
+    names = module_names([file_path for file_path, _ in files])
+    repo_modules = set(names.values())
+    repo_roots = {module.split(".")[0] for module in repo_modules}
+    sources = dict(files)
+    rendered, graph = [], []
+    for digest in digests:
+        file_path = digest["path"]
+        if digest["error"]:
+            logger.info(f"Could not parse {file_path} ({digest['error']}), keeping full source")
+            rendered.append((file_path, sources[file_path]))
+            continue
+
+        module = names[file_path]
+        is_package = os.path.basename(file_path) == "__init__.py"
+        dependencies, bound_names = resolve_imports(module, is_package, digest["imports"], repo_modules)
+        external = sorted({imported for imported, _, level, _ in digest["imports"]
+                           if not level and imported and imported.split(".")[0] not in repo_roots})
+
+        lines = [f"module {module}"]
+        if digest["docstring"]:
+            lines.append(f'"""{digest["docstring"]}"""')
+        if external:
+            lines.append(f"imports: {', '.join(external)}")
+        if dependencies:
+            lines.append(f"uses repo modules: {', '.join(dependencies)}")
+            graph.append(f"{module} -> {', '.join(dependencies)}")
+        for cls in digest["classes"]:
+            lines.extend(cls["decorators"])
+            lines.append(cls["signature"] + (f"  # {cls['doc']}" if cls["doc"] else ""))
+            lines.extend(render_functions(cls["methods"], bound_names))
+        lines.extend(render_functions(digest["functions"], bound_names))
+        rendered.append((file_path, "\n".join(lines)))
+
+    if graph:
+        rendered.append((GRAPH_HEADER, "\n".join(graph)))
+
+    original_size = sum(len(source) for _, source in files)
+    digest_size = sum(len(text) for _, text in rendered)
+    logger.info(f"code digest: {original_size} -> {digest_size} characters for {len(files)} files")
+    return rendered
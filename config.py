@@ -0,0 +1,190 @@
+# config.py
+# Runtime settings for the blog agent, read from the environment (and .env).
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def env_str(name: str, default: str) -> str:
+    value = os.getenv(name)
+    return value if value not in (None, "") else default
+
+
+# Code understanding
+# "single" sends the whole codebase in one prompt, "map_reduce" summarizes files
+# concurrently and merges the partial summaries, "auto" picks based on code size.
+CODE_SUMMARY_MODE = env_str("CODE_SUMMARY_MODE", "auto")
+# Codebases larger than this (in characters) are summarized with map-reduce in "auto" mode
+CODE_SUMMARY_MAP_REDUCE_THRESHOLD = env_int("CODE_SUMMARY_MAP_REDUCE_THRESHOLD", 24000)
+# Files larger than this (in characters) are split into several map chunks
+CODE_SUMMARY_CHUNK_CHARS = env_int("CODE_SUMMARY_CHUNK_CHARS", 12000)
+# Maximum number of concurrent LLM calls during the map and reduce phases
+CODE_SUMMARY_MAX_CONCURRENCY = env_int("CODE_SUMMARY_MAX_CONCURRENCY", 4)
+# Maximum number of partial summaries merged by a single reduce call
+CODE_SUMMARY_REDUCE_FAN_IN = env_int("CODE_SUMMARY_REDUCE_FAN_IN", 8)
+# Maximum combined size (in characters) of the partial summaries in a single reduce call
+CODE_SUMMARY_REDUCE_MAX_CHARS = env_int("CODE_SUMMARY_REDUCE_MAX_CHARS", 16000)
+
+# Deduplication
+# Collapse identical files and near-duplicates into one representative each before the code is summarized
+DEDUP_ENABLED = env_int("DEDUP_ENABLED", 1)
+# Estimated Jaccard similarity of token shingles from which files count as near-duplicates (0 disables)
+DEDUP_NEAR_DUPLICATE_THRESHOLD = float(env_str("DEDUP_NEAR_DUPLICATE_THRESHOLD", "0.85"))
+# Lower threshold for generated modules of the same kind (protobuf, migrations, files with a
+# generator header comment), which share the generator's boilerplate (0 disables)
+DEDUP_GENERATED_THRESHOLD = float(env_str("DEDUP_GENERATED_THRESHOLD", "0.6"))
+
+# Summary cache
+# Per-file and merged summaries are cached on disk so unchanged files are not re-summarized
+SUMMARY_CACHE_ENABLED = env_int("SUMMARY_CACHE_ENABLED", 1)
+CACHE_DIR = env_str("BLOG_AGENT_CACHE_DIR", ".cache")
+SUMMARY_CACHE_MAX_MB = env_int("SUMMARY_CACHE_MAX_MB", 100)
+SUMMARY_CACHE_MAX_AGE_DAYS = env_int("SUMMARY_CACHE_MAX_AGE_DAYS", 30)
+# Bump when the summarization prompts change so stale summaries are not reused
+SUMMARY_PROMPT_VERSION = env_str("SUMMARY_PROMPT_VERSION", "v1")
+
+# Section drafting
+# Draft all sections concurrently as soon as the outline is approved, then review them one by one
+PARALLEL_SECTION_DRAFTING = env_int("PARALLEL_SECTION_DRAFTING", 0)
+# Maximum number of graph tasks (e.g. parallel section drafts) run at the same time
+SECTION_DRAFTING_MAX_CONCURRENCY = env_int("SECTION_DRAFTING_MAX_CONCURRENCY", 8)
+# Draft the next section in the background while the current one is under review
+SPECULATIVE_DRAFTING = env_int("SPECULATIVE_DRAFTING", 0)
+SPECULATIVE_DRAFTING_WORKERS = env_int("SPECULATIVE_DRAFTING_WORKERS", 4)
+# Sessions whose speculative draft is kept in memory; the least recently reviewed are dropped
+SPECULATIVE_DRAFTING_MAX_THREADS = env_int("SPECULATIVE_DRAFTING_MAX_THREADS", 256)
+
+# Checkpointing
+# "sqlite" keeps sessions across restarts, "memory" keeps them only for the life of the process,
+# "memory-bounded" keeps only each session's latest checkpoint in memory, within the limits below
+CHECKPOINTER = env_str("CHECKPOINTER", "sqlite")
+# "memory-bounded": sessions idle for longer than this are dropped (0 keeps them)
+CHECKPOINT_MEMORY_TTL_MINUTES = env_int("CHECKPOINT_MEMORY_TTL_MINUTES", 120)
+# "memory-bounded": above this size the least recently used sessions are dropped (0 for no cap)
+CHECKPOINT_MEMORY_MAX_MB = env_int("CHECKPOINT_MEMORY_MAX_MB", 256)
+CHECKPOINT_DB_PATH = env_str("CHECKPOINT_DB_PATH", os.path.join(CACHE_DIR, "checkpoints.sqlite3"))
+# Strings at least this long (e.g. the code and its summary) are stored once by content hash
+# and referenced from checkpoints instead of being copied into every checkpoint
+CHECKPOINT_BLOB_MIN_SIZE = env_int("CHECKPOINT_BLOB_MIN_SIZE", 4096)
+# Log the serialized bytes written per checkpoint step (see CheckpointMeter)
+CHECKPOINT_METRICS = env_int("CHECKPOINT_METRICS", 0)
+
+# Logging and tracing
+LOG_LEVEL = env_str("LOG_LEVEL", "DEBUG")
+# "text" for human-readable lines, "json" for one JSON object per line
+LOG_FORMAT = env_str("LOG_FORMAT", "text")
+# Optional log file; logs go to the console when empty
+LOG_FILE = env_str("LOG_FILE", "")
+# Logged strings longer than this are truncated and replaced by their length and hash
+LOG_MAX_FIELD_CHARS = env_int("LOG_MAX_FIELD_CHARS", 200)
+# Logged lists longer than this show only their first items
+LOG_MAX_ITEMS = env_int("LOG_MAX_ITEMS", 20)
+
+# LLM response cache
+# "off", "read_write" (serve hits, store misses), "record" (always call the LLM and store)
+# or "replay" (serve recorded responses only; a miss is an error, so runs stay offline)
+LLM_CACHE_MODE = env_str("LLM_CACHE_MODE", "off")
+LLM_CACHE_PATH = env_str("LLM_CACHE_PATH", os.path.join(CACHE_DIR, "llm_responses.sqlite3"))
+LLM_CACHE_MAX_ENTRIES = env_int("LLM_CACHE_MAX_ENTRIES", 10000)
+# Responses older than this are refreshed (0 keeps them forever); recordings never expire in replay mode
+LLM_CACHE_TTL_HOURS = env_int("LLM_CACHE_TTL_HOURS", 168)
+
+# LLM client
+# Request and token budgets shared by all sessions in the process (0 disables a limit). Each
+# provider has its own budget, so a fallback to another provider is not held back by the first.
+# The defaults are Groq's free-tier limits for llama-3.1-8b-instant; raise them on paid plans.
+LLM_REQUESTS_PER_MINUTE = env_int("LLM_REQUESTS_PER_MINUTE", 30)
+LLM_TOKENS_PER_MINUTE = env_int("LLM_TOKENS_PER_MINUTE", 6000)
+# Per-provider "requests/tokens" per minute overriding the two limits above,
+# e.g. "openai=500/200000,google=15/1000000"
+LLM_PROVIDER_RATE_LIMITS = env_str("LLM_PROVIDER_RATE_LIMITS", "")
+# Completion tokens assumed per request when budgeting tokens per minute
+LLM_COMPLETION_TOKENS_ESTIMATE = env_int("LLM_COMPLETION_TOKENS_ESTIMATE", 512)
+LLM_MAX_RETRIES = env_int("LLM_MAX_RETRIES", 3)
+LLM_RETRY_BASE_DELAY = float(env_str("LLM_RETRY_BASE_DELAY", "1.0"))
+LLM_RETRY_MAX_DELAY = float(env_str("LLM_RETRY_MAX_DELAY", "60.0"))
+
+# Models
+# Comma-separated "provider:model" fallback chain (providers: groq, openai, google, fake).
+# Later models are tried when the ones before fail or time out.
+LLM_MODELS = env_str("LLM_MODELS", "groq:llama-3.1-8b-instant")
+# Per-stage chains; empty uses LLM_MODELS. "summary" is the map/reduce code summarization,
+# "outline" the blog structure and "draft" the section drafts.
+LLM_MODELS_SUMMARY = env_str("LLM_MODELS_SUMMARY", "")
+LLM_MODELS_OUTLINE = env_str("LLM_MODELS_OUTLINE", "")
+LLM_MODELS_DRAFT = env_str("LLM_MODELS_DRAFT", "")
+# Per-request timeout, so a slow model hands over to the next one in its chain (0 for none)
+LLM_REQUEST_TIMEOUT_SECONDS = float(env_str("LLM_REQUEST_TIMEOUT_SECONDS", "60"))
+# A model that failed is tried last in every chain for this long
+LLM_MODEL_COOLDOWN_SECONDS = float(env_str("LLM_MODEL_COOLDOWN_SECONDS", "30"))
+
+# Source loading
+# Extra comma-separated gitignore-style globs to skip, e.g. "tests/,*_pb2.py"
+LOADER_EXCLUDE = [pattern.strip() for pattern in env_str("LOADER_EXCLUDE", "").split(",") if pattern.strip()]
+LOADER_USE_GITIGNORE = env_int("LOADER_USE_GITIGNORE", 1)
+LOADER_MAX_FILE_KB = env_int("LOADER_MAX_FILE_KB", 512)
+LOADER_MAX_TOTAL_MB = env_int("LOADER_MAX_TOTAL_MB", 50)
+LOADER_WORKERS = env_int("LOADER_WORKERS", 8)
+
+# Code digest
+# What the code summary is built from: "source" (full file contents), "digest" (AST digest of
+# docstrings, signatures, imports and the module dependency graph) or "auto" (digest when the
+# code is longer than CODE_SUMMARY_MAP_REDUCE_THRESHOLD)
+CODE_SUMMARY_INPUT = env_str("CODE_SUMMARY_INPUT", "auto")
+DIGEST_WORKERS = env_int("DIGEST_WORKERS", os.cpu_count() or 1)
+# Files are parsed in a process pool only from this many files on; small repos are parsed inline
+DIGEST_POOL_MIN_FILES = env_int("DIGEST_POOL_MIN_FILES", 200)
+
+# Token budgets
+# tiktoken encoding used to count tokens (an approximation for non-OpenAI models)
+TOKENIZER_ENCODING = env_str("TOKENIZER_ENCODING", "cl100k_base")
+# Context window to budget prompts for; 0 uses the model's own window. Set it to your
+# tokens-per-minute limit on rate-limited plans, since larger requests are rejected outright.
+LLM_CONTEXT_TOKENS = env_int("LLM_CONTEXT_TOKENS", 0)
+# Completion tokens reserved for (and capped at) each answer
+LLM_OUTPUT_TOKENS = env_int("LLM_OUTPUT_TOKENS", 2048)
+# Share of the prompt budget kept free to absorb tokenizer differences
+TOKEN_SAFETY_MARGIN_PERCENT = env_int("TOKEN_SAFETY_MARGIN_PERCENT", 10)
+
+# Code retrieval for section drafts
+RETRIEVAL_ENABLED = env_int("RETRIEVAL_ENABLED", 1)
+# Snippets added to each section prompt, and their combined token limit
+RETRIEVAL_TOP_K = env_int("RETRIEVAL_TOP_K", 5)
+RETRIEVAL_MAX_TOKENS = env_int("RETRIEVAL_MAX_TOKENS", 1500)
+RETRIEVAL_CHUNK_CHARS = env_int("RETRIEVAL_CHUNK_CHARS", 2000)
+# Number of codebases whose index is kept in memory
+RETRIEVAL_INDEX_CACHE_SIZE = env_int("RETRIEVAL_INDEX_CACHE_SIZE", 4)
+
+# Metrics
+# Record per-node, LLM, revision and reviewer-wait metrics; each finished run writes
+# <thread id>.json and a Prometheus text file (metrics.prom) to METRICS_DIR
+METRICS_ENABLED = env_int("METRICS_ENABLED", 1)
+METRICS_DIR = env_str("METRICS_DIR", "metrics")
+# Per-thread totals of runs that never finish are dropped after this long without activity,
+# and at most this many threads are tracked at once
+METRICS_RUN_TTL_MINUTES = env_int("METRICS_RUN_TTL_MINUTES", 1440)
+METRICS_MAX_RUNS = env_int("METRICS_MAX_RUNS", 10000)
+# Used for the estimated cost; the defaults are Groq's prices for llama-3.1-8b-instant
+LLM_COST_PER_MILLION_INPUT_TOKENS = float(env_str("LLM_COST_PER_MILLION_INPUT_TOKENS", "0.05"))
+LLM_COST_PER_MILLION_OUTPUT_TOKENS = float(env_str("LLM_COST_PER_MILLION_OUTPUT_TOKENS", "0.08"))
+
+# Streamlit app
+# Seconds between progress refreshes while the agent runs in the background
+UI_POLL_SECONDS = float(env_str("UI_POLL_SECONDS", "0.5"))
+
+# HTTP service
+# Idle sessions kept in memory (their state stays in the checkpointer); the oldest are dropped first
+SERVICE_MAX_SESSIONS = env_int("SERVICE_MAX_SESSIONS", 1000)
+# Events of the current run kept per session for Server-Sent Events clients that (re)connect late
+SERVICE_EVENT_BUFFER = env_int("SERVICE_EVENT_BUFFER", 2000)
+# Seconds between keep-alive comments on idle event streams
+SERVICE_KEEPALIVE_SECONDS = float(env_str("SERVICE_KEEPALIVE_SECONDS", "15"))
+# Allow POST /threads to load code from a server-side directory ({"path": ...})
+SERVICE_ALLOW_PATHS = env_int("SERVICE_ALLOW_PATHS", 0)
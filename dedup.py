@@ -0,0 +1,168 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import logger
+
+import hashlib
+import heapq
+import re
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import config
+from summary_cache import content_hash
+from token_budget import count_tokens
+
+
+# Deduplication of the summarization input: exact copies (same content hash) and near-duplicates
+# (MinHash similarity of token shingles) are collapsed into one representative file each.
+# Generated modules (protobuf, migrations, files with a generator header) of the same kind count
+# as near-duplicates from the lower DEDUP_GENERATED_THRESHOLD, since they share the generator's
+# boilerplate. The collapsed files are listed in a note, which the caller appends to the input
+# as a NOTE_HEADER entry (after any digest step, since it is not a source file) so the summary
+# can still mention them.
+
+NOTE_HEADER = "<deduplicated files>"
+SHINGLE_TOKENS = 5
+SKETCH_SIZE = 128
+# Files with fewer shingles than this are too small for a meaningful similarity estimate
+MIN_SHINGLES = 20
+# Files sharing a sketch value are paired with each other up to this many files; beyond it
+# (many copies, or common boilerplate) each file is paired only with the first ones, which
+# still finds every copy of a widely copied file without a quadratic number of pairs
+POSTING_ANCHORS = 16
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+GENERATED_PATHS = [
+    ("protobuf", re.compile(r"_pb2(_grpc)?\.py$")),
+    ("migration", re.compile(r"(^|/)migrations/\d{4}_\w*\.py$")),
+]
+# Generator header comments, e.g. "# @generated", "# Generated by Django 4.2 on ...",
+# "# Generated by the protocol buffer compiler.  DO NOT EDIT!"
+GENERATED_MARKER = re.compile(r"^#.*(?:@generated\b|\bdo not edit\b)|^#\s*(?:auto-?)?generated by\b", re.IGNORECASE | re.MULTILINE)
+
+
+# Kind of generated code ("protobuf", "migration", "generated"), or None for hand-written files
+def generated_kind(path: str, source: str) -> Optional[str]:
+    normalized = path.replace("\\", "/")
+    for kind, pattern in GENERATED_PATHS:
+        if pattern.search(normalized):
+            return kind
+    # Generators put their marker in the first lines of the file
+    if GENERATED_MARKER.search("\n".join(source.splitlines()[:10])):
+        return "generated"
+    return None
+
+
+# Bottom-k MinHash sketch: the SKETCH_SIZE smallest hashes of the file's token shingles
+def minhash_sketch(source: str) -> Optional[frozenset]:
+    tokens = TOKEN_PATTERN.findall(source)
+    if len(tokens) < SHINGLE_TOKENS + MIN_SHINGLES:
+        return None
+    shingles = {" ".join(tokens[i:i + SHINGLE_TOKENS]) for i in range(len(tokens) - SHINGLE_TOKENS + 1)}
+    hashes = {int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big") for shingle in shingles}
+    return frozenset(heapq.nsmallest(SKETCH_SIZE, hashes))
+
+
+# Jaccard similarity estimated from two bottom-k sketches
+def estimate_similarity(first: frozenset, second: frozenset) -> float:
+    union = heapq.nsmallest(SKETCH_SIZE, first | second)
+    return sum(value in first and value in second for value in union) / len(union)
+
+
+# Pairs of files (indexes into `sketches`) whose estimated similarity is at least `threshold`
+def near_duplicate_pairs(sketches: List[Optional[frozenset]], threshold: float) -> List[Tuple[int, int, float]]:
+    postings = defaultdict(list)
+    for index, sketch in enumerate(sketches):
+        for value in sketch or ():
+            postings[value].append(index)
+    shared = defaultdict(int)
+    for indexes in postings.values():
+        for i, first in enumerate(indexes[:POSTING_ANCHORS]):
+            for second in indexes[i + 1:]:
+                shared[(first, second)] += 1
+    # Similar sets share roughly `similarity * SKETCH_SIZE` values; looser to allow for sketch noise
+    min_shared = threshold * SKETCH_SIZE / 2
+    pairs = []
+    for (first, second), count in shared.items():
+        if count >= min_shared:
+            similarity = estimate_similarity(sketches[first], sketches[second])
+            if similarity >= threshold:
+                pairs.append((first, second, similarity))
+    return pairs
+
+
+# Collapse duplicate and generated files. Returns the kept files in their original order, the
+# note listing the collapsed ones ("" if none) and a report of what was collapsed and the bytes
+# and tokens saved.
+def dedupe_code_files(files: List[Tuple[str, str]], threshold: float = None,
+                      generated_threshold: float = None) -> Tuple[List[Tuple[str, str]], str, Dict]:
+    threshold = config.DEDUP_NEAR_DUPLICATE_THRESHOLD if threshold is None else threshold
+    generated_threshold = config.DEDUP_GENERATED_THRESHOLD if generated_threshold is None else generated_threshold
+    # index of a collapsed file -> (index of its representative, category, reason)
+    collapsed: Dict[int, Tuple[int, str, str]] = {}
+
+    first_by_hash = {}
+    for index, (_, source) in enumerate(files):
+        key = content_hash(source.strip())
+        if key in first_by_hash:
+            collapsed[index] = (first_by_hash[key], "identical", "identical")
+        else:
+            first_by_hash[key] = index
+
+    candidate_threshold = min(value for value in (threshold, generated_threshold) if value > 0) \
+        if threshold > 0 or generated_threshold > 0 else 0
+    if candidate_threshold > 0:
+        remaining = [index for index in range(len(files)) if index not in collapsed]
+        kinds = [generated_kind(*files[index]) for index in remaining]
+        sketches = [minhash_sketch(files[index][1]) for index in remaining]
+        # Each near-duplicate is collapsed into the earliest file it resembles
+        for first, second, similarity in sorted(near_duplicate_pairs(sketches, candidate_threshold)):
+            same_kind = kinds[first] is not None and kinds[first] == kinds[second]
+            if same_kind and generated_threshold > 0 and similarity >= generated_threshold:
+                category, reason = "generated", f"{kinds[first]} code, ~{similarity:.0%} similar"
+            elif threshold > 0 and similarity >= threshold:
+                category, reason = "near_duplicate", f"~{similarity:.0%} similar"
+            else:
+                continue
+            first, second = remaining[first], remaining[second]
+            if second in collapsed:
+                continue
+            while first in collapsed:
+                first = collapsed[first][0]
+            if first != second:
+                collapsed[second] = (first, category, reason)
+
+    # A representative may itself have been collapsed later; point at the file that is kept
+    for index, (representative, category, reason) in list(collapsed.items()):
+        while representative in collapsed:
+            representative = collapsed[representative][0]
+        collapsed[index] = (representative, category, reason)
+
+    notes = {
+        index: f"# {files[index][0]}: {reason}, represented by {files[representative][0]}"
+        for index, (representative, _, reason) in collapsed.items()
+    }
+    # Files shorter than their note line (e.g. empty __init__.py files) are cheaper to keep
+    for index, note in notes.items():
+        if len(files[index][1]) <= len(note):
+            del collapsed[index]
+    note_lines = [notes[index] for index in sorted(collapsed)]
+    kept = [item for index, item in enumerate(files) if index not in collapsed]
+    note_source = "# Files left out of this input as duplicates or generated code:\n" + "\n".join(note_lines) if note_lines else ""
+
+    removed_sources = [files[index][1] for index in collapsed]
+    report = {
+        "files": len(files),
+        "collapsed": len(collapsed),
+        "identical": sum(category == "identical" for _, category, _ in collapsed.values()),
+        "near_duplicates": sum(category == "near_duplicate" for _, category, _ in collapsed.values()),
+        "generated": sum(category == "generated" for _, category, _ in collapsed.values()),
+        "bytes_saved": sum(len(source.encode("utf-8")) for source in removed_sources) - len(note_source.encode("utf-8")),
+        "tokens_saved": sum(count_tokens(source) for source in removed_sources) - (count_tokens(note_source) if note_lines else 0)
+    }
+    if collapsed:
+        logger.info(f"dedup: collapsed {report['collapsed']} of {report['files']} files "
+                    f"({report['identical']} identical, {report['near_duplicates']} near-duplicates, "
+                    f"{report['generated']} generated), saving {report['bytes_saved']} bytes / {report['tokens_saved']} tokens")
+    return kept, note_source, report
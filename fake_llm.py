@@ -0,0 +1,81 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import logger
+
+import hashlib
+import json
+import time
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+
+WORDS = (
+    "the graph loads code summarizes modules drafts sections and checkpoints state while "
+    "reviewers approve outlines so each node streams tokens through a shared client"
+).split()
+
+
+# Deterministic stand-in for the chat model, used by benchmarks and offline runs. The answer
+# depends only on the prompt, `latency` seconds are spent per call and text answers are
+# `output_words` words long. Structured output (bound tools) returns an outline of `sections`.
+class FakeChatModel(BaseChatModel):
+    model_name: str = "fake-chat-model"
+    latency: float = 0.0
+    output_words: int = 200
+    sections: int = 5
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"model_name": self.model_name, "output_words": self.output_words, "sections": self.sections}
+
+    def bind_tools(self, tools, tool_choice=None, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _answer(self, messages: List[BaseMessage], **kwargs: Any) -> AIMessage:
+        seed = int(hashlib.sha256("".join(str(message.content) for message in messages).encode("utf-8")).hexdigest(), 16)
+        tools = kwargs.get("tools")
+        if tools:
+            args = {"sections": [
+                {"title": f"Section {i + 1}: {WORDS[(seed + i) % len(WORDS)]}",
+                 "description": " ".join(WORDS[(seed + i + j) % len(WORDS)] for j in range(12))}
+                for i in range(self.sections)
+            ]}
+            return AIMessage(content="", tool_calls=[{"name": tools[0]["function"]["name"], "args": args, "id": f"call_{seed % 10**8}"}])
+        return AIMessage(content=" ".join(WORDS[(seed + i) % len(WORDS)] for i in range(self.output_words)))
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._answer(messages, **kwargs))])
+
+    # Streams words (or tool-call argument fragments) with the latency spread over the chunks
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        message = self._answer(messages, **kwargs)
+        if message.tool_calls:
+            tool_call = message.tool_calls[0]
+            args = json.dumps(tool_call["args"])
+            pieces = [args[i:i + 16] for i in range(0, len(args), 16)]
+            chunks = [
+                AIMessageChunk(content="", tool_call_chunks=[{
+                    "name": tool_call["name"] if i == 0 else None, "args": piece,
+                    "id": tool_call["id"] if i == 0 else None, "index": 0
+                }])
+                for i, piece in enumerate(pieces)
+            ]
+        else:
+            chunks = [AIMessageChunk(content=word + " ") for word in message.content.split(" ")]
+
+        for chunk in chunks:
+            time.sleep(self.latency / len(chunks))
+            generation_chunk = ChatGenerationChunk(message=chunk)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.content, chunk=generation_chunk)
+            yield generation_chunk
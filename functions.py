@@ -5,14 +5,152 @@ from logger_config import logger
 
 
 
-from typing import List, Union
+import io
+import re
+import tarfile
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Tuple, Union
 
+import config
 
 
-# Load `.py` files as string
-def load_python_code(path: Union[str, List[str]]) -> str:
-    
-    code_blocks = []
+
+# Directories and files that are never worth summarizing
+DEFAULT_EXCLUDES = [
+    ".git/", ".hg/", ".svn/", ".venv/", "venv/", "env/", "site-packages/", "__pycache__/",
+    "build/", "dist/", ".eggs/", "*.egg-info/", ".tox/", ".nox/", ".mypy_cache/", ".pytest_cache/",
+    "node_modules/"
+]
+
+
+# Translate one gitignore-style glob into a regex matched against "/"-separated relative paths
+def glob_to_regex(pattern: str) -> str:
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+    regex, i = "", 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+        elif pattern.startswith("**", i):
+            regex += ".*"
+            i += 2
+        elif pattern[i] == "*":
+            regex += "[^/]*"
+            i += 1
+        elif pattern[i] == "?":
+            regex += "[^/]"
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 1:]:
+            end = pattern.index("]", i + 1)
+            regex += "[" + pattern[i + 1:end].replace("!", "^", 1) + "]"
+            i = end + 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    # Patterns without a slash match at any depth
+    return ("^" if anchored else "^(?:.*/)?") + regex + "$"
+
+
+# A single .gitignore / exclude rule, relative to the directory it was defined in
+class IgnoreRule:
+    def __init__(self, pattern: str, base: str):
+        self.negate = pattern.startswith("!")
+        pattern = pattern[1:] if self.negate else pattern
+        self.dir_only = pattern.endswith("/")
+        self.regex = re.compile(glob_to_regex(pattern.rstrip("/")))
+        self.base = base
+
+    def matches(self, rel_path: str, is_dir: bool) -> bool:
+        if self.dir_only and not is_dir:
+            return False
+        if self.base:
+            if not rel_path.startswith(self.base + "/"):
+                return False
+            rel_path = rel_path[len(self.base) + 1:]
+        return bool(self.regex.match(rel_path))
+
+
+def parse_ignore_patterns(lines: List[str], base: str) -> List[IgnoreRule]:
+    rules = []
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            rules.append(IgnoreRule(line, base))
+    return rules
+
+
+def is_ignored(rules: List[IgnoreRule], rel_path: str, is_dir: bool) -> bool:
+    # As in git, the last matching rule wins
+    ignored = False
+    for rule in rules:
+        if rule.matches(rel_path, is_dir):
+            ignored = not rule.negate
+    return ignored
+
+
+# Walk a directory in sorted order, pruning excluded / gitignored directories, and return the
+# `.py` files within the per-file size cap
+def find_python_files(directory: str, exclude: List[str] = None, use_gitignore: bool = None,
+                      max_file_bytes: int = None) -> List[str]:
+    exclude = DEFAULT_EXCLUDES + config.LOADER_EXCLUDE + (exclude or [])
+    use_gitignore = config.LOADER_USE_GITIGNORE if use_gitignore is None else use_gitignore
+    max_file_bytes = max_file_bytes or config.LOADER_MAX_FILE_KB * 1024
+
+    rules_by_dir = {"": parse_ignore_patterns(exclude, "")}
+    file_paths = []
+    for root, dirs, files in os.walk(directory):
+        rel_root = os.path.relpath(root, directory).replace(os.sep, "/")
+        rel_root = "" if rel_root == "." else rel_root
+        rules = rules_by_dir.pop(rel_root)
+        if use_gitignore and ".gitignore" in files:
+            try:
+                with open(os.path.join(root, ".gitignore"), "r", encoding="utf-8") as f:
+                    rules = rules + parse_ignore_patterns(f.readlines(), rel_root)
+            except OSError as e:
+                logger.info(f"Failed to read {os.path.join(root, '.gitignore')}: {e}")
+
+        # Prune in place so os.walk never descends into ignored directories
+        dirs[:] = sorted(
+            d for d in dirs
+            if not is_ignored(rules, f"{rel_root}/{d}" if rel_root else d, is_dir=True)
+        )
+        for d in dirs:
+            rules_by_dir[f"{rel_root}/{d}" if rel_root else d] = rules
+
+        for file in sorted(files):
+            rel_path = f"{rel_root}/{file}" if rel_root else file
+            if not file.endswith(".py") or is_ignored(rules, rel_path, is_dir=False):
+                continue
+            file_path = os.path.join(root, file)
+            try:
+                size = os.path.getsize(file_path)
+            except OSError:
+                continue
+            if size > max_file_bytes:
+                logger.info(f"Skipping {file_path}: {size} bytes exceeds the per-file limit")
+                continue
+            file_paths.append(file_path)
+    return file_paths
+
+
+def read_source(file_path: str) -> Tuple[str, Union[str, None]]:
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            return file_path, f.read()
+    except Exception as e:
+        logger.info(f"Failed to read {file_path}: {e}")
+        return file_path, None
+
+
+# Stream (file path, source) pairs in deterministic order. Files are read in parallel with a
+# bounded read-ahead, and loading stops once the total size cap is reached.
+def iter_python_sources(path: Union[str, List[str]], exclude: List[str] = None,
+                        max_total_bytes: int = None, workers: int = None) -> Iterator[Tuple[str, str]]:
+    max_total_bytes = max_total_bytes or config.LOADER_MAX_TOTAL_MB * 1024 * 1024
+    workers = workers or config.LOADER_WORKERS
 
     # Case 1: List of file paths
     if isinstance(path, list):
@@ -20,26 +158,188 @@ def load_python_code(path: Union[str, List[str]]) -> str:
 
     # Case 2: Directory path
     elif os.path.isdir(path):
-        file_paths = [
-            os.path.join(root, file)
-            for root, _, files in os.walk(path)
-            for file in files if file.endswith(".py")
-        ]
+        file_paths = find_python_files(path, exclude=exclude)
 
     # Case 3: Single file path
     elif os.path.isfile(path) and path.endswith(".py"):
         file_paths = [path]
 
+    # Case 4: Archive of a project, read as a stream
+    elif os.path.isfile(path) and is_archive(path):
+        with open(path, "rb") as f:
+            yield from iter_memory_sources([(path, f)], max_total_bytes=max_total_bytes, exclude=exclude)
+        return
+
     else:
-        raise ValueError("Input must be a .py file, a directory, or a list of .py file paths.")
+        raise ValueError("Input must be a .py file, a .zip / .tar.gz archive, a directory, or a list of .py file paths.")
+
+    total_bytes = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        next_index = 0
+        while pending or next_index < len(file_paths):
+            while next_index < len(file_paths) and len(pending) < workers * 4:
+                pending.append(executor.submit(read_source, file_paths[next_index]))
+                next_index += 1
+            file_path, source = pending.popleft().result()
+            if source is None:
+                continue
+            total_bytes += len(source)
+            if total_bytes > max_total_bytes:
+                logger.warning(f"Stopped loading at {file_path}: total size limit of {max_total_bytes} bytes reached, "
+                               f"{len(file_paths) - next_index + len(pending) + 1} files skipped")
+                for future in pending:
+                    future.cancel()
+                return
+            yield file_path, source
+
+
+ARCHIVE_SUFFIXES = (".zip", ".tar.gz", ".tgz")
+# Leading "./" and "/" of member names
+ARCHIVE_PATH_PREFIX = re.compile(r"^(?:\.?/)+")
+
+
+def is_archive(name: str) -> bool:
+    return name.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+# Excluded if the file or any directory above it matches an exclude rule
+def is_excluded_path(rules: List[IgnoreRule], rel_path: str) -> bool:
+    parts = rel_path.split("/")
+    return any(is_ignored(rules, "/".join(parts[:i]), is_dir=True) for i in range(1, len(parts))) or \
+        is_ignored(rules, rel_path, is_dir=False)
+
+
+# Stream the `.py` members of a .zip or .tar.gz archive as (path, bytes) without extracting it.
+# Excluded paths (DEFAULT_EXCLUDES, LOADER_EXCLUDE) are skipped, and at most `max_file_bytes + 1`
+# bytes are decompressed per member, so an oversized member is detected without inflating it.
+def iter_archive_members(name: str, content: Union[bytes, BinaryIO], max_file_bytes: int,
+                         exclude: List[str] = None) -> Iterator[Tuple[str, bytes]]:
+    fileobj = io.BytesIO(content) if isinstance(content, bytes) else content
+    rules = parse_ignore_patterns(DEFAULT_EXCLUDES + config.LOADER_EXCLUDE + (exclude or []), "")
+
+    def wanted(member_path: str, size: int) -> bool:
+        if not member_path.endswith(".py") or is_excluded_path(rules, member_path):
+            return False
+        if size > max_file_bytes:
+            logger.info(f"Skipping {name}:{member_path}: {size} bytes exceeds the per-file limit")
+            return False
+        return True
+
+    if name.lower().endswith(".zip"):
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                member_path = ARCHIVE_PATH_PREFIX.sub("", info.filename)
+                if info.is_dir() or not wanted(member_path, info.file_size):
+                    continue
+                with archive.open(info) as member:
+                    yield member_path, member.read(max_file_bytes + 1)
+    else:
+        # "r|gz" reads the archive front to back, so it also works on non-seekable streams
+        with tarfile.open(fileobj=fileobj, mode="r|gz") as archive:
+            for info in archive:
+                member_path = ARCHIVE_PATH_PREFIX.sub("", info.name)
+                if not info.isfile() or not wanted(member_path, info.size):
+                    continue
+                yield member_path, archive.extractfile(info).read(max_file_bytes + 1)
+
+
+# Decode in-memory (name, content) files such as uploads, with the same per-file and total
+# size limits as loading from disk; non-.py and undecodable files are skipped. Content may be
+# bytes, text or a binary file object; .zip and .tar.gz archives are expanded into their .py files.
+def iter_memory_sources(files: Iterable[Tuple[str, Union[bytes, str, BinaryIO]]], max_file_bytes: int = None,
+                        max_total_bytes: int = None, exclude: List[str] = None) -> Iterator[Tuple[str, str]]:
+    max_file_bytes = max_file_bytes or config.LOADER_MAX_FILE_KB * 1024
+    max_total_bytes = max_total_bytes or config.LOADER_MAX_TOTAL_MB * 1024 * 1024
+
+    def expand():
+        for name, content in files:
+            if is_archive(name):
+                try:
+                    yield from iter_archive_members(name, content, max_file_bytes, exclude)
+                except (zipfile.BadZipFile, tarfile.TarError, EOFError, OSError, RuntimeError) as e:
+                    logger.warning(f"Failed to read archive {name}: {type(e).__name__}: {e}")
+            elif name.endswith(".py"):
+                yield name, content.read(max_file_bytes + 1) if hasattr(content, "read") else content
+
+    total_bytes = 0
+    for name, content in expand():
+        if len(content) > max_file_bytes:
+            logger.info(f"Skipping {name}: {len(content)} bytes exceeds the per-file limit")
+            continue
+        if isinstance(content, bytes):
+            try:
+                content = content.decode("utf-8")
+            except UnicodeDecodeError as e:
+                logger.info(f"Failed to decode {name}: {e}")
+                continue
+        total_bytes += len(content)
+        if total_bytes > max_total_bytes:
+            logger.warning(f"Stopped loading at {name}: total size limit of {max_total_bytes} bytes reached")
+            return
+        yield name, content
+
+
+# Join (file path, source) pairs into one string with a header line per file
+def join_code_files(files: Iterable[Tuple[str, str]]) -> str:
+    return "\n\n".join(f"# ===== {file_path} =====\n" + source for file_path, source in files)
+
+
+# Load `.py` files as string
+def load_python_code(path: Union[str, List[str]], exclude: List[str] = None) -> str:
+    return join_code_files(iter_python_sources(path, exclude=exclude))
+
+
+# Load in-memory `.py` files and archives (e.g. uploads) as string, without writing them to disk
+def load_python_code_from_memory(files: Iterable[Tuple[str, Union[bytes, str, BinaryIO]]]) -> str:
+    return join_code_files(iter_memory_sources(files))
+
+
+
+FILE_HEADER_PATTERN = re.compile(r"^# ===== (.+) =====$", re.MULTILINE)
+
+
+# Split the output of `load_python_code` back into (file path, source) pairs
+def split_code_by_file(code: str) -> List[Tuple[str, str]]:
+    headers = list(FILE_HEADER_PATTERN.finditer(code))
+    if not headers:
+        return [("<code>", code)] if code.strip() else []
+
+    files = []
+    for i, header in enumerate(headers):
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(code)
+        source = code[header.end():end].strip("\n")
+        files.append((header.group(1), source))
+    return files
+
+
+# Split files into chunks of at most `max_chars`, breaking oversized files on line boundaries
+def chunk_code_files(files: List[Tuple[str, str]], max_chars: int) -> List[Tuple[str, str]]:
+    chunks = []
+    for file_path, source in files:
+        if len(source) <= max_chars:
+            chunks.append((file_path, source))
+            continue
+
+        parts, current, current_len = [], [], 0
+        for line in source.splitlines(keepends=True):
+            if current and current_len + len(line) > max_chars:
+                parts.append("".join(current))
+                current, current_len = [], 0
+            current.append(line)
+            current_len += len(line)
+        if current:
+            parts.append("".join(current))
 
-    # Read code from each file
-    for file_path in file_paths:
-        try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                code_blocks.append(f"# ===== {file_path} =====\n" + f.read())
-        except Exception as e:
-            logger.info(f"Failed to read {file_path}: {e}")
+        for i, part in enumerate(parts, start=1):
+            chunks.append((f"{file_path} (part {i}/{len(parts)})", part))
+    return chunks
 
-    return "\n\n".join(code_blocks)
 
+# Render the finished blog (approved outline + section drafts) as Markdown
+def render_blog_markdown(sections: List[Dict[str, str]], section_drafts: Dict[str, str]) -> str:
+    parts = []
+    for section in sections:
+        draft = section_drafts.get(f"section{section['no']}", "")
+        parts.append(f"## {section['no']}. {section['title']}\n\n{draft}")
+    return "\n\n".join(parts) + "\n"
@@ -0,0 +1,72 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import logger
+
+import copy
+import threading
+from typing import Any, Dict, Optional
+
+from streaming import stream_blog_graph
+
+
+# Runs one graph invocation (a new blog or a resume) on a background thread and keeps its
+# progress (streamed outline, draft tokens, finished nodes, the interrupt it stopped at) for
+# a UI to poll, so the UI never blocks on LLM calls.
+# Status: "running", then "awaiting_feedback" (stopped at an interrupt), "done" or "error".
+class GraphRun:
+    def __init__(self, graph, input_state, thread_config: dict):
+        self.graph = graph
+        self.input_state = input_state
+        self.thread_config = thread_config
+        self.status = "running"
+        self.outline = None
+        self.drafts: Dict[str, str] = {}
+        self.completed_nodes = []
+        self.interrupt_value: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._run, daemon=True, name=f"graph-run-{thread_config['configurable']['thread_id']}"
+        )
+
+    def start(self) -> "GraphRun":
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            for event in stream_blog_graph(self.graph, self.input_state, self.thread_config):
+                with self._lock:
+                    if event[0] == "interrupt":
+                        self.interrupt_value = event[1]
+                        self.status = "awaiting_feedback"
+                        return
+                    if event[0] == "token":
+                        _, node, section_no, text = event
+                        self.drafts[section_no] = self.drafts.get(section_no, "") + text
+                    elif event[0] == "reset":
+                        self.drafts[event[2]] = ""
+                    elif event[0] == "outline":
+                        self.outline = event[1]
+                    else:
+                        self.completed_nodes.extend(event[1].keys())
+            with self._lock:
+                self.status = "done"
+        except Exception as e:
+            logger.exception("graph run failed")
+            with self._lock:
+                self.error = f"{type(e).__name__}: {e}"
+                self.status = "error"
+
+    # Copy of the progress so far, safe to read while the run continues
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "status": self.status,
+                "outline": copy.deepcopy(self.outline),
+                "drafts": dict(self.drafts),
+                "completed_nodes": list(self.completed_nodes),
+                "interrupt_value": self.interrupt_value,
+                "error": self.error
+            }
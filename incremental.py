@@ -0,0 +1,123 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import logger
+
+import ast
+import re
+from typing import Dict, List, Set, Tuple
+
+from functions import split_code_by_file
+from summary_cache import content_hash
+
+
+# Incremental regeneration: every section draft records the files and symbols (functions,
+# classes and methods) of the code excerpts it was drafted from, with their content hashes.
+# When a finished blog is run again on changed code, only the sections whose recorded files or
+# symbols changed are redrafted; the other approved drafts are kept. Sections drafted without
+# excerpts (e.g. an introduction) were written from the code summary, which covers the whole
+# codebase; they record the list of files instead and are redrafted when files are added or removed.
+
+PART_SUFFIX = re.compile(r" \(part \d+/\d+\)$")
+
+
+def file_hashes(code: str) -> Dict[str, str]:
+    return {path: content_hash(source) for path, source in split_code_by_file(code)}
+
+
+def changed_files(old_hashes: Dict[str, str], new_hashes: Dict[str, str]) -> Set[str]:
+    return {path for path in old_hashes.keys() | new_hashes.keys() if old_hashes.get(path) != new_hashes.get(path)}
+
+
+# (qualified name, first line, last line) of the classes, functions and methods in a file
+def symbol_spans(source: str) -> List[Tuple[str, int, int]]:
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return []
+    spans = []
+
+    def visit(nodes, prefix: str):
+        for node in nodes:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                start = min([node.lineno] + [decorator.lineno for decorator in node.decorator_list])
+                spans.append((prefix + node.name, start, node.end_lineno))
+                if isinstance(node, ast.ClassDef):
+                    visit(node.body, f"{prefix}{node.name}.")
+
+    visit(tree.body, "")
+    return spans
+
+
+def symbol_hashes(source: str) -> Dict[str, str]:
+    lines = source.splitlines()
+    return {name: content_hash("\n".join(lines[start - 1:end])) for name, start, end in symbol_spans(source)}
+
+
+# Hash of the list of files, the dependency of sections drafted from the code summary alone
+def file_list_hash(paths) -> str:
+    return content_hash("\n".join(sorted(paths)))
+
+
+# Files and symbols covered by the retrieved `(path, text)` snippets of a section, or the file
+# list when no snippet comes from a file
+def snippet_sources(code: str, snippets: List[Tuple[str, str]]) -> Dict[str, Dict[str, str]]:
+    files = dict(split_code_by_file(code))
+    sources = {"files": {}, "symbols": {}}
+    for label, text in snippets:
+        path = PART_SUFFIX.sub("", label)
+        source = files.get(path)
+        if source is None:
+            continue
+        sources["files"][path] = content_hash(source)
+        offset = source.find(text)
+        if offset < 0:
+            continue
+        first_line = source.count("\n", 0, offset) + 1
+        last_line = first_line + text.count("\n")
+        lines = source.splitlines()
+        for name, start, end in symbol_spans(source):
+            if start <= last_line and end >= first_line:
+                sources["symbols"][f"{path}::{name}"] = content_hash("\n".join(lines[start - 1:end]))
+    if not sources["files"]:
+        sources["file_list"] = {"hash": file_list_hash(files)}
+    return sources
+
+
+# Sections whose recorded sources changed, with the reason for each. Sections without recorded
+# sources (drafted before sources were recorded) are treated as stale, since what they used is unknown.
+def find_stale_sections(sections: List[Dict[str, str]], section_sources: Dict[str, Dict[str, Dict[str, str]]],
+                        code: str) -> Dict[str, str]:
+    new_files = dict(split_code_by_file(code))
+    new_hashes = {path: content_hash(source) for path, source in new_files.items()}
+    new_symbols: Dict[str, Dict[str, str]] = {}
+    stale = {}
+    for section in sections:
+        sources = section_sources.get(section["no"])
+        if sources and sources.get("file_list"):
+            if sources["file_list"]["hash"] != file_list_hash(new_files):
+                stale[section["no"]] = "files were added or removed"
+            continue
+        if not sources or not sources.get("files"):
+            stale[section["no"]] = "its sources were not recorded"
+            continue
+        reasons = []
+        for path, recorded_hash in sorted(sources["files"].items()):
+            if new_hashes.get(path) == recorded_hash:
+                continue
+            if path not in new_files:
+                reasons.append(f"{path} was removed")
+                continue
+            recorded = {key.split("::", 1)[1]: value for key, value in sources["symbols"].items() if key.startswith(f"{path}::")}
+            if not recorded:
+                reasons.append(f"{path} changed")
+                continue
+            if path not in new_symbols:
+                new_symbols[path] = symbol_hashes(new_files[path])
+            changed_symbols = [name for name, value in recorded.items() if new_symbols[path].get(name) != value]
+            if changed_symbols:
+                reasons.append(f"{', '.join(sorted(changed_symbols))} in {path} changed")
+        if reasons:
+            stale[section["no"]] = "; ".join(reasons)
+    logger.info(f"{len(stale)} of {len(sections)} sections are stale: {sorted(stale)}")
+    return stale
@@ -0,0 +1,129 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import logger
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Optional, Sequence
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.outputs import Generation
+
+import config
+
+
+CACHE_MODES = ("off", "read_write", "record", "replay")
+
+
+class LLMCacheMiss(RuntimeError):
+    pass
+
+
+# Persistent LLM response cache plugged into the chat model via `cache=`.
+# LangChain keys each call by the serialized messages (`prompt`) and the model parameters,
+# including any bound structured-output tool schema (`llm_string`).
+# Modes:
+#   read_write - serve hits, call the LLM on misses and store the response
+#   record     - always call the LLM and store the response (refreshes recordings)
+#   replay     - serve hits only; a miss raises LLMCacheMiss so runs stay offline
+class LLMResponseCache(BaseCache):
+    def __init__(self, path: str, mode: str = "read_write", max_entries: int = 10000, ttl_seconds: float = 0):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown LLM cache mode {mode!r}, expected one of {CACHE_MODES}")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.mode = mode
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                generations TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def _expired(self, created_at: float) -> bool:
+        # Recordings never expire in replay mode
+        return self.mode != "replay" and self.ttl_seconds > 0 and time.time() - created_at > self.ttl_seconds
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        if self.mode == "record":
+            return None
+
+        key = self.key(prompt, llm_string)
+        with self._lock:
+            row = self._conn.execute("SELECT generations, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or self._expired(row[1]):
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._conn.execute("UPDATE responses SET last_used_at = ? WHERE key = ?", (time.time(), key))
+                self._conn.commit()
+
+        if row is None or self._expired(row[1]):
+            if self.mode == "replay":
+                raise LLMCacheMiss(f"No recorded LLM response for request {key[:12]} (LLM_CACHE_MODE=replay)")
+            return None
+        return [loads(generation) for generation in json.loads(row[0])]
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        if self.mode == "replay":
+            return
+        now = time.time()
+        generations = json.dumps([dumps(generation) for generation in return_val])
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (self.key(prompt, llm_string), generations, now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    # Drop expired entries, then the least recently used ones above max_entries
+    def _evict(self):
+        if self.mode != "replay" and self.ttl_seconds > 0:
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_used_at LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"mode": self.mode, "hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+# LLM cache selected by LLM_CACHE_MODE, or None when caching is off
+def create_llm_cache() -> Optional[LLMResponseCache]:
+    if config.LLM_CACHE_MODE == "off":
+        return None
+    logger.info(f"LLM response cache enabled in {config.LLM_CACHE_MODE} mode at {config.LLM_CACHE_PATH}")
+    return LLMResponseCache(
+        path=config.LLM_CACHE_PATH,
+        mode=config.LLM_CACHE_MODE,
+        max_entries=config.LLM_CACHE_MAX_ENTRIES,
+        ttl_seconds=config.LLM_CACHE_TTL_HOURS * 60 * 60
+    )
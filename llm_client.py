@@ -0,0 +1,319 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import logger
+
+import asyncio
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.rate_limiters import BaseRateLimiter
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+
+import config
+from llm_cache import LLMCacheMiss
+from token_budget import count_message_tokens, count_tokens, token_usage
+from tracing import current_node, current_thread_id
+
+
+# Estimated tokens of the request about to be sent, read by the rate limiter
+_request_tokens: ContextVar[int] = ContextVar("request_tokens", default=0)
+# Timing of the call in progress, so the rate limiter can add the time it made it wait
+_call_stats: ContextVar[Optional[dict]] = ContextVar("llm_call_stats", default=None)
+
+
+# Token estimate for rate limiting: the counted prompt plus the expected completion
+def estimate_tokens(messages) -> int:
+    return count_message_tokens(messages) + config.LLM_COMPLETION_TOKENS_ESTIMATE
+
+
+# A request needing more tokens than the per-minute budget holds: waiting cannot make it fit
+class RequestTooLargeError(ValueError):
+    pass
+
+
+# Token bucket refilled continuously at `per_minute / 60` per second. Reservations may overdraw
+# the bucket; the returned wait time makes callers queue for the budget in arrival order.
+# Reservations above the capacity are rejected, since the bucket never holds that much.
+class TokenBucket:
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.available = float(per_minute)
+        self.updated = time.monotonic()
+
+    def reserve(self, amount: float) -> float:
+        if amount > self.capacity:
+            raise RequestTooLargeError(f"Request of ~{amount:.0f} tokens exceeds the budget of {self.capacity:.0f} per minute")
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+        self.available -= amount
+        return max(0.0, -self.available / self.rate)
+
+
+# Budgets requests-per-minute and tokens-per-minute across every thread and coroutine that
+# shares it. Attached to the chat model via `rate_limiter=`, so it only runs on cache misses.
+class RequestBudgetRateLimiter(BaseRateLimiter):
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int, provider: str = ""):
+        self.provider = provider
+        self.tokens_per_minute = tokens_per_minute
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.paused_until = 0.0
+        self.queued_seconds = 0.0
+        self._lock = threading.Lock()
+
+    # Stop sending requests for a while, e.g. when the provider returns retry-after
+    def pause(self, seconds: float):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def _reserve(self) -> float:
+        with self._lock:
+            wait = max(0.0, self.paused_until - time.monotonic())
+            if self.requests:
+                wait = max(wait, self.requests.reserve(1))
+            if self.tokens:
+                wait = max(wait, self.tokens.reserve(_request_tokens.get()))
+            self.queued_seconds += wait
+        call = _call_stats.get()
+        if call is not None:
+            call["queued_seconds"] += wait
+        if wait > 0:
+            logger.info(f"rate limiter: waiting {wait:.2f}s for request budget")
+        return wait
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        time.sleep(self._reserve())
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        await asyncio.sleep(self._reserve())
+        return True
+
+
+# (requests, tokens) per minute for a provider: its LLM_PROVIDER_RATE_LIMITS entry or the defaults
+def provider_rate_limits(provider: str) -> Tuple[int, int]:
+    for item in config.LLM_PROVIDER_RATE_LIMITS.split(","):
+        name, _, limits = item.partition("=")
+        if name.strip().lower() == provider:
+            requests, _, tokens = limits.partition("/")
+            try:
+                return int(requests), int(tokens)
+            except ValueError:
+                raise ValueError(f"LLM_PROVIDER_RATE_LIMITS entry {item.strip()!r} should look like 'provider=requests/tokens'")
+    return config.LLM_REQUESTS_PER_MINUTE, config.LLM_TOKENS_PER_MINUTE
+
+
+# Provider an SDK error comes from, by the package that raised it: "groq" for groq.RateLimitError,
+# "google" for google.api_core or langchain_google_genai errors
+def error_provider(error: Exception) -> str:
+    package = type(error).__module__.split(".")[0]
+    return package[len("langchain_"):].split("_")[0] if package.startswith("langchain_") else package
+
+
+# Seconds the provider asked us to wait, if the error carries a retry-after header
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+# Shared client for all LLM calls: budgets requests through a rate limiter per provider, retries
+# failures with jittered exponential backoff (honoring retry-after), and reuses structured-output runnables
+class LLMClient:
+    def __init__(self, max_retries: int = 3, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.rate_limiters: Dict[str, RequestBudgetRateLimiter] = {}
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._runnables = {}
+        self._lock = threading.Lock()
+        # Callables receiving a timing/token dict for every finished call
+        self.listeners: List[Callable[[dict], None]] = []
+
+    # The rate limiter of a provider, shared by all of its models
+    def rate_limiter(self, provider: str) -> RequestBudgetRateLimiter:
+        with self._lock:
+            if provider not in self.rate_limiters:
+                self.rate_limiters[provider] = RequestBudgetRateLimiter(*provider_rate_limits(provider), provider=provider)
+            return self.rate_limiters[provider]
+
+    # `llm.with_structured_output(output_class)` built once per model and schema. Model routes
+    # (models.ModelRoute) chain the runnables of their models with fallbacks.
+    def runnable(self, llm, output_class=None):
+        if hasattr(llm, "fallback_chain"):
+            return llm.fallback_chain(lambda model: self.runnable(model, output_class))
+        if output_class is None:
+            return llm
+        key = (id(llm), output_class)
+        with self._lock:
+            if key not in self._runnables:
+                self._runnables[key] = (llm, llm.with_structured_output(output_class))
+            return self._runnables[key][1]
+
+    def retry_delay(self, error: Exception, attempt: int, base_delay: float) -> float:
+        # Full jitter spreads out clients that failed at the same moment
+        delay = random.uniform(0, min(self.max_delay, base_delay * (2 ** attempt)))
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            # Everyone using the provider backs off, not just this caller; other providers'
+            # budgets are left alone (if the provider is unknown, everyone backs off)
+            provider = error_provider(error)
+            with self._lock:
+                limiters = [self.rate_limiters[provider]] if provider in self.rate_limiters else list(self.rate_limiters.values())
+            for limiter in limiters:
+                limiter.pause(retry_after)
+            delay = max(delay, retry_after)
+        return delay
+
+    @staticmethod
+    def attempt_config(run_config: Optional[dict], attempt: int) -> dict:
+        # The attempt number lets stream consumers discard partial output from a failed attempt
+        run_config = dict(run_config or {})
+        run_config["metadata"] = {**run_config.get("metadata", {}), "attempt": attempt}
+        return run_config
+
+    # Record the tokens a call used under its run name; structured outputs carry no usage
+    # metadata, so their tokens are counted locally
+    @staticmethod
+    def record_usage(messages, response, run_config: Optional[dict]) -> Tuple[int, int]:
+        usage = getattr(response, "usage_metadata", None)
+        if usage:
+            prompt_tokens, completion_tokens = usage["input_tokens"], usage["output_tokens"]
+        else:
+            prompt_tokens = count_message_tokens(messages)
+            output = response.model_dump_json() if hasattr(response, "model_dump_json") else str(getattr(response, "content", response))
+            completion_tokens = count_tokens(output)
+        label = (run_config or {}).get("run_name", "llm")
+        token_usage.record(label, prompt_tokens, completion_tokens)
+        logger.info(f"{label}: {prompt_tokens} prompt + {completion_tokens} completion tokens")
+        return prompt_tokens, completion_tokens
+
+    # Timing of one call (all attempts), filled in by invoke and the rate limiter
+    def _begin_call(self, run_config: Optional[dict]) -> dict:
+        return {
+            "run_name": (run_config or {}).get("run_name", "llm"),
+            "node": current_node.get(),
+            # Calls made outside a graph node (e.g. speculative drafts) pass the thread in their metadata
+            "thread_id": current_thread_id() or (run_config or {}).get("metadata", {}).get("thread_id"),
+            "status": "ok",
+            "attempts": 0,
+            "queued_seconds": 0.0,
+            "retry_seconds": 0.0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "started": time.perf_counter()
+        }
+
+    # Split the call's wall time into provider time, rate-limit queueing and retry backoff,
+    # then hand it to the listeners (e.g. the metrics recorder)
+    def _end_call(self, call: dict):
+        call["seconds"] = time.perf_counter() - call.pop("started")
+        call["llm_seconds"] = max(0.0, call["seconds"] - call["queued_seconds"] - call["retry_seconds"])
+        for listener in self.listeners:
+            try:
+                listener(call)
+            except Exception:
+                logger.exception(f"LLM call listener {listener!r} failed")
+
+    def invoke(self, llm, messages, output_class=None, config: Optional[dict] = None,
+               max_retries: Optional[int] = None, base_delay: Optional[float] = None) -> Any:
+        runnable = self.runnable(llm, output_class)
+        max_retries = max_retries or self.max_retries
+        base_delay = base_delay or self.base_delay
+        call = self._begin_call(config)
+        call_token = _call_stats.set(call)
+        try:
+            for attempt in range(max_retries):
+                call["attempts"] += 1
+                token = _request_tokens.set(estimate_tokens(messages))
+                try:
+                    response = runnable.invoke(messages, config=self.attempt_config(config, attempt))
+                    call["prompt_tokens"], call["completion_tokens"] = self.record_usage(messages, response, config)
+                    return response
+                except (LLMCacheMiss, RequestTooLargeError):
+                    raise  # replaying recorded responses, or the request can never fit: retrying cannot help
+                except Exception as e:
+                    logger.info(f"Attempt {attempt + 1} failed with error: {type(e).__name__}: {e}")
+                    if attempt == max_retries - 1:
+                        raise  # re-raise if last attempt
+                    sleep_time = self.retry_delay(e, attempt, base_delay)
+                    logger.info(f"Retrying after {sleep_time:.2f} seconds...")
+                    call["retry_seconds"] += sleep_time
+                    time.sleep(sleep_time)
+                finally:
+                    _request_tokens.reset(token)
+        except Exception:
+            call["status"] = "error"
+            raise
+        finally:
+            _call_stats.reset(call_token)
+            self._end_call(call)
+
+    async def ainvoke(self, llm, messages, output_class=None, config: Optional[dict] = None,
+                      max_retries: Optional[int] = None, base_delay: Optional[float] = None) -> Any:
+        runnable = self.runnable(llm, output_class)
+        max_retries = max_retries or self.max_retries
+        base_delay = base_delay or self.base_delay
+        call = self._begin_call(config)
+        call_token = _call_stats.set(call)
+        try:
+            for attempt in range(max_retries):
+                call["attempts"] += 1
+                token = _request_tokens.set(estimate_tokens(messages))
+                try:
+                    response = await runnable.ainvoke(messages, config=self.attempt_config(config, attempt))
+                    call["prompt_tokens"], call["completion_tokens"] = self.record_usage(messages, response, config)
+                    return response
+                except (LLMCacheMiss, RequestTooLargeError):
+                    raise
+                except Exception as e:
+                    logger.info(f"Attempt {attempt + 1} failed with error: {type(e).__name__}: {e}")
+                    if attempt == max_retries - 1:
+                        raise
+                    sleep_time = self.retry_delay(e, attempt, base_delay)
+                    logger.info(f"Retrying after {sleep_time:.2f} seconds...")
+                    call["retry_seconds"] += sleep_time
+                    await asyncio.sleep(sleep_time)
+                finally:
+                    _request_tokens.reset(token)
+        except Exception:
+            call["status"] = "error"
+            raise
+        finally:
+            _call_stats.reset(call_token)
+            self._end_call(call)
+
+    # Run several requests with at most `max_concurrency` in flight; results keep the input order
+    def batch(self, llm, messages_list: List[list], max_concurrency: int, output_class=None, config: Optional[dict] = None) -> List[Any]:
+        if len(messages_list) <= 1:
+            return [self.invoke(llm, messages, output_class, config) for messages in messages_list]
+        with ContextThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            return list(executor.map(lambda messages: self.invoke(llm, messages, output_class, config), messages_list))
+
+    async def abatch(self, llm, messages_list: List[list], max_concurrency: int, output_class=None, config: Optional[dict] = None) -> List[Any]:
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def run(messages):
+            async with semaphore:
+                return await self.ainvoke(llm, messages, output_class, config)
+
+        return await asyncio.gather(*(run(messages) for messages in messages_list))
+
+
+# Shared by every node, session and thread in the process
+llm_client = LLMClient(
+    max_retries=config.LLM_MAX_RETRIES,
+    base_delay=config.LLM_RETRY_BASE_DELAY,
+    max_delay=config.LLM_RETRY_MAX_DELAY
+)
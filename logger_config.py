@@ -1,15 +1,41 @@
 # logger_config.py
+import json
 import logging
 
+import config
+
 logger = logging.getLogger("LangGraph POC")
-logger.setLevel(logging.DEBUG)  # Set to DEBUG for development
+logger.setLevel(config.LOG_LEVEL)  # DEBUG by default for development
+
+
+# One JSON object per line; tracing spans passed as `extra={"span": {...}}` are included as fields
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "file": record.filename,
+            "func": record.funcName,
+            "line": record.lineno,
+            "msg": record.getMessage()
+        }
+        span = getattr(record, "span", None)
+        if span:
+            entry["span"] = span
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
 
 # Avoid adding handlers multiple times if this file is imported repeatedly
 if not logger.handlers:
-    console_handler = logging.StreamHandler()
-    formatter = logging.Formatter(
-        fmt="%(asctime)s | %(filename)s | %(funcName)s | Line: %(lineno)d | %(levelname)s | %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S"
-    )
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    handler = logging.FileHandler(config.LOG_FILE, encoding="utf-8") if config.LOG_FILE else logging.StreamHandler()
+    if config.LOG_FORMAT == "json":
+        formatter = JsonLinesFormatter()
+    else:
+        formatter = logging.Formatter(
+            fmt="%(asctime)s | %(filename)s | %(funcName)s | Line: %(lineno)d | %(levelname)s | %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S"
+        )
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
@@ -1,4 +1,3 @@
-import streamlit as st
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -6,10 +5,13 @@ from logger_config import logger
 
 import uuid
 import streamlit as st
-import tempfile
 
-from functions import load_python_code
-from blog_graph import blog_agent_graph
+from functions import is_archive, load_python_code_from_memory
+from blog_state import new_blog_state
+from graph_runner import GraphRun
+from metrics import metrics
+from tracing import Lazy
+import config
 from langgraph.types import Command
 
 
@@ -21,111 +23,180 @@ load_dotenv()
 completed = "✅"
 pending = "⬜"
 
+
+# The compiled graph (with its checkpointer, chat model and shared LLM client) is built once
+# per server process and reused by every rerun and session
+@st.cache_resource
+def get_blog_graph():
+    import blog_graph
+    return blog_graph
+
+
+# Background graph runs by thread id; they outlive reruns and page reloads. A run is removed
+# once the page has taken over its result (interrupt, done or error) or on "Start Over", since
+# everything a reloaded page needs is in the checkpoint.
+@st.cache_resource
+def get_graph_runs() -> dict:
+    return {}
+
+
+def start_run(input_state):
+    thread_id = st.session_state.thread_config["configurable"]["thread_id"]
+    graph = get_blog_graph().blog_agent_graph
+    get_graph_runs()[thread_id] = GraphRun(graph, input_state, st.session_state.thread_config).start()
+    st.session_state.run_phase = "running"
+
+
+def current_run():
+    return get_graph_runs().get(st.session_state.thread_config["configurable"]["thread_id"])
+
+
+def forget_run():
+    get_graph_runs().pop(st.session_state.thread_config["configurable"]["thread_id"], None)
+
+
 st.set_page_config(page_title="Code → Blog Assistant", layout="wide")
 st.title("🧠 Code to Blog Assistant")
 
 # --- Upload Python Files ---
-uploaded_files = st.file_uploader("Upload Python Files", type="py", accept_multiple_files=True)
+# .zip / .tar.gz archives of a whole project are read in memory and filtered to their .py files.
+# "gz" has to be allowed for .tar.gz uploads, so other .gz files are reported as skipped.
+uploaded_files = st.file_uploader("Upload Python Files or a Project Archive", type=["py", "zip", "gz", "tgz"],
+                                  accept_multiple_files=True)
+skipped_uploads = [file.name for file in uploaded_files or [] if not (file.name.endswith(".py") or is_archive(file.name))]
+if skipped_uploads:
+    st.warning(f"Skipped {', '.join(skipped_uploads)}: only .py files and .zip / .tar.gz / .tgz archives are read.")
 
 # --- Initialize Session State ---
 if "agent_state" not in st.session_state:
     st.session_state.agent_state = None
+    # The thread id is kept in the URL so a reloaded page resumes the saved session
+    thread_id = st.query_params.get("thread") or str(uuid.uuid4())
+    st.query_params["thread"] = thread_id
     st.session_state.thread_config = {
         "configurable": {
-            "thread_id": str(uuid.uuid4()),
+            "thread_id": thread_id,
             "recursion_limit": 100
-        }
+        },
+        "max_concurrency": config.SECTION_DRAFTING_MAX_CONCURRENCY
     }
     st.session_state.feedback_input = ""
-    st.session_state.run_phase = "idle"  # ["idle", "start", "awaiting_feedback", "resume"]
+    st.session_state.run_phase = "idle"  # ["idle", "running", "awaiting_feedback", "done", "error"]
     st.session_state.interrupt_message = ""
     st.session_state.interrupt_value = {}
     st.session_state.last_interrupt_node = ""
     st.session_state.no_of_sections = 0
 
+    # --- Resume a Saved Session ---
+    run = current_run()
+    interrupt_value = get_blog_graph().pending_interrupt(st.session_state.thread_config)
+    if run is not None and run.status == "running":
+        # The page was reloaded while the agent was working
+        st.session_state.run_phase = "running"
+    elif interrupt_value is not None:
+        saved_state = get_blog_graph().blog_agent_graph.get_state(st.session_state.thread_config).values
+        st.session_state.agent_state = saved_state
+        st.session_state.interrupt_value = interrupt_value
+        st.session_state.interrupt_message = interrupt_value["message"]
+        st.session_state.last_interrupt_node = interrupt_value.get("current_node", "")
+        st.session_state.no_of_sections = len(saved_state.get("sections", []))
+        st.session_state.run_phase = "awaiting_feedback"
+
 # --- Load and Process Uploaded Code ---
+# Uploads are already in memory, so they are decoded directly instead of going through a temp dir;
+# archives are streamed from the upload buffer
 if uploaded_files and st.session_state.agent_state is None:
-    with tempfile.TemporaryDirectory() as tmp_dir:
-        file_paths = []
-        for file in uploaded_files:
-            path = os.path.join(tmp_dir, file.name)
-            with open(path, "wb") as f:
-                f.write(file.read())
-            file_paths.append(path)
-
-        code = load_python_code(file_paths)
-        st.session_state.agent_state = {
-            "code": code,
-            "code_summary": "",
-            "section_drafts": {},
-            "completed_sections": [],
-            "skipped_sections": [],
-            "sections": [],
-            "current_section": "",
-            "feedback": {},
-            "target_section_no": ""
-        }
+    code = load_python_code_from_memory((file.name, file) for file in uploaded_files)
+    if code.strip():
+        st.session_state.agent_state = new_blog_state(code)
+    else:
+        st.warning("No Python files found in the upload.")
 
 
 
 # --- Start or Resume Agent ---
-if st.button("🚀 Run Agent"):
-    st.session_state.run_phase = "start"
+if st.button("🚀 Run Agent", disabled=st.session_state.run_phase == "running"):
+    if st.session_state.agent_state is None:
+        st.warning("Upload Python files first.")
+    else:
+        start_run(st.session_state.agent_state)
 
 # --- Agent Execution ---
-if st.session_state.run_phase in ["start", "resume"]:
-    with st.spinner("Running agent..."):
-        input_state = (
-            st.session_state.agent_state
-            if st.session_state.run_phase == "start"
-            else Command(resume=st.session_state.feedback_input)
-        )
-        logger.info(f"input_state: {input_state}")
-        stream = blog_agent_graph.stream(input_state, config=st.session_state.thread_config)
-
-        final_event = None
-        for event in stream:
-            logger.info(f"event: {event}")
-            if isinstance(event, dict) and "__interrupt__" in event:
-                interrupt_value = event["__interrupt__"][0].value
-                st.session_state.interrupt_value = interrupt_value
-                st.session_state.interrupt_message = interrupt_value["message"]
-                st.session_state.last_interrupt_node = interrupt_value.get("current_node", "")
-                st.session_state.run_phase = "awaiting_feedback"
-                break
-            else:
-                st.session_state.agent_state = event[1] if isinstance(event, tuple) else st.session_state.agent_state
-                final_event = event[1] if isinstance(event, tuple) else event
-
-        if st.session_state.run_phase != "awaiting_feedback":
-            st.session_state.run_phase = "idle"
-        
-        # ✅ Display Final Blog After Completion
-        if st.session_state.run_phase == "idle" and final_event:
-            state = final_event["set_next_section"]
-            logger.info("Execution completed")
-            logger.info(f"state: {state}")
-            logger.info(f"state keys: {state.keys()}")
-            if "sections" in state and "section_drafts" in state:
-                sections = state["sections"]
-                section_drafts = state["section_drafts"]
-                logger.info(f"length of sections: {len(sections)}")
-                logger.info(f"length of drafts: {len(section_drafts)}")
-                logger.info(f"sections: {sections}")
-                logger.info(f"section drafts: {section_drafts}")
-                st.header(f"Final Draft of the Blog")
-                if len(sections) == len(section_drafts):
-                    for i, (section, section_draft) in enumerate(zip(sections, section_drafts), start=1):
-                        logger.info(f"section: {section}")
-                        logger.info(f"section draft: {section_draft}")
-                        st.subheader(f"{i}. {section['title']}")
-                        st.write(section_drafts[f'section{i}'])
-                    
-                    # Show "Start Over" option
-                    if st.button("🔁 Start Over"):
-                        for key in st.session_state.keys():
-                            del st.session_state[key]
-                        st.rerun()
+# The graph runs on a background thread; this fragment polls its progress without rerunning
+# the whole page and hands over to the page once the run stops at an interrupt or finishes
+@st.fragment(run_every=config.UI_POLL_SECONDS)
+def show_run_progress():
+    run = current_run()
+    if run is None:
+        st.session_state.run_phase = "idle"
+        st.rerun()
+    snapshot = run.snapshot()
+
+    if snapshot["status"] == "running":
+        st.info("Running agent...")
+        if snapshot["outline"]:
+            st.json(snapshot["outline"], expanded=True)
+        for section_no, text in snapshot["drafts"].items():
+            st.write(f"**Drafting section {section_no}...**\n\n{text}")
+        return
+
+    logger.debug("run snapshot: %s", Lazy(snapshot))
+    forget_run()
+    if snapshot["status"] == "awaiting_feedback":
+        interrupt_value = snapshot["interrupt_value"]
+        st.session_state.interrupt_value = interrupt_value
+        st.session_state.interrupt_message = interrupt_value["message"]
+        st.session_state.last_interrupt_node = interrupt_value.get("current_node", "")
+        st.session_state.run_phase = "awaiting_feedback"
+    elif snapshot["status"] == "done":
+        logger.info("Execution completed")
+        metrics.finish_run(st.session_state.thread_config["configurable"]["thread_id"])
+        st.session_state.run_phase = "done"
+    else:
+        metrics.discard_run(st.session_state.thread_config["configurable"]["thread_id"])
+        st.session_state.run_error = snapshot["error"]
+        st.session_state.run_phase = "error"
+    st.rerun()
+
+
+if st.session_state.run_phase == "running":
+    show_run_progress()
+
+if st.session_state.run_phase == "error":
+    st.error(f"The agent failed: {st.session_state.get('run_error')}")
+    # Resuming with no input continues from the last checkpoint
+    if st.button("🔄 Retry"):
+        start_run(None)
+        st.rerun()
+
+# ✅ Display Final Blog After Completion
+if st.session_state.run_phase == "done":
+    # Node updates are deltas, so read the full final state from the checkpoint
+    state = get_blog_graph().blog_agent_graph.get_state(st.session_state.thread_config).values
+    logger.debug("state: %s", Lazy(state))
+    logger.info(f"state keys: {state.keys()}")
+    if "sections" in state and "section_drafts" in state:
+        sections = state["sections"]
+        section_drafts = state["section_drafts"]
+        logger.info(f"length of sections: {len(sections)}")
+        logger.info(f"length of drafts: {len(section_drafts)}")
+        logger.debug("sections: %s", Lazy(sections))
+        logger.debug("section drafts: %s", Lazy(section_drafts))
+        st.header(f"Final Draft of the Blog")
+        if len(sections) == len(section_drafts):
+            for i, (section, section_draft) in enumerate(zip(sections, section_drafts), start=1):
+                logger.debug("section: %s", Lazy(section))
+                logger.debug("section draft: %s", Lazy(section_draft))
+                st.subheader(f"{i}. {section['title']}")
+                st.write(section_drafts[f'section{i}'])
+
+            # Show "Start Over" option
+            if st.button("🔁 Start Over"):
+                forget_run()
+                for key in st.session_state.keys():
+                    del st.session_state[key]
+                st.query_params.clear()
+                st.rerun()
 
 
 
@@ -137,7 +208,7 @@ def show_progress():
 
 # --- Feedback Input ---
 if st.session_state.run_phase == "awaiting_feedback":
-    logger.info(f"st session state: {st.session_state}")
+    logger.debug("st session state: %s", Lazy(st.session_state.to_dict()))
     # st.session_state.feedback_input = ""
     if st.session_state.interrupt_value.get("current_node") == "human_blog_feedback":
         sections = st.session_state.interrupt_value.get("sections", {})
@@ -156,7 +227,7 @@ if st.session_state.run_phase == "awaiting_feedback":
     st.session_state.feedback_input = st.text_area("Enter your feedback (or type 'approved')")
 
     if st.button("Submit Feedback"):
-        st.session_state.run_phase = "resume"
+        start_run(Command(resume=st.session_state.feedback_input))
         st.rerun()
 
 
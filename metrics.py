@@ -0,0 +1,233 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import logger
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import config
+from llm_client import llm_client
+from tracing import span_listeners
+
+
+DRAFT_NODES = ("section_drafting", "parallel_section_drafting")
+LLM_FIELDS = ("calls", "attempts", "seconds", "llm_seconds", "queued_seconds", "retry_seconds", "prompt_tokens", "completion_tokens", "errors")
+
+
+def escape_label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_series(name: str, labels: Dict[str, Any], value: float) -> str:
+    label_text = ",".join(f'{key}="{escape_label(label)}"' for key, label in labels.items())
+    return f"{name}{{{label_text}}} {value:g}" if label_text else f"{name} {value:g}"
+
+
+# Collects per-node durations (from the node tracing spans), LLM time split into provider,
+# rate-limit queue and retry backoff time with token counts (from llm_client), revision counts
+# and the time reviewers take to answer each interrupt. Totals are kept for the process and
+# per graph thread; a thread's totals are written to a summary file when its run finishes.
+# Threads that never finish (abandoned sessions) are dropped after METRICS_RUN_TTL_MINUTES without
+# activity, and at most METRICS_MAX_RUNS threads are tracked (the least recently active go first).
+class MetricsRecorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.node_runs: Dict[Tuple[str, str], Dict[str, float]] = {}
+        self.llm_calls: Dict[Tuple[str, str], Dict[str, float]] = {}
+        self.human_waits: Dict[str, Dict[str, float]] = {}
+        self.revisions: Dict[str, int] = {}
+        self.runs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._interrupted_at: Dict[Tuple[str, str, Optional[str]], float] = {}
+        self.attached = False
+
+    def attach(self):
+        if not self.attached:
+            span_listeners.append(self.record_span)
+            llm_client.listeners.append(self.record_llm_call)
+            self.attached = True
+        return self
+
+    def _run(self, thread_id: Optional[str]) -> Dict[str, Any]:
+        thread_id = thread_id or "<no thread>"
+        if thread_id not in self.runs:
+            self._expire_runs()
+            self.runs[thread_id] = {
+                "thread_id": thread_id,
+                "started_at": time.time(),
+                "nodes": {},
+                "llm": {field: 0 for field in LLM_FIELDS},
+                "drafts": {"outline": 0, "sections": {}},
+                "interrupts": 0,
+                "human_wait_seconds": 0.0
+            }
+        run = self.runs[thread_id]
+        run["updated_at"] = time.time()
+        self.runs.move_to_end(thread_id)
+        return run
+
+    # Drop the runs of abandoned threads; called with the lock held when a new thread starts
+    def _expire_runs(self):
+        max_age = config.METRICS_RUN_TTL_MINUTES * 60
+        now = time.time()
+        while self.runs:
+            thread_id, run = next(iter(self.runs.items()))
+            expired = max_age and now - run["updated_at"] > max_age
+            if not expired and len(self.runs) < config.METRICS_MAX_RUNS:
+                break
+            self._forget(thread_id)
+
+    def _forget(self, thread_id: str):
+        self.runs.pop(thread_id, None)
+        for key in [key for key in self._interrupted_at if key[0] == thread_id]:
+            del self._interrupted_at[key]
+
+    # Forget a thread without writing its summary, e.g. when its run failed
+    def discard_run(self, thread_id: str):
+        with self._lock:
+            self._forget(thread_id)
+
+    def record_span(self, span: dict):
+        node, status = span["node"], span["status"]
+        seconds = span["duration_ms"] / 1000
+        thread_id, section_no = span.get("thread_id"), span.get("section_no")
+        wait_key = (thread_id, node, section_no)
+        with self._lock:
+            entry = self.node_runs.setdefault((node, status), {"count": 0, "seconds": 0.0, "max_seconds": 0.0})
+            entry["count"] += 1
+            entry["seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+
+            run = self._run(thread_id)
+            run_node = run["nodes"].setdefault(node, {"runs": 0, "seconds": 0.0})
+            run_node["runs"] += 1
+            run_node["seconds"] += seconds
+
+            # A node resumed after an interrupt starts over; the gap is the reviewer's time
+            started_at = span["ended_at"] - seconds
+            interrupted_at = self._interrupted_at.pop(wait_key, None)
+            if interrupted_at is not None:
+                wait = max(0.0, started_at - interrupted_at)
+                waits = self.human_waits.setdefault(node, {"count": 0, "seconds": 0.0})
+                waits["count"] += 1
+                waits["seconds"] += wait
+                run["human_wait_seconds"] += wait
+            if status == "interrupted":
+                self._interrupted_at[wait_key] = span["ended_at"]
+                run["interrupts"] += 1
+
+            if status == "ok":
+                if node == "blog_structuring":
+                    run["drafts"]["outline"] += 1
+                    if run["drafts"]["outline"] > 1:
+                        self.revisions["outline"] = self.revisions.get("outline", 0) + 1
+                elif node in DRAFT_NODES and section_no:
+                    drafts = run["drafts"]["sections"]
+                    drafts[section_no] = drafts.get(section_no, 0) + 1
+                    if drafts[section_no] > 1:
+                        self.revisions["section"] = self.revisions.get("section", 0) + 1
+
+    def record_llm_call(self, call: dict):
+        with self._lock:
+            for totals in (
+                self.llm_calls.setdefault((call["node"] or "", call["run_name"]), {field: 0 for field in LLM_FIELDS}),
+                self._run(call["thread_id"])["llm"]
+            ):
+                totals["calls"] += 1
+                totals["errors"] += call["status"] != "ok"
+                for field in LLM_FIELDS[1:-1]:
+                    totals[field] += call[field]
+
+    @staticmethod
+    def estimated_cost(prompt_tokens: int, completion_tokens: int) -> float:
+        return (prompt_tokens * config.LLM_COST_PER_MILLION_INPUT_TOKENS
+                + completion_tokens * config.LLM_COST_PER_MILLION_OUTPUT_TOKENS) / 1_000_000
+
+    # All metrics in the Prometheus text exposition format
+    def prometheus_text(self) -> str:
+        families: List[Tuple[str, str, str, List[str]]] = []
+        with self._lock:
+            families.append(("blog_node_runs_total", "counter", "Graph node runs by status",
+                             [prometheus_series("blog_node_runs_total", {"node": node, "status": status}, entry["count"])
+                              for (node, status), entry in sorted(self.node_runs.items())]))
+            families.append(("blog_node_duration_seconds_total", "counter", "Time spent in graph nodes",
+                             [prometheus_series("blog_node_duration_seconds_total", {"node": node, "status": status}, entry["seconds"])
+                              for (node, status), entry in sorted(self.node_runs.items())]))
+            families.append(("blog_node_duration_seconds_max", "gauge", "Longest single graph node run",
+                             [prometheus_series("blog_node_duration_seconds_max", {"node": node, "status": status}, entry["max_seconds"])
+                              for (node, status), entry in sorted(self.node_runs.items())]))
+            for field, kind, help_text in (
+                ("calls", "counter", "LLM calls"),
+                ("errors", "counter", "LLM calls that failed after all retries"),
+                ("attempts", "counter", "LLM call attempts, including retries"),
+                ("llm_seconds", "counter", "Time spent waiting for the LLM provider"),
+                ("queued_seconds", "counter", "Time LLM calls waited for the shared request budget"),
+                ("retry_seconds", "counter", "Time LLM calls spent backing off between retries"),
+                ("prompt_tokens", "counter", "Prompt tokens sent"),
+                ("completion_tokens", "counter", "Completion tokens received"),
+            ):
+                name = f"blog_llm_{field}_total"
+                families.append((name, kind, help_text, [
+                    prometheus_series(name, {"node": node, "call": run_name}, entry[field])
+                    for (node, run_name), entry in sorted(self.llm_calls.items())
+                ]))
+            families.append(("blog_llm_estimated_cost_usd_total", "counter", "Estimated LLM cost", [
+                prometheus_series("blog_llm_estimated_cost_usd_total", {"node": node, "call": run_name},
+                                  self.estimated_cost(entry["prompt_tokens"], entry["completion_tokens"]))
+                for (node, run_name), entry in sorted(self.llm_calls.items())
+            ]))
+            families.append(("blog_revisions_total", "counter", "Outline and section drafts beyond the first", [
+                prometheus_series("blog_revisions_total", {"kind": kind}, count) for kind, count in sorted(self.revisions.items())
+            ]))
+            families.append(("blog_human_wait_seconds_total", "counter", "Time reviewers took to answer interrupts", [
+                prometheus_series("blog_human_wait_seconds_total", {"node": node}, entry["seconds"])
+                for node, entry in sorted(self.human_waits.items())
+            ]))
+            families.append(("blog_human_waits_total", "counter", "Answered interrupts", [
+                prometheus_series("blog_human_waits_total", {"node": node}, entry["count"])
+                for node, entry in sorted(self.human_waits.items())
+            ]))
+
+        lines = []
+        for name, kind, help_text, series in families:
+            if series:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", *series]
+        return "\n".join(lines) + "\n"
+
+    def run_summary(self, thread_id: str) -> Dict[str, Any]:
+        with self._lock:
+            run = json.loads(json.dumps(self._run(thread_id)))
+        for node in run["nodes"].values():
+            node["seconds"] = round(node["seconds"], 4)
+        llm = run["llm"]
+        for field in ("seconds", "llm_seconds", "queued_seconds", "retry_seconds"):
+            llm[field] = round(llm[field], 4)
+        run["human_wait_seconds"] = round(run["human_wait_seconds"], 3)
+        run["llm"]["estimated_cost_usd"] = round(self.estimated_cost(llm["prompt_tokens"], llm["completion_tokens"]), 6)
+        run["revisions"] = {
+            "outline": max(0, run["drafts"]["outline"] - 1),
+            "sections": {no: count - 1 for no, count in run["drafts"]["sections"].items() if count > 1}
+        }
+        run["wall_seconds"] = round(time.time() - run["started_at"], 3)
+        return run
+
+    # Write the thread's summary and the current Prometheus metrics to METRICS_DIR, then forget the thread
+    def finish_run(self, thread_id: str) -> Optional[str]:
+        if not self.attached:
+            return None
+        os.makedirs(config.METRICS_DIR, exist_ok=True)
+        summary_path = os.path.join(config.METRICS_DIR, f"{thread_id}.json")
+        with open(summary_path, "w", encoding="utf-8") as f:
+            json.dump(self.run_summary(thread_id), f, indent=2)
+        with open(os.path.join(config.METRICS_DIR, "metrics.prom"), "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        self.discard_run(thread_id)
+        logger.info(f"run metrics written to {summary_path}")
+        return summary_path
+
+
+# Shared by every session in the process; attached by blog_graph when METRICS_ENABLED is set
+metrics = MetricsRecorder()
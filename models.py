@@ -0,0 +1,158 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import logger
+
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.runnables import Runnable
+
+import config
+from llm_cache import create_llm_cache
+from llm_client import llm_client
+from token_budget import TokenBudget
+
+
+STAGES = ("summary", "outline", "draft")
+
+# Shared by every model (responses are cached when LLM_CACHE_MODE is not "off")
+llm_cache = create_llm_cache()
+
+
+# Build a chat model from a "provider:model" spec. Provider packages other than Groq are
+# imported only when used. Retries and request budgeting are handled by the shared llm_client,
+# so the SDKs do not retry; the timeout lets a slow model hand over to the next one in its chain.
+def create_chat_model(spec: str) -> BaseChatModel:
+    provider, _, model = spec.strip().partition(":")
+    provider, model = provider.strip().lower(), model.strip()
+    timeout = config.LLM_REQUEST_TIMEOUT_SECONDS or None
+
+    if provider == "fake":
+        from fake_llm import FakeChatModel
+        return FakeChatModel(model_name=model or "fake-chat-model", cache=llm_cache)
+    if not model:
+        raise ValueError(f"Model spec {spec!r} should look like 'provider:model'")
+    if provider == "groq":
+        from langchain_groq import ChatGroq
+        return ChatGroq(model=model, cache=llm_cache, rate_limiter=llm_client.rate_limiter("groq"), max_retries=0,
+                        max_tokens=config.LLM_OUTPUT_TOKENS, timeout=timeout)
+    if provider == "openai":
+        try:
+            from langchain_openai import ChatOpenAI
+        except ImportError:
+            raise ImportError("The 'openai' provider needs the langchain-openai package")
+        return ChatOpenAI(model=model, cache=llm_cache, rate_limiter=llm_client.rate_limiter("openai"), max_retries=0,
+                          max_tokens=config.LLM_OUTPUT_TOKENS, timeout=timeout)
+    if provider == "google":
+        try:
+            from langchain_google_genai import ChatGoogleGenerativeAI
+        except ImportError:
+            raise ImportError("The 'google' provider needs the langchain-google-genai package")
+        return ChatGoogleGenerativeAI(model=model, cache=llm_cache, rate_limiter=llm_client.rate_limiter("google"), max_retries=0,
+                                      max_output_tokens=config.LLM_OUTPUT_TOKENS, timeout=timeout)
+    raise ValueError(f"Unknown model provider {provider!r} in {spec!r}")
+
+
+def model_name(model) -> str:
+    return getattr(model, "model_name", None) or getattr(model, "model", None) or type(model).__name__
+
+
+# When each model last failed, keyed by model instance. Routes sharing a ModelCooldowns see
+# each other's failures, so a model that failed for one stage is also skipped by the others.
+class ModelCooldowns:
+    def __init__(self, cooldown_seconds: float = None):
+        self.cooldown_seconds = config.LLM_MODEL_COOLDOWN_SECONDS if cooldown_seconds is None else cooldown_seconds
+        self._failed_at: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def mark_failed(self, model: BaseChatModel):
+        with self._lock:
+            self._failed_at[id(model)] = time.monotonic()
+
+    def is_cooling(self, model: BaseChatModel) -> bool:
+        with self._lock:
+            failed_at = self._failed_at.get(id(model))
+        return failed_at is not None and time.monotonic() - failed_at < self.cooldown_seconds
+
+
+# Tokens-per-minute limit of the provider the model is rate limited under, None if it has no limiter
+def tokens_per_minute(model) -> Optional[int]:
+    rate_limiter = getattr(model, "rate_limiter", None)
+    return getattr(rate_limiter, "tokens_per_minute", None)
+
+
+# The models a stage may use, in order of preference. A model that fails (an error or a
+# timeout) is moved to the back of the chain for LLM_MODEL_COOLDOWN_SECONDS, so a saturated
+# model is not tried first by every call while it recovers.
+class ModelRoute:
+    def __init__(self, stage: str, models: List[BaseChatModel], cooldown_seconds: float = None,
+                 cooldowns: Optional[ModelCooldowns] = None):
+        if not models:
+            raise ValueError(f"No models configured for stage {stage!r}")
+        self.stage = stage
+        self.models = models
+        self.cooldowns = cooldowns or ModelCooldowns(cooldown_seconds)
+        self.cooldown_seconds = self.cooldowns.cooldown_seconds
+        # Prompts must fit every model in the chain, so the smallest budget applies
+        self.budget = min((TokenBudget.for_model(model_name(model), tokens_per_minute(model)) for model in models),
+                          key=lambda budget: budget.prompt_tokens)
+
+    # Name of the preferred model (used in cache keys)
+    @property
+    def model_name(self) -> str:
+        return model_name(self.models[0])
+
+    def ordered(self) -> List[BaseChatModel]:
+        cooling = [self.cooldowns.is_cooling(model) for model in self.models]
+        return [model for model, is_cooling in zip(self.models, cooling) if not is_cooling] + \
+               [model for model, is_cooling in zip(self.models, cooling) if is_cooling]
+
+    def mark_failed(self, model: BaseChatModel):
+        self.cooldowns.mark_failed(model)
+        if len(self.models) > 1:
+            logger.info(f"{self.stage} model {model_name(model)} failed, falling back for {self.cooldown_seconds:.0f}s")
+
+    # Called by llm_client with its (cached) single-model runnable builder
+    def fallback_chain(self, model_runnable: Callable[[BaseChatModel], Runnable]) -> Runnable:
+        if len(self.models) == 1:
+            return model_runnable(self.models[0])
+        runnables = [
+            model_runnable(model).with_listeners(on_error=lambda run, model=model: self.mark_failed(model))
+            for model in self.ordered()
+        ]
+        return runnables[0].with_fallbacks(runnables[1:])
+
+
+# Model route per stage, built from LLM_MODELS and the LLM_MODELS_<STAGE> overrides
+class ModelRegistry:
+    def __init__(self, routes: Dict[str, ModelRoute]):
+        self.routes = routes
+
+    def route(self, stage: str) -> ModelRoute:
+        return self.routes[stage]
+
+    @classmethod
+    def from_config(cls) -> "ModelRegistry":
+        # Stages naming the same model share one instance, and its cooldown through `cooldowns`
+        models: Dict[str, BaseChatModel] = {}
+        cooldowns = ModelCooldowns()
+        routes = {}
+        for stage in STAGES:
+            specs = getattr(config, f"LLM_MODELS_{stage.upper()}") or config.LLM_MODELS
+            chain = []
+            for spec in (spec.strip() for spec in specs.split(",") if spec.strip()):
+                if spec not in models:
+                    models[spec] = create_chat_model(spec)
+                chain.append(models[spec])
+            routes[stage] = ModelRoute(stage, chain, cooldowns=cooldowns)
+            logger.info(f"{stage} models: {', '.join(model_name(model) for model in chain)}")
+        return cls(routes)
+
+    # Every stage uses the given model, e.g. a FakeChatModel in benchmarks
+    @classmethod
+    def using(cls, model: BaseChatModel) -> "ModelRegistry":
+        cooldowns = ModelCooldowns()
+        return cls({stage: ModelRoute(stage, [model], cooldowns=cooldowns) for stage in STAGES})
@@ -3,64 +3,260 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from logger_config import logger
 
-import time
-
 from pydantic import BaseModel, Field
-from typing import List
-from langchain_groq import ChatGroq
-from langgraph.types import Command, interrupt
+from typing import List, Tuple
+from langgraph.graph import END
+from langgraph.types import Command, Send, interrupt
 from langchain.schema import SystemMessage, HumanMessage
 
 
 from blog_state import BlogState
+from functions import split_code_by_file, chunk_code_files, join_code_files
+from code_digest import build_code_digest
+import config
+from tracing import Lazy, current_thread_id
+from llm_client import llm_client
+from summary_cache import SummaryCache, content_hash
+from token_budget import PromptPart, count_tokens
+from models import ModelRegistry
+from retrieval import relevant_code_snippets
+from speculative import speculative_drafts
+from outline_edits import parse_outline_edits, apply_outline_edits
+from incremental import file_hashes, changed_files, snippet_sources, find_stale_sections
+from dedup import NOTE_HEADER, dedupe_code_files
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Initialize LLM
-llm = ChatGroq(model="llama-3.1-8b-instant")
+# Model chain per stage ("summary", "outline", "draft"), see LLM_MODELS. Every prompt is packed
+# into its route's budget: the smallest context window in the chain minus the completion tokens.
+models = ModelRegistry.from_config()
+
+# Initialize summary cache
+summary_cache = SummaryCache(
+    path=os.path.join(config.CACHE_DIR, "summaries.sqlite3"),
+    max_bytes=config.SUMMARY_CACHE_MAX_MB * 1024 * 1024,
+    max_age_seconds=config.SUMMARY_CACHE_MAX_AGE_DAYS * 24 * 60 * 60
+) if config.SUMMARY_CACHE_ENABLED else None
+
+
+# Prompt wording for full sources vs. the structural digest built by `code_digest`
+DIGEST_NOTE = (
+    "It is a structural digest, not the full source: module docstrings, imports, class and function "
+    "signatures with their docstrings and the calls they make into other repo modules, followed by the "
+    "module dependency graph. Function bodies are omitted."
+)
 
 
 # Code Understanding Module
-def code_understanding_node(state: BlogState):
-    logger.info(f"state: {state}")
-    # Get code from state
-    code = state["code"]
+def summarize_code(code: str, digest: bool = False) -> str:
+    def build_messages(code: str):
+        return [
+            SystemMessage(content="You are an expert Python code reviewer."),
+            HumanMessage(content=f"""
+            I have the following Python codebase:{" " + DIGEST_NOTE if digest else ""}
+
+            ```python
+            {code}
+            ```
+            Summarize what this code is doing. Cover the overall purpose, key components, and any interesting structure or design patterns.
+            """)
+        ]
+
+    messages = models.route("summary").budget.fit(build_messages, [PromptPart("code", code, priority=0)], "code_summary")
+
+    code_summary = cached_batch_contents([("codebase-digest" if digest else "codebase", code, messages)])[0]
+    logger.debug("code understanding node response: %s", Lazy(code_summary))
+    return code_summary
+
+
+def file_summary_messages(file_path: str, source: str, digest: bool = False):
+    def build_messages(source: str):
+        return [
+            SystemMessage(content="You are an expert Python code reviewer."),
+            HumanMessage(content=f"""
+            The following is one file (or part of a file) from a larger Python codebase.{" " + DIGEST_NOTE if digest else ""}
+
+            File: {file_path}
+            ```python
+            {source}
+            ```
+            Summarize what this file does in a few short paragraphs. Mention its key classes and functions, how it is meant to be used, and which other modules it depends on.
+            """)
+        ]
+
+    return models.route("summary").budget.fit(build_messages, [PromptPart("source", source, priority=0)], f"file_summary {file_path}")
+
+
+def reduce_summary_messages(partial_summaries: List[str], final: bool):
+    joined = "\n\n".join(partial_summaries)
+    if final:
+        instruction = "Combine them into a single summary of the whole codebase. Cover the overall purpose, key components, and any interesting structure or design patterns."
+    else:
+        instruction = "Merge them into one concise summary of this part of the codebase, keeping the file names, key components and how they relate."
+    def build_messages(joined: str):
+        return [
+            SystemMessage(content="You are an expert Python code reviewer."),
+            HumanMessage(content=f"""
+            The following are summaries of different parts of a Python codebase.
 
-    messages = [
-        SystemMessage(content="You are an expert Python code reviewer."),
-        HumanMessage(content=f"""
-        I have the following Python codebase:
+            {joined}
 
-        ```python
-        {code}
-        ```
-        Summarize what this code is doing. Cover the overall purpose, key components, and any interesting structure or design patterns.
-        """)
+            {instruction}
+            """)
+        ]
+
+    return models.route("summary").budget.fit(build_messages, [PromptPart("joined", joined, priority=0)], "summary_reduce")
+
+
+def batch_contents(messages_list) -> List[str]:
+    # Summaries are not shown while they are generated, so keep them out of the token stream
+    responses = llm_client.batch(models.route("summary"), messages_list, max_concurrency=config.CODE_SUMMARY_MAX_CONCURRENCY, config={"tags": ["nostream"], "run_name": "code_summary"})
+    return [response.content.strip() for response in responses]
+
+
+# Summarize `(kind, content, messages)` requests, sending only cache misses to the LLM
+def cached_batch_contents(requests: List[Tuple[str, str, list]]) -> List[str]:
+    if summary_cache is None:
+        return batch_contents([messages for _, _, messages in requests])
+
+    model = models.route("summary").model_name
+    keys = [
+        (content_hash(content), model, f"{kind}-{config.SUMMARY_PROMPT_VERSION}")
+        for kind, content, _ in requests
     ]
+    results = [summary_cache.get(*key) for key in keys]
+    # Identical contents within one batch are only summarized once
+    missing = {}
+    for i, result in enumerate(results):
+        if result is None:
+            missing.setdefault(keys[i], []).append(i)
+    logger.info(f"summary cache: {len(requests) - sum(map(len, missing.values()))} hits, {len(missing)} misses")
+
+    if missing:
+        contents = batch_contents([requests[indices[0]][2] for indices in missing.values()])
+        for (key, indices), content in zip(missing.items(), contents):
+            summary_cache.put(*key, content)
+            for i in indices:
+                results[i] = content
+    return results
+
+
+# Group partial summaries so that each reduce call stays within the fan-in and size limits.
+# Groups take at least two summaries, so every reduce level shrinks the count even when single
+# summaries exceed the size limit (the reduce prompt is then trimmed to the token budget).
+def group_summaries(summaries: List[str]) -> List[List[str]]:
+    fan_in = max(2, config.CODE_SUMMARY_REDUCE_FAN_IN)
+    groups, current, current_len = [], [], 0
+    for summary in summaries:
+        if len(current) >= fan_in or (len(current) >= 2 and current_len + len(summary) > config.CODE_SUMMARY_REDUCE_MAX_CHARS):
+            groups.append(current)
+            current, current_len = [], 0
+        current.append(summary)
+        current_len += len(summary)
+    if current:
+        groups.append(current)
+    return groups
+
+
+def map_reduce_code_summary(code: str, digest: bool = False) -> str:
+    chunks = chunk_code_files(split_code_by_file(code), config.CODE_SUMMARY_CHUNK_CHARS)
+    logger.info(f"map-reduce summarization over {len(chunks)} chunks")
+
+    # Map: summarize every file chunk concurrently
+    summaries = cached_batch_contents([
+        ("file-digest" if digest else "file", source, file_summary_messages(file_path, source, digest))
+        for file_path, source in chunks
+    ])
+    summaries = [f"File: {file_path}\n{summary}" for (file_path, _), summary in zip(chunks, summaries)]
+
+    # Reduce: merge partial summaries level by level until they fit in one call
+    level = 1
+    groups = group_summaries(summaries)
+    while len(groups) > 1:
+        logger.info(f"reduce level {level}: merging {len(summaries)} summaries into {len(groups)}")
+        summaries = cached_batch_contents([
+            ("reduce", "\n\n".join(group), reduce_summary_messages(group, final=False))
+            for group in groups
+        ])
+        groups = group_summaries(summaries)
+        level += 1
+
+    code_summary = cached_batch_contents([
+        ("final", "\n\n".join(summaries), reduce_summary_messages(summaries, final=True))
+    ])[0]
+    logger.debug("code understanding node response: %s", Lazy(code_summary))
+    return code_summary
+
+
+def summarize_codebase(code: str) -> str:
+    # Copies, near-copies and generated modules are summarized once
+    dedup_note = ""
+    if config.DEDUP_ENABLED:
+        files, dedup_note, report = dedupe_code_files(split_code_by_file(code))
+        if report["collapsed"]:
+            code = join_code_files(files)
+    # Large codebases are summarized from their AST digest instead of the full sources
+    source_input = config.CODE_SUMMARY_INPUT
+    if source_input == "auto":
+        source_input = "digest" if len(code) > config.CODE_SUMMARY_MAP_REDUCE_THRESHOLD else "source"
+    digest = source_input == "digest"
+    if digest:
+        code = join_code_files(build_code_digest(split_code_by_file(code)))
+    # The note is not a source file, so it joins the input only after the digest
+    if dedup_note:
+        code += "\n\n" + join_code_files([(NOTE_HEADER, dedup_note)])
+    logger.info(f"code summary input: {source_input} ({len(code)} characters)")
+
+    mode = config.CODE_SUMMARY_MODE
+    if mode == "auto":
+        too_large = len(code) > config.CODE_SUMMARY_MAP_REDUCE_THRESHOLD or count_tokens(code) > models.route("summary").budget.prompt_tokens
+        mode = "map_reduce" if too_large else "single"
+    logger.info(f"code summary mode: {mode}")
+
+    if mode == "map_reduce":
+        code_summary = map_reduce_code_summary(code, digest)
+    else:
+        code_summary = summarize_code(code, digest)
 
-    response = llm.invoke(messages)
-    logger.info(f"code understanding node response: {response}")
+    if summary_cache is not None:
+        logger.info(f"summary cache stats: {summary_cache.stats()}")
+    return code_summary
 
-    blog_state = {
-        **state,
-        "code_summary": response.content.strip()
-    }
-    return blog_state
 
-def invoke_with_retries(llm, messages, output_class, max_retries=3, base_delay=1.0):
-    for attempt in range(max_retries):
-        try:
-            response = llm.with_structured_output(output_class).invoke(messages)
-            return response
-        except Exception as e:
-            logger.info(f"Attempt {attempt + 1} failed with error: {e}")
-            if attempt == max_retries - 1:
-                raise  # re-raise if last attempt
-            sleep_time = base_delay * (2 ** attempt)  # exponential backoff
-            logger.info(f"Retrying after {sleep_time} seconds...")
-            time.sleep(sleep_time)
+def code_understanding_node(state: BlogState):
+    logger.debug("state: %s", Lazy(state))
+    # File hashes let a later update of the blog find what changed (see code_update_node)
+    return {"code_summary": summarize_codebase(state["code"]), "file_hashes": file_hashes(state["code"])}
+
+
+# Code Update Node
+# Entry point when a finished blog is run again on changed code: sections whose recorded
+# files or symbols changed are reopened with a note for the redraft, all other drafts are kept
+def code_update_node(state: BlogState):
+    logger.debug("state: %s", Lazy(state))
+    code = state["code"]
+    new_hashes = file_hashes(code)
+    changed = changed_files(state.get("file_hashes", {}), new_hashes)
+    if not changed:
+        logger.info("the code has not changed since the blog was written")
+        return Command(update={"file_hashes": new_hashes}, goto=END)
+    logger.info(f"{len(changed)} files changed: {sorted(changed)[:20]}")
+
+    stale = find_stale_sections(state.get("sections", []), state.get("section_sources", {}), code)
+    update = {"file_hashes": new_hashes, "stale_sections": list(stale)}
+    if stale:
+        update["code_summary"] = summarize_codebase(code)
+        update["feedback"] = {
+            f"section_drafting_{no}": f"The code this section describes has changed ({reason}). "
+                                      "Update the draft to match the current code, keeping everything that is still accurate."
+            for no, reason in stale.items()
+        }
+    return Command(update=update, goto="set_next_section")
+
+def invoke_with_retries(llm, messages, output_class, max_retries=3, base_delay=1.0, run_config=None):
+    return llm_client.invoke(llm, messages, output_class=output_class, config=run_config, max_retries=max_retries, base_delay=base_delay)
 
 # Blog Structuring Module
 class Section(BaseModel):
@@ -70,88 +266,107 @@ class Section(BaseModel):
 class SectionsOutput(BaseModel):
     sections: List[Section] = Field(..., description="List of blog sections with titles and descriptions")
 
-def blog_structuring_node(state: BlogState):
-    logger.info(f"state: {state}")
+# Outline prompt, packed into the token budget
+def outline_messages(state: BlogState) -> list:
     code_summary = state.get("code_summary", "")
     feedback = state.get("feedback", {}).get("blog_structuring", "")
     previous_sections = state.get("sections", [])
-
-    # Compose base prompt
-    prompt = f"""
-    Based on the following code summary, generate a high-level blog post outline with 5-7 sections.
-
-    Code Summary:
-    {code_summary}
-
-    Each section should include:
-    - A clear title
-    - A 1-2 sentence description explaining what the section will cover
-    """
-
     # Include previous outline if feedback is present
-    if feedback and previous_sections:
+    revising = bool(feedback and previous_sections)
+    formatted_previous = ""
+    if revising:
         logger.info(f"previous drafts and feedback is present. So, adding them to prompt")
-        logger.info(f"feedback from user: {feedback}")
+        logger.info("feedback from user: %s", Lazy(feedback))
         formatted_previous = "\n".join([
             f"{s['no']}. {s['title']}: {s['description']}"
             for s in previous_sections
         ])
-        prompt += f"""
 
-        Previous Outline:
-        {formatted_previous}
+    def build_messages(code_summary: str, previous_outline: str, feedback: str):
+        # Compose base prompt
+        prompt = f"""
+        Based on the following code summary, generate a high-level blog post outline with 5-7 sections.
 
-        Human Feedback on Previous Outline:
-        {feedback}
+        Code Summary:
+        {code_summary}
 
-        Please generate a revised outline considering the feedback above.
+        Each section should include:
+        - A clear title
+        - A 1-2 sentence description explaining what the section will cover
         """
 
-    prompt += """
-    Return only a valid JSON object in the format:
-    ```json
-    {
-    "sections": [
-        {
-        "title": "Your section title here",
-        "description": "Short description here."
-        },
-        ...
-    ]
-    }
-    ```
-    """
-    messages = [
-        SystemMessage(
-            content="You are an expert technical writer helping to create a blog post outline. "
-                    "You must return a JSON object with a single key 'sections', whose value is a list of sections. "
-                    "Each section must be an object with the keys: 'title' (str), 'description' (str). Do not add any commentary or explanation."
-        ),
-        HumanMessage(content=prompt)
-    ]
-    logger.info(f"prompt: {prompt}")
+        if revising:
+            prompt += f"""
+
+            Previous Outline:
+            {previous_outline}
+
+            Human Feedback on Previous Outline:
+            {feedback}
 
-    response = invoke_with_retries(llm=llm, messages=messages, output_class=SectionsOutput)
-    logger.info(f"blog structuring node output: {response}")
+            Please generate a revised outline considering the feedback above.
+            """
 
-    numbered_sections = [
+        prompt += """
+        Return only a valid JSON object in the format:
+        ```json
+        {
+        "sections": [
+            {
+            "title": "Your section title here",
+            "description": "Short description here."
+            },
+            ...
+        ]
+        }
+        ```
+        """
+        return [
+            SystemMessage(
+                content="You are an expert technical writer helping to create a blog post outline. "
+                        "You must return a JSON object with a single key 'sections', whose value is a list of sections. "
+                        "Each section must be an object with the keys: 'title' (str), 'description' (str). Do not add any commentary or explanation."
+            ),
+            HumanMessage(content=prompt)
+        ]
+
+    # The feedback and the outline it refers to matter most; the summary gives way first
+    messages = models.route("outline").budget.fit(build_messages, [
+        PromptPart("feedback", feedback if revising else "", priority=0),
+        PromptPart("previous_outline", formatted_previous, priority=1),
+        PromptPart("code_summary", code_summary, priority=2),
+    ], "outline")
+    logger.debug("prompt: %s", Lazy(messages[1].content))
+    return messages
+
+
+def numbered_sections(response: SectionsOutput) -> List[dict]:
+    logger.debug("blog structuring node output: %s", Lazy(response))
+    return [
         {"no": str(i + 1), **section.model_dump()}
         for i, section in enumerate(response.sections)
     ]
-    return {
-        **state,
-        "sections": numbered_sections
-    }
 
 
-# Section Drafting Node
-def section_drafting_node(state: BlogState):
-    logger.info(f"state: {state}")
+def blog_structuring_node(state: BlogState):
+    logger.debug("state: %s", Lazy(state))
+    messages = outline_messages(state)
+    response = invoke_with_retries(llm=models.route("outline"), messages=messages, output_class=SectionsOutput, run_config={"run_name": "outline"})
+    return {"sections": numbered_sections(response)}
+
+
+# Async twin used when the graph runs with `astream` (the HTTP service): the LLM call
+# awaits on the event loop instead of holding a worker thread
+async def ablog_structuring_node(state: BlogState):
+    logger.debug("state: %s", Lazy(state))
+    messages = outline_messages(state)
+    response = await llm_client.ainvoke(models.route("outline"), messages, output_class=SectionsOutput, config={"run_name": "outline"})
+    return {"sections": numbered_sections(response)}
 
-    target_no = state.get("target_section_no")
-    if target_no is None:
-        raise ValueError("Missing 'target_section_no' in state")
 
+# Section Drafting Node
+# Section prompt, packed into the token budget, and the code snippets retrieved for it
+def section_draft_messages(state: BlogState, target_no: str) -> Tuple[list, List[Tuple[str, str]]]:
     section_drafts = state.get("section_drafts", {})
     sections = state.get("sections", [])
     code_summary = state.get("code_summary", "")
@@ -167,64 +382,211 @@ def section_drafting_node(state: BlogState):
     previous_draft = section_drafts.get(section_key, None)
     section_feedback = feedback_dict.get(feedback_key, None)
 
-    prompt_parts = [
-        f"You are writing the blog section titled **{target_section['title']}**.",
-        f"\nSection Description: {target_section['description']}",
-        f"\nCode Summary for context:\n{code_summary}"
-    ]
+    has_previous_draft, has_feedback = bool(previous_draft), bool(section_feedback)
+    if has_feedback:
+        logger.info("feedback from user: %s", Lazy(section_feedback))
+
+    # Ground the section in the code it is about, looked up by its title, description and feedback
+    snippets = []
+    if config.RETRIEVAL_ENABLED and state.get("code"):
+        query = "\n".join([target_section["title"], target_section["description"], section_feedback or ""])
+        snippets = relevant_code_snippets(state["code"], query)
+    code_excerpts = join_code_files(snippets)
+    has_excerpts = bool(code_excerpts)
+
+    def build_messages(description: str, code_summary: str, code_excerpts: str, previous_draft: str, section_feedback: str):
+        prompt_parts = [
+            f"You are writing the blog section titled **{target_section['title']}**.",
+            f"\nSection Description: {description}",
+            f"\nCode Summary for context:\n{code_summary}"
+        ]
+
+        if has_excerpts:
+            prompt_parts.append(f"\nRelevant code excerpts:\n```python\n{code_excerpts}\n```")
+
+        if has_previous_draft:
+            prompt_parts.append(f"\nPrevious Draft:\n{previous_draft}")
+
+        if has_feedback:
+            prompt_parts.append(f"\nHuman Feedback:\n{section_feedback}")
+
+        prompt_parts.append("\nWrite a detailed, revised plain-text draft for this section. Avoid using any markdown formatting. Just write natural, readable sentences and paragraphs.")
+
+        return [
+            SystemMessage(content="You are a technical writer drafting one section of a blog post based on a code summary."),
+            HumanMessage(content="\n".join(prompt_parts))
+        ]
+
+    # What the section is about and what the reviewer asked for come first, then the
+    # draft being revised; code excerpts and then the code summary give way when the prompt is too long
+    messages = models.route("draft").budget.fit(build_messages, [
+        PromptPart("description", target_section["description"], priority=0, truncatable=False),
+        PromptPart("section_feedback", section_feedback, priority=1),
+        PromptPart("previous_draft", previous_draft, priority=2),
+        PromptPart("code_summary", code_summary, priority=3),
+        PromptPart("code_excerpts", code_excerpts, priority=4),
+    ], f"section {target_no}")
+    return messages, snippets
+
+
+# Tag the call so streamed tokens can be attributed to this section
+def section_draft_config(target_no: str) -> dict:
+    return {"metadata": {"section_no": target_no}, "run_name": "section_draft"}
+
+
+# Draft of a section and the sources (files and symbols) it was drafted from
+def draft_section(state: BlogState, target_no: str) -> Tuple[str, dict]:
+    messages, snippets = section_draft_messages(state, target_no)
+    sources = snippet_sources(state["code"], snippets)
+    thread_id = current_thread_id()
+    if config.SPECULATIVE_DRAFTING and thread_id:
+        speculative_draft = speculative_drafts.take(thread_id, target_no, messages)
+        if speculative_draft is not None:
+            return speculative_draft, sources
+    response = llm_client.invoke(models.route("draft"), messages, config=section_draft_config(target_no))
+    updated_draft = response.content.strip()
+    logger.debug("Updated draft for section %s: %s", target_no, Lazy(updated_draft))
+    return updated_draft, sources
+
+
+async def adraft_section(state: BlogState, target_no: str) -> Tuple[str, dict]:
+    messages, snippets = section_draft_messages(state, target_no)
+    sources = snippet_sources(state["code"], snippets)
+    thread_id = current_thread_id()
+    if config.SPECULATIVE_DRAFTING and thread_id:
+        speculative_draft = await speculative_drafts.atake(thread_id, target_no, messages)
+        if speculative_draft is not None:
+            return speculative_draft, sources
+    response = await llm_client.ainvoke(models.route("draft"), messages, config=section_draft_config(target_no))
+    updated_draft = response.content.strip()
+    logger.debug("Updated draft for section %s: %s", target_no, Lazy(updated_draft))
+    return updated_draft, sources
 
-    if previous_draft:
-        prompt_parts.append(f"\nPrevious Draft:\n{previous_draft}")
 
-    if section_feedback:
-        logger.info(f"feedback from user: {section_feedback}")
-        prompt_parts.append(f"\nHuman Feedback:\n{section_feedback}")
+# Only the new draft is returned; the `section_drafts` and `section_sources` reducers merge it
+# into the state. A section reopened by a code update is no longer stale once redrafted.
+def section_draft_update(state: BlogState, target_no: str, draft: str, sources: dict) -> dict:
+    update = {"section_drafts": {f"section{target_no}": draft}, "section_sources": {target_no: sources}}
+    stale = state.get("stale_sections") or []
+    if target_no in stale:
+        update["stale_sections"] = [no for no in stale if no != target_no]
+    return update
 
-    prompt_parts.append("\nWrite a detailed, revised plain-text draft for this section. Avoid using any markdown formatting. Just write natural, readable sentences and paragraphs.")
 
-    messages = [
-        SystemMessage(content="You are a technical writer drafting one section of a blog post based on a code summary."),
-        HumanMessage(content="\n".join(prompt_parts))
-    ]
+def section_drafting_node(state: BlogState):
+    logger.debug("state: %s", Lazy(state))
 
-    response = llm.invoke(messages)
-    updated_draft = response.content.strip()
-    logger.info(f"Updated draft for section {target_no}:\n{updated_draft}")
+    target_no = state.get("target_section_no")
+    if target_no is None:
+        raise ValueError("Missing 'target_section_no' in state")
+
+    return section_draft_update(state, target_no, *draft_section(state, target_no))
 
-    section_drafts[section_key] = updated_draft
 
-    return {
-        **state,
-        "section_drafts": section_drafts
-    }
+async def asection_drafting_node(state: BlogState):
+    logger.debug("state: %s", Lazy(state))
+
+    target_no = state.get("target_section_no")
+    if target_no is None:
+        raise ValueError("Missing 'target_section_no' in state")
+
+    return section_draft_update(state, target_no, *await adraft_section(state, target_no))
+
+
+# Parallel Section Drafting Node
+# Runs once per section via Send after the outline is approved; the concurrent writes
+# are merged by the `section_drafts` reducer.
+def parallel_section_drafting_node(state: BlogState):
+    target_no = state.get("target_section_no")
+    logger.info(f"drafting section {target_no} in parallel")
+    draft, sources = draft_section(state, target_no)
+    return {"section_drafts": {f"section{target_no}": draft}, "section_sources": {target_no: sources}}
+
+
+async def aparallel_section_drafting_node(state: BlogState):
+    target_no = state.get("target_section_no")
+    logger.info(f"drafting section {target_no} in parallel")
+    draft, sources = await adraft_section(state, target_no)
+    return {"section_drafts": {f"section{target_no}": draft}, "section_sources": {target_no: sources}}
+
+
+# Each Send carries only the fields `draft_section` reads, not the whole state
+def fan_out_section_drafting(state: BlogState) -> List[Send]:
+    draft_input = {key: state.get(key) for key in ("code", "sections", "code_summary", "section_drafts", "feedback")}
+    return [
+        Send("parallel_section_drafting", {**draft_input, "target_section_no": section["no"]})
+        for section in state.get("sections", [])
+    ]
 
 # Blog Structure Feedback Node
 def blog_structuring_feedback_node(state: BlogState):
-    logger.info(f"state: {state}")
+    logger.debug("state: %s", Lazy(state))
     logger.info("[blog_structuring_feedback_node] Awaiting human feedback for blog structure...")
     version = state.get("feedback", {}).get("blog_structuring_version", 0)
     # Interrupt to display sections and capture human feedback
     user_feedback = interrupt({
         "sections": state.get("sections", []),
         "blog_structuring_version": version+1,
-        "message": "Provide feedback on the blog structure (or type 'approved')",
+        "message": "Provide feedback on the blog structure (or type 'approved'). "
+                   "Edits like 'swap 2 and 3', 'drop 5', 'move 4 before 2' or 'rename 1 to <title>' are applied instantly.",
         "current_node": "human_blog_feedback"
     })
     
 
-    logger.info(f"[blog_structuring_feedback_node] Received feedback: {user_feedback}")
+    logger.info("[blog_structuring_feedback_node] Received feedback: %s", Lazy(user_feedback))
 
     feedback_update = {"blog_structuring": user_feedback, "blog_structuring_version": version+1}
 
     if user_feedback.lower() == "approved":
+        if config.PARALLEL_SECTION_DRAFTING:
+            # Draft every section concurrently, then review them one by one
+            return Command(update={"feedback": feedback_update}, goto=fan_out_section_drafting(state))
         return Command(update={"feedback": feedback_update}, goto="set_next_section")
-    else:
-        return Command(update={"feedback": feedback_update}, goto="blog_structuring")
+
+    # Edit commands are applied to the outline directly and shown for review again;
+    # only free-form feedback needs the LLM to regenerate the outline
+    edits = parse_outline_edits(user_feedback)
+    if edits:
+        try:
+            sections = apply_outline_edits(state.get("sections", []), edits)
+        except ValueError as e:
+            logger.info(f"outline edit could not be applied locally ({e}), asking the LLM instead")
+        else:
+            return Command(update={"sections": sections, "feedback": feedback_update}, goto="human_blog_feedback")
+    return Command(update={"feedback": feedback_update}, goto="blog_structuring")
+
+
+# Section a reviewer will get next after approving `target_no`, if it has no draft yet
+def next_undrafted_section(state: BlogState, target_no: str):
+    completed = set(state.get("completed_sections", [])) | {target_no}
+    next_section = next((s for s in state.get("sections", []) if s["no"] not in completed), None)
+    if next_section is None or f"section{next_section['no']}" in state.get("section_drafts", {}):
+        return None
+    return next_section["no"]
+
+
+# Start drafting the next section in the background (SPECULATIVE_DRAFTING) so it is ready when
+# the reviewer approves the current one. Returns the section number, the prompt it was drafted
+# from and the snippets in that prompt.
+def prefetch_next_section(state: BlogState, target_no: str):
+    thread_id = current_thread_id()
+    next_no = next_undrafted_section(state, target_no) if config.SPECULATIVE_DRAFTING and thread_id else None
+    if next_no is None:
+        return None, None, None
+    messages, snippets = section_draft_messages(state, next_no)
+    run_config = section_draft_config(next_no)
+    run_config["metadata"]["thread_id"] = thread_id
+
+    def draft() -> str:
+        return llm_client.invoke(models.route("draft"), messages, config=run_config).content.strip()
+
+    speculative_drafts.submit(thread_id, next_no, messages, draft)
+    return next_no, messages, snippets
 
 
 # Section Drafting Feedback Node
 def section_drafting_feedback_node(state: BlogState):
-    logger.info(f"state: {state}")
+    logger.debug("state: %s", Lazy(state))
     logger.info("[section_drafting_feedback_node] Awaiting human feedback for blog structure...")
     target_no = state.get("target_section_no")
     if not target_no:
@@ -239,8 +601,11 @@ def section_drafting_feedback_node(state: BlogState):
     section_description = section_obj.get("description", "")
     version = state.get("feedback", {}).get(f"section_drafting_{target_no}_version", 0)
     logger.info(f"section no: {target_no}")
-    logger.info(f"section_title: {section_title}")
-    logger.info(f"section_draft: {section_draft}")
+    logger.info("section_title: %s", Lazy(section_title))
+    logger.debug("section_draft: %s", Lazy(section_draft))
+
+    # Runs again when the node is resumed; the pending draft is reused
+    next_no, next_messages, next_snippets = prefetch_next_section(state, target_no)
 
     # Interrupt to get feedback from human
     feedback = interrupt({
@@ -253,21 +618,28 @@ def section_drafting_feedback_node(state: BlogState):
         "current_node": "human_section_feedback"
     })
 
-    logger.info(f"[section_drafting_feedback_node] Received feedback: {feedback}")
+    logger.info("[section_drafting_feedback_node] Received feedback: %s", Lazy(feedback))
 
     update = {
             "feedback": {
-                **state.get("feedback", {}),
                 f"section_drafting_{target_no}": feedback,
                 f"section_drafting_{target_no}_version": version+1
             }
         }
-    logger.info(f"update: {update}")
+    approved = feedback.lower().strip() == "approved"
+    if approved:
+        update["completed_sections"] = [target_no]
+        # A finished speculative draft goes straight to review; a pending one is awaited by section_drafting
+        next_draft = speculative_drafts.take(current_thread_id(), next_no, next_messages, wait=False) if next_no else None
+        if next_draft is not None:
+            update["section_drafts"] = {f"section{next_no}": next_draft}
+            update["section_sources"] = {next_no: snippet_sources(state["code"], next_snippets)}
+    logger.debug("update: %s", Lazy(update))
 
     # Save feedback keyed to the section number
     return Command(
         update=update,
-        goto="section_drafting" if feedback.lower().strip() != "approved" else "set_next_section"
+        goto="set_next_section" if approved else "section_drafting"
     )
 
 # Node wrappers
@@ -285,16 +657,16 @@ def section_drafting_approved(state: BlogState) -> str:
     feedback = state.get("feedback", {})
     return "approved" if feedback.get(section_key, "").lower().strip() == "approved" else "not approved"
 
+# Select the first section that has not been approved yet, or was reopened by a code update
 def set_next_section(state: BlogState):
     logger.info("in set_next_section function")
     sections = state.get("sections", [])
-    drafted = state.get("section_drafts", {}).keys()
-    next_section = next((s for s in sections if f"section{s['no']}" not in drafted), None)
+    completed = set(state.get("completed_sections", [])) - set(state.get("stale_sections") or [])
+    next_section = next((s for s in sections if s["no"] not in completed), None)
     if next_section:
-        logger.info(f"will draft section no: {next_section["no"]}")
-        state["target_section_no"] = next_section["no"]
-        return state
-    return {**state, "target_section_no": None}
+        logger.info(f"next section no: {next_section['no']}")
+        return {"target_section_no": next_section["no"]}
+    return {"target_section_no": None}
 
 def has_more_sections(state: BlogState) -> str:
     logger.info("in has_more_sections function")
@@ -0,0 +1,93 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import logger
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+
+# Outline feedback that is a list of edit commands is applied locally instead of asking the
+# LLM to regenerate the outline. Commands are separated by ";" or new lines, section numbers
+# refer to the outline the reviewer was shown, and the result is renumbered from 1:
+#
+#   swap 2 and 3                  drop section 5 (also "remove", "delete")
+#   rename section 1 to <title>   describe section 4 as <description>
+#   move section 5 to 2           move 5 before 2 / move 5 after 3
+
+SECTION = r"(?:sections?\s+)?(\d+)"
+TEXT = r"[\"']?(.+?)[\"']?"
+COMMANDS = [
+    ("swap", re.compile(rf"^swap\s+{SECTION}\s*(?:and|with|,)\s*{SECTION}\.?$", re.IGNORECASE)),
+    ("drop", re.compile(rf"^(?:drop|remove|delete)\s+{SECTION}\.?$", re.IGNORECASE)),
+    ("rename", re.compile(rf"^rename\s+{SECTION}\s+(?:to|as)\s+{TEXT}$", re.IGNORECASE | re.DOTALL)),
+    ("describe", re.compile(rf"^describe\s+{SECTION}\s+as\s+{TEXT}$", re.IGNORECASE | re.DOTALL)),
+    ("move", re.compile(rf"^move\s+{SECTION}\s+(to|before|after)\s+(?:position\s+)?{SECTION}\.?$", re.IGNORECASE)),
+]
+
+OutlineEdit = Tuple[str, tuple]
+
+
+# Parse feedback into edit commands; None if any part of it is free-form text
+def parse_outline_edits(feedback: str) -> Optional[List[OutlineEdit]]:
+    edits = []
+    for part in re.split(r"[;\n]+", feedback):
+        part = part.strip()
+        if not part:
+            continue
+        for name, pattern in COMMANDS:
+            match = pattern.match(part)
+            if match:
+                edits.append((name, match.groups()))
+                break
+        else:
+            return None
+    return edits or None
+
+
+# Apply parsed edits to the outline; raises ValueError for references to sections that do not exist
+def apply_outline_edits(sections: List[Dict[str, str]], edits: List[OutlineEdit]) -> List[Dict[str, str]]:
+    outline = [dict(section) for section in sections]
+    # Sections are looked up by the number the reviewer saw, even after earlier edits moved them
+    by_no = {section["no"]: section for section in outline}
+
+    def find(no: str) -> Dict[str, str]:
+        section = by_no.get(str(int(no)))
+        if section is None or not any(item is section for item in outline):
+            raise ValueError(f"There is no section {no}")
+        return section
+
+    def index(section: Dict[str, str]) -> int:
+        return next(i for i, item in enumerate(outline) if item is section)
+
+    for name, args in edits:
+        if name == "swap":
+            first, second = index(find(args[0])), index(find(args[1]))
+            outline[first], outline[second] = outline[second], outline[first]
+        elif name == "drop":
+            outline.pop(index(find(args[0])))
+        elif name == "rename":
+            find(args[0])["title"] = args[1].strip()
+        elif name == "describe":
+            find(args[0])["description"] = args[1].strip()
+        elif name == "move":
+            section, where, anchor = find(args[0]), args[1].lower(), args[2]
+            if where == "to":
+                position = int(anchor) - 1
+                if not 0 <= position < len(outline):
+                    raise ValueError(f"There is no position {anchor}")
+                outline.pop(index(section))
+                outline.insert(position, section)
+            else:
+                anchor_section = find(anchor)
+                if anchor_section is section:
+                    raise ValueError(f"Cannot move section {args[0]} relative to itself")
+                outline.pop(index(section))
+                outline.insert(index(anchor_section) + (where == "after"), section)
+
+    if not outline:
+        raise ValueError("The outline would have no sections left")
+    for i, section in enumerate(outline):
+        section["no"] = str(i + 1)
+    logger.info(f"applied {len(edits)} outline edits locally")
+    return outline
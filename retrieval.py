@@ -0,0 +1,112 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import logger
+
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+import config
+from functions import split_code_by_file, chunk_code_files
+from summary_cache import content_hash
+from token_budget import count_tokens
+
+
+IDENTIFIER_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+CAMEL_CASE_PATTERN = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+STOPWORDS = {
+    "self", "cls", "the", "and", "for", "with", "from", "import", "return", "def", "class", "none",
+    "true", "false", "not", "this", "that", "are", "was", "its", "into", "how", "what", "which",
+    "section", "code", "use", "used", "using", "will", "can", "our", "their", "about", "also"
+}
+
+
+# Lowercased word tokens; identifiers count as a whole and as their snake_case/camelCase parts
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for identifier in IDENTIFIER_PATTERN.findall(text):
+        parts = [part for piece in identifier.split("_") for part in CAMEL_CASE_PATTERN.findall(piece)]
+        words = {identifier.lower(), *(part.lower() for part in parts)}
+        tokens.extend(word for word in words if len(word) > 2 and word not in STOPWORDS)
+    return tokens
+
+
+# BM25 index over code chunks. Postings are stored per term as NumPy arrays of chunk ids and
+# precomputed BM25 weights, so scoring a query is a few vectorized scatter-adds.
+class CodeIndex:
+    def __init__(self, chunks: List[Tuple[str, str]], k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        term_counts = [Counter(tokenize(f"{path}\n{text}")) for path, text in chunks]
+        lengths = np.array([sum(counts.values()) for counts in term_counts], dtype=np.float32)
+        average_length = float(lengths.mean()) if len(lengths) and lengths.mean() > 0 else 1.0
+
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        for chunk_id, counts in enumerate(term_counts):
+            for term, count in counts.items():
+                chunk_ids, frequencies = postings.setdefault(term, ([], []))
+                chunk_ids.append(chunk_id)
+                frequencies.append(count)
+
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for term, (chunk_ids, frequencies) in postings.items():
+            chunk_ids = np.array(chunk_ids, dtype=np.int32)
+            frequencies = np.array(frequencies, dtype=np.float32)
+            idf = np.log(1 + (len(chunks) - len(chunk_ids) + 0.5) / (len(chunk_ids) + 0.5))
+            norm = k1 * (1 - b + b * lengths[chunk_ids] / average_length)
+            self.postings[term] = (chunk_ids, idf * frequencies * (k1 + 1) / (frequencies + norm))
+
+    def search(self, query: str, k: int) -> List[Tuple[float, str, str]]:
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        for term, query_count in Counter(tokenize(query)).items():
+            if term in self.postings:
+                chunk_ids, weights = self.postings[term]
+                scores[chunk_ids] += query_count * weights
+        if not scores.any():
+            return []
+        k = min(k, int(np.count_nonzero(scores)))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), *self.chunks[i]) for i in top]
+
+
+_indexes: "OrderedDict[str, CodeIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+# Index for the given code (the output of `load_python_code`), built once per distinct code
+# and shared by every section draft, thread and session in the process
+def get_code_index(code: str) -> CodeIndex:
+    key = content_hash(code)
+    with _indexes_lock:
+        if key in _indexes:
+            _indexes.move_to_end(key)
+            return _indexes[key]
+
+        start = time.perf_counter()
+        chunks = chunk_code_files(split_code_by_file(code), config.RETRIEVAL_CHUNK_CHARS)
+        index = CodeIndex(chunks)
+        logger.info(f"built retrieval index over {len(chunks)} chunks ({len(index.postings)} terms) in {time.perf_counter() - start:.2f}s")
+        _indexes[key] = index
+        while len(_indexes) > config.RETRIEVAL_INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+        return index
+
+
+# Top matching code chunks for `query`, formatted with their file headers and cut off at `max_tokens`
+def relevant_code_snippets(code: str, query: str, k: int = None, max_tokens: int = None) -> List[Tuple[str, str]]:
+    k = k or config.RETRIEVAL_TOP_K
+    max_tokens = max_tokens or config.RETRIEVAL_MAX_TOKENS
+    snippets, used_tokens = [], 0
+    for score, path, text in get_code_index(code).search(query, k):
+        tokens = count_tokens(text)
+        if used_tokens + tokens > max_tokens:
+            continue
+        snippets.append((path, text))
+        used_tokens += tokens
+    logger.info(f"retrieved {len(snippets)} snippets ({used_tokens} tokens) for query {query[:80]!r}")
+    return snippets
@@ -0,0 +1,410 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import logger
+
+import asyncio
+import base64
+import json
+import re
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from langgraph.types import Command
+
+import config
+from blog_graph import builder
+from blog_state import new_blog_state, update_blog_state
+from checkpointer import create_async_checkpointer
+from functions import is_archive, load_python_code, load_python_code_from_memory, render_blog_markdown
+from metrics import metrics, prometheus_series
+from streaming import astream_blog_graph
+
+
+# Async HTTP service around the blog graph (plain ASGI, no framework). Every session is a graph
+# thread; a run (a new blog or a resume) is an asyncio task streaming the graph with `astream`,
+# so sessions waiting on a reviewer or on the LLM cost no thread.
+#
+#   uvicorn service:app --host 0.0.0.0 --port 8000
+#
+#   POST /threads                 {"files": {"app.py": "..."}}, {"archive": {"name": "repo.zip", "data": "<base64>"}}
+#                                 (or {"path": "/repo"} with SERVICE_ALLOW_PATHS=1)
+#   GET  /threads/{id}            status, pending interrupt, outline and drafts
+#   GET  /threads/{id}/events     Server-Sent Events of the current run (token, outline, update, interrupt, status)
+#   POST /threads/{id}/resume     {"feedback": "approved"}
+#   POST /threads/{id}/update     {"files": {...}} (or {"path": ...}): redraft the sections of a finished blog whose code changed
+#   GET  /metrics                 Prometheus metrics
+#   GET  /healthz
+
+
+# Thread ids also name files (e.g. in METRICS_DIR), so they are limited to a safe character set
+THREAD_ROUTE = re.compile(r"^/threads/([A-Za-z0-9_-]+)(/events|/resume|/update)?$")
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# One graph thread: the status of its latest run and the events that run produced so far.
+# Status: "running", then "awaiting_feedback" (stopped at an interrupt), "done" or "error".
+class Session:
+    def __init__(self, thread_id: str):
+        self.thread_id = thread_id
+        self.thread_config = {
+            "configurable": {
+                "thread_id": thread_id,
+                "recursion_limit": 100
+            },
+            "max_concurrency": config.SECTION_DRAFTING_MAX_CONCURRENCY
+        }
+        self.status = "running"
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+        # Event ids keep growing across runs so a reconnecting client can resume with Last-Event-ID
+        self.events: Deque[Tuple[int, str, Any]] = deque(maxlen=config.SERVICE_EVENT_BUFFER)
+        self.next_event_id = 0
+        self.run_first_event_id = 0
+        self.changed = asyncio.Condition()
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    async def publish(self, name: str, data: Any):
+        async with self.changed:
+            self.events.append((self.next_event_id, name, data))
+            self.next_event_id += 1
+            self.changed.notify_all()
+
+
+class BlogService:
+    def __init__(self):
+        self.graph = None
+        self.checkpointer = None
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+
+    # ASGI entry point
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self.handle(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.startup()
+                except Exception as e:
+                    logger.exception("service startup failed")
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def startup(self):
+        self.checkpointer = await create_async_checkpointer()
+        self.graph = builder.compile(checkpointer=self.checkpointer)
+        logger.info("blog service started")
+
+    async def shutdown(self):
+        tasks = [session.task for session in self.sessions.values() if session.running]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if hasattr(self.checkpointer, "conn"):
+            await self.checkpointer.conn.close()
+        logger.info(f"blog service stopped ({len(tasks)} runs cancelled)")
+
+    # Node and LLM metrics, plus the memory use of a "memory-bounded" checkpointer
+    def metrics_text(self) -> str:
+        text = metrics.prometheus_text()
+        if hasattr(self.checkpointer, "stats"):
+            for field, value in self.checkpointer.stats().items():
+                name = f"blog_checkpoint_{field}"
+                text += f"# TYPE {name} gauge\n{prometheus_series(name, {}, value)}\n"
+        return text
+
+    # --- Runs ---
+
+    def session(self, thread_id: str) -> Session:
+        session = self.sessions.get(thread_id)
+        if session is None:
+            session = self.sessions[thread_id] = Session(thread_id)
+        self.sessions.move_to_end(thread_id)
+        # Forget the oldest idle sessions; their state stays in the checkpointer
+        idle = [key for key, other in self.sessions.items() if not other.running and key != thread_id]
+        for key in idle[:max(0, len(self.sessions) - config.SERVICE_MAX_SESSIONS)]:
+            del self.sessions[key]
+        return session
+
+    def start_run(self, session: Session, input_state):
+        session.status = "running"
+        session.error = None
+        session.run_first_event_id = session.next_event_id
+        session.task = asyncio.create_task(self.run(session, input_state), name=f"graph-run-{session.thread_id}")
+
+    async def run(self, session: Session, input_state):
+        try:
+            async for event in astream_blog_graph(self.graph, input_state, session.thread_config):
+                if event[0] == "interrupt":
+                    session.status = "awaiting_feedback"
+                    await session.publish("interrupt", event[1])
+                elif event[0] == "token":
+                    _, node, section_no, text = event
+                    await session.publish("token", {"node": node, "section_no": section_no, "text": text})
+                elif event[0] == "reset":
+                    _, node, section_no = event
+                    await session.publish("reset", {"node": node, "section_no": section_no})
+                elif event[0] == "outline":
+                    await session.publish("outline", {"sections": event[1]})
+                else:
+                    await session.publish("update", {"nodes": list(event[1].keys())})
+            if session.status == "running":
+                session.status = "done"
+                await asyncio.to_thread(metrics.finish_run, session.thread_id)
+        except asyncio.CancelledError:
+            session.status, session.error = "error", "cancelled"
+            metrics.discard_run(session.thread_id)
+            raise
+        except Exception as e:
+            logger.exception(f"graph run {session.thread_id} failed")
+            session.status, session.error = "error", f"{type(e).__name__}: {e}"
+            metrics.discard_run(session.thread_id)
+        finally:
+            await session.publish("status", {"status": session.status, "error": session.error})
+
+    async def pending_interrupt(self, thread_config: dict) -> Tuple[Any, Optional[Dict[str, Any]]]:
+        snapshot = await self.graph.aget_state(thread_config)
+        for task in snapshot.tasks:
+            if task.interrupts:
+                return snapshot, task.interrupts[0].value
+        return snapshot, None
+
+    # --- Endpoints ---
+
+    @staticmethod
+    async def load_code(body: Dict[str, Any]) -> str:
+        if isinstance(body.get("files"), dict):
+            code = await asyncio.to_thread(load_python_code_from_memory, list(body["files"].items()))
+        elif isinstance(body.get("archive"), dict):
+            archive = body["archive"]
+            try:
+                data = base64.b64decode(archive.get("data", ""), validate=True)
+            except (TypeError, ValueError):
+                raise HTTPError(400, "'archive.data' must be base64")
+            if not is_archive(str(archive.get("name", ""))):
+                raise HTTPError(400, "'archive.name' must end with .zip, .tar.gz or .tgz")
+            code = await asyncio.to_thread(load_python_code_from_memory, [(archive["name"], data)])
+        elif isinstance(body.get("path"), str):
+            if not config.SERVICE_ALLOW_PATHS:
+                raise HTTPError(403, "Loading code from server paths is disabled (SERVICE_ALLOW_PATHS)")
+            code = await asyncio.to_thread(load_python_code, body["path"])
+        else:
+            raise HTTPError(400, "Expected 'files' (file name -> source), 'archive' or 'path'")
+        if not code.strip():
+            raise HTTPError(400, "No Python source found")
+        return code
+
+    async def create_thread(self, body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        code = await self.load_code(body)
+        session = self.session(str(uuid.uuid4()))
+        self.start_run(session, new_blog_state(code))
+        return 202, {"thread_id": session.thread_id, "status": session.status}
+
+    async def resume_thread(self, thread_id: str, body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        feedback = body.get("feedback")
+        if not isinstance(feedback, str) or not feedback.strip():
+            raise HTTPError(400, "Expected non-empty 'feedback'")
+        session = self.session(thread_id)
+        if session.running:
+            raise HTTPError(409, "A run is already in progress for this thread")
+        _, interrupt_value = await self.pending_interrupt(session.thread_config)
+        if interrupt_value is None:
+            raise HTTPError(409, "This thread is not waiting for feedback")
+        self.start_run(session, Command(resume=feedback))
+        return 202, {"thread_id": thread_id, "status": session.status}
+
+    async def update_thread(self, thread_id: str, body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        code = await self.load_code(body)
+        session = self.session(thread_id)
+        if session.running:
+            raise HTTPError(409, "A run is already in progress for this thread")
+        snapshot, interrupt_value = await self.pending_interrupt(session.thread_config)
+        if interrupt_value is not None or not (snapshot.values or {}).get("sections"):
+            raise HTTPError(409, "Only finished blogs can be updated")
+        self.start_run(session, update_blog_state(code))
+        return 202, {"thread_id": thread_id, "status": session.status}
+
+    async def thread_status(self, thread_id: str) -> Tuple[int, Dict[str, Any]]:
+        session = self.sessions.get(thread_id)
+        thread_config = session.thread_config if session else Session(thread_id).thread_config
+        snapshot, interrupt_value = await self.pending_interrupt(thread_config)
+        values = snapshot.values or {}
+        if not values and session is None:
+            raise HTTPError(404, "Unknown thread")
+
+        if session is not None and (session.running or session.status == "error"):
+            status = session.status
+        else:
+            status = "awaiting_feedback" if interrupt_value is not None else "done"
+        result = {
+            "thread_id": thread_id,
+            "status": status,
+            "error": session.error if session else None,
+            "interrupt": interrupt_value,
+            "sections": values.get("sections", []),
+            "section_drafts": values.get("section_drafts", {}),
+            "completed_sections": values.get("completed_sections", []),
+            "stale_sections": values.get("stale_sections", [])
+        }
+        if status == "done":
+            result["blog_markdown"] = render_blog_markdown(values.get("sections", []), values.get("section_drafts", {}))
+        return 200, result
+
+    # Server-Sent Events of the session's latest run, or everything after Last-Event-ID when the
+    # client reconnects; the stream ends once no run is active and every buffered event was sent
+    async def stream_events(self, thread_id: str, scope, receive, send):
+        session = self.sessions.get(thread_id)
+        if session is None:
+            raise HTTPError(404, "No active session for this thread")
+
+        disconnected = asyncio.Event()
+
+        async def watch_disconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+            async with session.changed:
+                session.changed.notify_all()
+
+        headers = dict(scope["headers"])
+        last_event_id = headers.get(b"last-event-id", b"").decode("latin-1")
+        cursor = int(last_event_id) + 1 if last_event_id.isdigit() else session.run_first_event_id
+
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache"), (b"x-accel-buffering", b"no")
+        ]})
+        watcher = asyncio.create_task(watch_disconnect())
+        try:
+            while not disconnected.is_set():
+                chunk = "".join(
+                    f"id: {event_id}\nevent: {name}\ndata: {json.dumps(data)}\n\n"
+                    for event_id, name, data in list(session.events) if event_id >= cursor
+                )
+                cursor = session.next_event_id
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk.encode("utf-8"), "more_body": True})
+                if not session.running:
+                    break
+                async with session.changed:
+                    try:
+                        await asyncio.wait_for(
+                            session.changed.wait_for(lambda: session.next_event_id > cursor or not session.running or disconnected.is_set()),
+                            timeout=config.SERVICE_KEEPALIVE_SECONDS
+                        )
+                    except asyncio.TimeoutError:
+                        await send({"type": "http.response.body", "body": b": keep-alive\n\n", "more_body": True})
+        finally:
+            watcher.cancel()
+        if not disconnected.is_set():
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def handle(self, scope, receive, send):
+        method, path = scope["method"], scope["path"]
+        # An error can only be answered before the response has started (e.g. not mid-stream)
+        response = {"started": False, "finished": False}
+        upstream_send = send
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["started"] = True
+            elif message["type"] == "http.response.body" and not message.get("more_body"):
+                response["finished"] = True
+            await upstream_send(message)
+
+        try:
+            if path == "/healthz" and method == "GET":
+                running = sum(session.running for session in self.sessions.values())
+                return await self.send_json(send, 200, {"status": "ok", "sessions": len(self.sessions), "running": running})
+            if path == "/metrics" and method == "GET":
+                return await self.send_body(send, 200, self.metrics_text().encode("utf-8"), b"text/plain; version=0.0.4")
+            if path == "/threads" and method == "POST":
+                return await self.send_json(send, *await self.create_thread(await self.read_json(receive)))
+
+            match = THREAD_ROUTE.match(path)
+            if match is None:
+                raise HTTPError(404, "Not found")
+            thread_id, action = match.groups()
+            if action is None and method == "GET":
+                return await self.send_json(send, *await self.thread_status(thread_id))
+            if action == "/events" and method == "GET":
+                return await self.stream_events(thread_id, scope, receive, send)
+            if action == "/resume" and method == "POST":
+                return await self.send_json(send, *await self.resume_thread(thread_id, await self.read_json(receive)))
+            if action == "/update" and method == "POST":
+                return await self.send_json(send, *await self.update_thread(thread_id, await self.read_json(receive)))
+            raise HTTPError(405, "Method not allowed")
+        except HTTPError as e:
+            if not response["started"]:
+                await self.send_json(send, e.status, {"error": e.message})
+            else:
+                logger.warning(f"{method} {path} failed after the response started: {e.message}")
+                await self.end_response(send, response)
+        except Exception as e:
+            logger.exception(f"{method} {path} failed")
+            if not response["started"]:
+                await self.send_json(send, 500, {"error": f"{type(e).__name__}: {e}"})
+            else:
+                await self.end_response(send, response)
+
+    # Close a response that was interrupted by an error, unless it already ended
+    @staticmethod
+    async def end_response(send, response: Dict[str, bool]):
+        if response["finished"]:
+            return
+        try:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        except Exception as e:
+            logger.info(f"could not close the response: {type(e).__name__}: {e}")
+
+    @staticmethod
+    async def read_json(receive) -> Dict[str, Any]:
+        # Uploads are capped by the loader limits anyway; this only bounds what is buffered
+        max_bytes = 2 * config.LOADER_MAX_TOTAL_MB * 1024 * 1024
+        body = bytearray()
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if len(body) > max_bytes:
+                raise HTTPError(413, "Request body too large")
+            if not message.get("more_body"):
+                break
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "Invalid JSON body")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "Expected a JSON object")
+        return data
+
+    @staticmethod
+    async def send_body(send, status: int, body: bytes, content_type: bytes):
+        await send({"type": "http.response.start", "status": status, "headers": [
+            (b"content-type", content_type), (b"content-length", str(len(body)).encode("latin-1"))
+        ]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def send_json(self, send, status: int, data: Dict[str, Any]):
+        await self.send_body(send, status, json.dumps(data).encode("utf-8"), b"application/json")
+
+
+app = BlogService()
@@ -0,0 +1,111 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import logger
+
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
+
+import config
+from tracing import current_node
+
+
+# Fingerprint of a prompt: a speculative draft is only used if the prompt it was drafted
+# from is exactly the prompt the section would be drafted from now
+def prompt_fingerprint(messages: list) -> str:
+    digest = hashlib.sha256()
+    for message in messages:
+        digest.update(type(message).__name__.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(str(message.content).encode("utf-8", "replace"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+# Drafts of the next section, generated in the background while a reviewer looks at the
+# current one. At most one speculative draft is kept per graph thread; submitting a draft
+# for a different section or prompt replaces (and, if not started yet, cancels) the old one.
+# Drafts live in memory only, so after a restart the section is simply drafted as usual.
+class SpeculativeDrafts:
+    def __init__(self, workers: int, max_threads: int):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="speculative-draft")
+        self._lock = threading.Lock()
+        self._drafts: "OrderedDict[str, Tuple[str, str, Future]]" = OrderedDict()
+        self.max_threads = max_threads
+
+    # Start drafting unless the same draft is already pending or done (safe to call again
+    # when an interrupted node is re-executed on resume)
+    def submit(self, thread_id: str, section_no: str, messages: list, draft: Callable[[], str]):
+        fingerprint = prompt_fingerprint(messages)
+        with self._lock:
+            existing = self._drafts.get(thread_id)
+            if existing and existing[:2] == (section_no, fingerprint):
+                return
+            if existing:
+                existing[2].cancel()
+            logger.info(f"speculatively drafting section {section_no} for thread {thread_id}")
+            self._drafts[thread_id] = (section_no, fingerprint, self._executor.submit(self._run, draft))
+            self._drafts.move_to_end(thread_id)
+            while len(self._drafts) > self.max_threads:
+                _, (_, _, future) = self._drafts.popitem(last=False)
+                future.cancel()
+
+    @staticmethod
+    def _run(draft: Callable[[], str]) -> str:
+        node_token = current_node.set("speculative_drafting")
+        try:
+            return draft()
+        finally:
+            current_node.reset(node_token)
+
+    # Claim the draft of `section_no` if it was drafted from the same prompt. With wait=False
+    # only a finished draft is claimed; a pending one is left for a later call to wait on.
+    def claim(self, thread_id: str, section_no: str, messages: list, wait: bool = True) -> Optional[Future]:
+        with self._lock:
+            existing = self._drafts.get(thread_id)
+            if not existing or existing[0] != section_no:
+                return None
+            if existing[1] != prompt_fingerprint(messages):
+                logger.info(f"discarding speculative draft of section {section_no}: its prompt changed")
+                existing[2].cancel()
+                del self._drafts[thread_id]
+                return None
+            if not wait and not existing[2].done():
+                return None
+            del self._drafts[thread_id]
+            return existing[2]
+
+    def take(self, thread_id: str, section_no: str, messages: list, wait: bool = True) -> Optional[str]:
+        future = self.claim(thread_id, section_no, messages, wait)
+        if future is None:
+            return None
+        try:
+            return self._used(section_no, future.result())
+        except Exception as e:
+            return self._failed(section_no, e)
+
+    async def atake(self, thread_id: str, section_no: str, messages: list) -> Optional[str]:
+        future = self.claim(thread_id, section_no, messages)
+        if future is None:
+            return None
+        try:
+            return self._used(section_no, await asyncio.wrap_future(future))
+        except Exception as e:
+            return self._failed(section_no, e)
+
+    @staticmethod
+    def _used(section_no: str, draft: str) -> str:
+        logger.info(f"using speculative draft of section {section_no}")
+        return draft
+
+    @staticmethod
+    def _failed(section_no: str, error: Exception) -> None:
+        logger.info(f"speculative draft of section {section_no} failed ({type(error).__name__}: {error}), drafting again")
+        return None
+
+
+speculative_drafts = SpeculativeDrafts(config.SPECULATIVE_DRAFTING_WORKERS, config.SPECULATIVE_DRAFTING_MAX_THREADS)
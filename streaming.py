@@ -0,0 +1,105 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import logger
+
+from typing import Any, AsyncIterator, Dict, Iterator, List, Tuple
+
+from langchain_core.utils.json import parse_partial_json
+
+
+DRAFT_NODES = ("section_drafting", "parallel_section_drafting")
+OUTLINE_NODE = "blog_structuring"
+
+
+# Rebuilds the outline from streamed structured-output chunks as the JSON arrives
+class OutlineStreamParser:
+    def __init__(self):
+        self.attempt = None
+        self.buffer = ""
+        self.sections: List[Dict[str, str]] = []
+
+    def feed(self, chunk, metadata: Dict[str, Any]) -> bool:
+        # A retry in invoke_with_retries starts a fresh response
+        attempt = metadata.get("attempt")
+        if attempt != self.attempt:
+            self.attempt = attempt
+            self.buffer = ""
+
+        tool_call_chunks = getattr(chunk, "tool_call_chunks", None) or []
+        if tool_call_chunks:
+            self.buffer += "".join(tool_chunk.get("args") or "" for tool_chunk in tool_call_chunks)
+        elif isinstance(chunk.content, str):
+            self.buffer += chunk.content
+        if not self.buffer:
+            return False
+
+        try:
+            parsed = parse_partial_json(self.buffer)
+        except Exception:
+            return False
+        if not isinstance(parsed, dict) or not isinstance(parsed.get("sections"), list):
+            return False
+
+        sections = [
+            {"no": str(i + 1), "title": s.get("title", ""), "description": s.get("description", "")}
+            for i, s in enumerate(parsed["sections"])
+            if isinstance(s, dict) and s.get("title")
+        ]
+        if sections == self.sections:
+            return False
+        self.sections = sections
+        return True
+
+
+# Attempt number of each section draft being streamed, so the output of a failed attempt can
+# be discarded when invoke_with_retries starts the draft over
+class DraftAttemptTracker:
+    def __init__(self):
+        self.attempts: Dict[Tuple[str, Any], Any] = {}
+
+    # True when the chunk belongs to a new attempt of a draft that already streamed output
+    def restarted(self, node: str, section_no, metadata: Dict[str, Any]) -> bool:
+        key, attempt = (node, section_no), metadata.get("attempt")
+        restarted = key in self.attempts and self.attempts[key] != attempt
+        self.attempts[key] = attempt
+        return restarted
+
+
+# Translate one raw LangGraph stream event into UI-level events:
+#   ("token", node, section_no, text)  - a piece of a section draft
+#   ("reset", node, section_no)        - a retry restarts the draft: drop its tokens so far
+#   ("outline", sections)              - the outline parsed so far (last section may be incomplete)
+#   ("update", update)                 - a node finished
+#   ("interrupt", value)               - the graph is waiting for human feedback
+def translate_stream_event(outline: OutlineStreamParser, drafts: DraftAttemptTracker, mode: str, payload) -> Iterator[Tuple]:
+    if mode == "messages":
+        chunk, metadata = payload
+        node = metadata.get("langgraph_node")
+        if node in DRAFT_NODES and isinstance(chunk.content, str) and chunk.content:
+            section_no = metadata.get("section_no")
+            if drafts.restarted(node, section_no, metadata):
+                yield "reset", node, section_no
+            yield "token", node, section_no, chunk.content
+        elif node == OUTLINE_NODE and outline.feed(chunk, metadata):
+            yield "outline", outline.sections
+    elif "__interrupt__" in payload:
+        yield "interrupt", payload["__interrupt__"][0].value
+    else:
+        logger.info(f"completed nodes: {list(payload.keys())}")
+        yield "update", payload
+
+
+# Stream the graph as UI-level events (see translate_stream_event)
+def stream_blog_graph(graph, input_state, config) -> Iterator[Tuple]:
+    outline, drafts = OutlineStreamParser(), DraftAttemptTracker()
+    for mode, payload in graph.stream(input_state, config=config, stream_mode=["updates", "messages"]):
+        yield from translate_stream_event(outline, drafts, mode, payload)
+
+
+# Async variant: runs the graph with `astream`, so async nodes run on the event loop
+async def astream_blog_graph(graph, input_state, config) -> AsyncIterator[Tuple]:
+    outline, drafts = OutlineStreamParser(), DraftAttemptTracker()
+    async for mode, payload in graph.astream(input_state, config=config, stream_mode=["updates", "messages"]):
+        for event in translate_stream_event(outline, drafts, mode, payload):
+            yield event
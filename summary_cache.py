@@ -0,0 +1,110 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import logger
+
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+# Persistent cache of code summaries, keyed by content hash + model name + prompt version
+class SummaryCache:
+    def __init__(self, path: str, max_bytes: int, max_age_seconds: float, evict_every: int = 50):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.evict_every = evict_every
+        self.hits = 0
+        self.misses = 0
+        self._puts_since_eviction = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS summaries (
+                content_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL,
+                PRIMARY KEY (content_hash, model, prompt_version)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS summaries_last_used ON summaries (last_used_at)")
+        self._conn.commit()
+        self.evict()
+
+    def get(self, content_hash: str, model: str, prompt_version: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary, created_at FROM summaries WHERE content_hash = ? AND model = ? AND prompt_version = ?",
+                (content_hash, model, prompt_version)
+            ).fetchone()
+            now = time.time()
+            if row is None or now - row[1] > self.max_age_seconds:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE summaries SET last_used_at = ? WHERE content_hash = ? AND model = ? AND prompt_version = ?",
+                (now, content_hash, model, prompt_version)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, content_hash: str, model: str, prompt_version: str, summary: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (content_hash, model, prompt_version, summary, len(summary.encode("utf-8")), now, now)
+            )
+            self._conn.commit()
+            self._puts_since_eviction += 1
+            should_evict = self._puts_since_eviction >= self.evict_every
+        if should_evict:
+            self.evict()
+
+    # Drop entries older than max_age_seconds, then least recently used entries until under max_bytes
+    def evict(self):
+        with self._lock:
+            self._puts_since_eviction = 0
+            expired = self._conn.execute(
+                "DELETE FROM summaries WHERE created_at < ?", (time.time() - self.max_age_seconds,)
+            ).rowcount
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM summaries").fetchone()[0]
+            evicted = 0
+            if total > self.max_bytes:
+                rows = self._conn.execute("SELECT rowid, size FROM summaries ORDER BY last_used_at").fetchall()
+                stale = []
+                for rowid, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    stale.append((rowid,))
+                    total -= size
+                self._conn.executemany("DELETE FROM summaries WHERE rowid = ?", stale)
+                evicted = len(stale)
+            self._conn.commit()
+        if expired or evicted:
+            logger.info(f"summary cache eviction: {expired} expired, {evicted} over size limit")
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM summaries").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size
+        }
@@ -0,0 +1,158 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import logger
+
+import threading
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+import config
+
+
+# Context windows (prompt + completion tokens) of the models we use
+MODEL_CONTEXT_TOKENS = {
+    "llama-3.1-8b-instant": 131072,
+    "llama-3.3-70b-versatile": 131072,
+    "gemma2-9b-it": 8192,
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "gemini-1.5-flash": 1048576,
+    "gemini-2.0-flash": 1048576,
+}
+DEFAULT_CONTEXT_TOKENS = 8192
+# Chat formatting tokens added per message (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+TRUNCATION_MARKER = "\n[... truncated to fit the token budget ...]"
+
+
+# tiktoken encoding shared by all counts, or None when it cannot be loaded (e.g. offline
+# without a cached encoding file), in which case tokens are estimated from the length
+@lru_cache(maxsize=1)
+def get_encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(config.TOKENIZER_ENCODING)
+    except Exception as e:
+        logger.warning(f"tokenizer {config.TOKENIZER_ENCODING} unavailable ({type(e).__name__}: {e}), estimating 4 characters per token")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages) -> int:
+    return sum(
+        count_tokens(message.content if isinstance(message.content, str) else str(message.content)) + MESSAGE_OVERHEAD_TOKENS
+        for message in messages
+    )
+
+
+# Keep the beginning of `text` within `max_tokens`, marking the cut
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if count_tokens(text) <= max_tokens:
+        return text
+    max_tokens -= count_tokens(TRUNCATION_MARKER)
+    if max_tokens <= 0:
+        return ""
+    encoding = get_encoding()
+    if encoding is None:
+        kept = text[:max_tokens * 4]
+    else:
+        kept = encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+    # Cut on a line boundary when that does not lose too much
+    line_end = kept.rfind("\n")
+    if line_end > len(kept) // 2:
+        kept = kept[:line_end]
+    return kept + TRUNCATION_MARKER
+
+
+# One variable piece of a prompt. Parts with a lower priority number are packed first;
+# truncatable parts are shortened to the remaining budget, others are dropped if they do not fit.
+class PromptPart:
+    def __init__(self, name: str, text: str, priority: int, truncatable: bool = True):
+        self.name = name
+        self.text = text or ""
+        self.priority = priority
+        self.truncatable = truncatable
+
+
+# Token limits for one model: the context window minus the completion tokens reserved for
+# the answer and a safety margin for tokenizer differences (tiktoken is not the model's tokenizer)
+class TokenBudget:
+    def __init__(self, model: str, context_tokens: int, output_tokens: int, safety_margin: float):
+        self.model = model
+        self.context_tokens = context_tokens
+        self.output_tokens = output_tokens
+        self.prompt_tokens = int((context_tokens - output_tokens) * (1 - safety_margin))
+        if self.prompt_tokens <= 0:
+            raise ValueError(f"No room for a prompt to {model}: {context_tokens} context tokens, "
+                             f"{output_tokens} of them reserved for the answer")
+
+    @classmethod
+    def for_model(cls, model: str, tokens_per_minute: Optional[int] = None) -> "TokenBudget":
+        context_tokens = config.LLM_CONTEXT_TOKENS or MODEL_CONTEXT_TOKENS.get(model, DEFAULT_CONTEXT_TOKENS)
+        # A request above the tokens-per-minute limit (the model's provider limit, by default
+        # LLM_TOKENS_PER_MINUTE) is rejected outright, by the provider and by the rate limiter,
+        # so the limit also caps the prompt and the answer together
+        tokens_per_minute = config.LLM_TOKENS_PER_MINUTE if tokens_per_minute is None else tokens_per_minute
+        if tokens_per_minute > 0:
+            context_tokens = min(context_tokens, tokens_per_minute)
+        return cls(model, context_tokens, config.LLM_OUTPUT_TOKENS, config.TOKEN_SAFETY_MARGIN_PERCENT / 100)
+
+    # Fit `parts` into `available` tokens in priority order; returns the packed texts by name
+    # and a report of what was kept, truncated or dropped
+    @staticmethod
+    def pack(parts: List[PromptPart], available: int) -> Tuple[Dict[str, str], Dict[str, str]]:
+        texts, report = {}, {}
+        for part in sorted(parts, key=lambda part: part.priority):
+            tokens = count_tokens(part.text)
+            if tokens <= available:
+                texts[part.name] = part.text
+                report[part.name] = f"{tokens}"
+                available -= tokens
+            elif part.truncatable and available > 0:
+                texts[part.name] = truncate_to_tokens(part.text, available)
+                report[part.name] = f"{count_tokens(texts[part.name])}/{tokens} (truncated)"
+                available -= count_tokens(texts[part.name])
+            else:
+                texts[part.name] = ""
+                report[part.name] = f"0/{tokens} (dropped)"
+        return texts, report
+
+    # Build the messages for a prompt whose variable parts are packed into the prompt budget.
+    # `build_messages` is called with one keyword argument per part name.
+    def fit(self, build_messages: Callable[..., list], parts: List[PromptPart], label: str) -> list:
+        overhead = count_message_tokens(build_messages(**{part.name: "" for part in parts}))
+        texts, report = self.pack(parts, self.prompt_tokens - overhead)
+        messages = build_messages(**texts)
+        log = logger.warning if any(texts[part.name] != part.text for part in parts) else logger.info
+        log(f"{label} prompt: {count_message_tokens(messages)}/{self.prompt_tokens} tokens for {self.model} (parts: {report})")
+        return messages
+
+
+# Prompt and completion tokens used per call label, across all sessions in the process
+class TokenUsage:
+    def __init__(self):
+        self.usage: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, label: str, prompt_tokens: int, completion_tokens: int):
+        with self._lock:
+            entry = self.usage.setdefault(label, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+            entry["calls"] += 1
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+
+    def summary(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {label: dict(entry) for label, entry in self.usage.items()}
+
+
+token_usage = TokenUsage()
@@ -0,0 +1,133 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger_config import logger
+
+import asyncio
+import functools
+import hashlib
+import inspect
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, List, Optional
+
+from langgraph.config import get_config
+from langgraph.errors import GraphInterrupt
+
+import config
+
+
+# Size-bounded copy of a value for logging: long strings are truncated and tagged with
+# their length and hash, long lists keep only their first items
+def bounded(value: Any, max_chars: int = None, max_items: int = None) -> Any:
+    max_chars = max_chars or config.LOG_MAX_FIELD_CHARS
+    max_items = max_items or config.LOG_MAX_ITEMS
+    if isinstance(value, str):
+        if len(value) <= max_chars:
+            return value
+        digest = hashlib.sha256(value.encode("utf-8", "replace")).hexdigest()[:12]
+        return f"{value[:max_chars]}... <{len(value)} chars, sha256:{digest}>"
+    if isinstance(value, dict):
+        return {key: bounded(item, max_chars, max_items) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        items = [bounded(item, max_chars, max_items) for item in value[:max_items]]
+        if len(value) > max_items:
+            items.append(f"<{len(value) - max_items} more items>")
+        return items
+    if isinstance(value, (int, float, bool)) or value is None:
+        return value
+    return bounded(repr(value), max_chars, max_items)
+
+
+# Deferred `bounded` rendering: pass as a %-style logging argument so nothing is formatted
+# unless the record is actually emitted
+class Lazy:
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def __str__(self) -> str:
+        return str(bounded(self.value))
+
+    __repr__ = __str__
+
+
+# Graph node running in the current context, so LLM calls can be attributed to it
+current_node: ContextVar[Optional[str]] = ContextVar("current_node", default=None)
+
+# Callables receiving every finished span dict (e.g. the metrics recorder)
+span_listeners: List[Callable[[dict], None]] = []
+
+
+# Thread id of the graph run in the current context, if any
+def current_thread_id() -> Optional[str]:
+    try:
+        return get_config().get("configurable", {}).get("thread_id")
+    except RuntimeError:
+        return None
+
+
+# Log the span of one finished node run and hand it to the listeners
+def emit_span(node_name: str, status: str, start: float, args: tuple):
+    duration_ms = (time.perf_counter() - start) * 1000
+    span = {"node": node_name, "status": status, "duration_ms": round(duration_ms, 2), "ended_at": time.time()}
+    thread_id = current_thread_id()
+    if thread_id:
+        span["thread_id"] = thread_id
+    section_no = args[0].get("target_section_no") if args and isinstance(args[0], dict) else None
+    if section_no:
+        span["section_no"] = section_no
+    logger.info("node %s %s in %.1f ms", node_name, status, duration_ms, extra={"span": span})
+    for listener in span_listeners:
+        try:
+            listener(span)
+        except Exception:
+            logger.exception(f"span listener {listener!r} failed")
+
+
+# Wrap a graph node (sync or async) so every run emits a timing span
+def traced_node(func: Callable, name: str = None) -> Callable:
+    node_name = name or func.__name__
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            status = "ok"
+            node_token = current_node.set(node_name)
+            try:
+                return await func(*args, **kwargs)
+            except GraphInterrupt:
+                status = "interrupted"
+                raise
+            except asyncio.CancelledError:
+                status = "cancelled"
+                raise
+            except Exception:
+                status = "error"
+                raise
+            finally:
+                current_node.reset(node_token)
+                emit_span(node_name, status, start, args)
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        status = "ok"
+        node_token = current_node.set(node_name)
+        try:
+            return func(*args, **kwargs)
+        except GraphInterrupt:
+            status = "interrupted"
+            raise
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            current_node.reset(node_token)
+            emit_span(node_name, status, start, args)
+
+    return wrapper